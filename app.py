@@ -5,13 +5,51 @@ NASA Space Apps Challenge 2025
 
 import os
 from datetime import datetime
-from flask import Flask, request, jsonify
+from functools import wraps
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 
-from utils.fire_predictor import OptimizedFirePredictor
+from utils.fire_predictor import OptimizedFirePredictor, RegionNotLoadedError
+from utils.earth_engine_api import earth_engine_client
+from utils.circuit_breaker import CircuitBreaker
+from utils.inference_pool import InferencePool
+from utils.cache import LRUCache
+from utils.tile_service import (
+    RiskTileService,
+    is_valid_tile,
+    encode_tile_png,
+    encode_tile_binary,
+    tile_cache_control
+)
+from utils.aoi_scheduler import (
+    AreaOfInterestStore,
+    AreaRefreshScheduler,
+    AreaLimitExceeded,
+    client_fingerprint,
+    validate_webhook_url
+)
+from utils.incremental_scoring import IncrementalScorer, parse_tolerances
+from utils.raster_snapshots import RasterSnapshotStore, SnapshotRefresher, parse_snapshot_regions
 from utils.weather_api import MeteomaticsWeatherAPI, generate_synthetic_weather_data
-from utils.response_formatter import create_optimized_api_response, validate_bbox_coordinates
+from utils.response_formatter import (
+    create_grid_api_response,
+    create_binary_api_response,
+    iter_ndjson_response,
+    validate_bbox_coordinates,
+    build_bbox_batch_response,
+    validate_grid_resolution,
+    validate_response_options,
+    validate_region_filter,
+    validate_feature_rows
+)
+from utils.response_encoding import install_response_encoding, wants_ndjson, NDJSON_MIMETYPE
+from utils.binary_formats import requested_binary_format, is_format_available
+from utils.admission import AdmissionController, AdmissionRejected, estimate_request_cost
+from utils.warmup import WarmupRunner, synthetic_region_batch, warm_earth_engine, warm_regional_models
+from utils.traffic_capture import TrafficCapture, install_traffic_capture
+from utils.region_router import ROUTER_TOKEN_HEADER, is_trusted_router, parse_region_list
 
 # Cargar variables de entorno
 load_dotenv()
@@ -20,27 +58,195 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Detrás de router_app.py (o de otro proxy): IP real del cliente desde X-Forwarded-For
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+# JSON rápido (orjson) y compresión br/gzip negociada
+install_response_encoding(
+    app,
+    min_size=int(os.getenv('COMPRESS_MIN_SIZE', '1024')),
+    compress_level=int(os.getenv('COMPRESS_LEVEL', '6'))
+)
+
 # Configuración
 MODEL_PATH = os.getenv('MODEL_PATH', 'models/fire_prediction_models_complete.pkl')
+# Modo shard: solo estos modelos regionales (p. ej. "north_america,south_america"); vacío = todos
+MODEL_REGIONS = parse_region_list(os.getenv('MODEL_REGIONS'))
+# Secreto compartido con router_app.py: habilita los campos internos "features" y "regions"
+ROUTER_SHARED_SECRET = os.getenv('ROUTER_SHARED_SECRET', '')
 METEOMATICS_USER = os.getenv('METEOMATICS_USER')
 METEOMATICS_PASS = os.getenv('METEOMATICS_PASS')
-METEOMATICS_URL = 'https://api.meteomatics.com'
+METEOMATICS_URL = os.getenv('METEOMATICS_URL', 'https://api.meteomatics.com')
+METEOMATICS_TIMEOUT = float(os.getenv('METEOMATICS_TIMEOUT', '30'))
+METEOMATICS_HEDGE = os.getenv('METEOMATICS_HEDGE', 'false').lower() == 'true'
+METEOMATICS_MIN_HEDGE_DELAY = float(os.getenv('METEOMATICS_MIN_HEDGE_DELAY', '1.0'))
+METEOMATICS_BREAKER_RESET_SECONDS = float(os.getenv('METEOMATICS_BREAKER_RESET_SECONDS', '30'))
+METEOMATICS_SLOW_CALL_SECONDS = float(os.getenv('METEOMATICS_SLOW_CALL_SECONDS', '10'))
+
+# Grillas grandes: resolución máxima y descarga a pool de procesos
+MAX_GRID_RESOLUTION = int(os.getenv('MAX_GRID_RESOLUTION', '100'))
+MAX_RESPONSE_SAMPLES = int(os.getenv('MAX_RESPONSE_SAMPLES', '500'))
+MAX_BATCH_BBOXES = int(os.getenv('MAX_BATCH_BBOXES', '10000'))
+INFERENCE_PROCESS_THRESHOLD = int(os.getenv('INFERENCE_PROCESS_THRESHOLD', '2500'))
+INFERENCE_PROCESSES = int(os.getenv('INFERENCE_PROCESSES', '1'))
+# Crear el pool en el calentamiento; por defecto se crea con la primera grilla
+# grande (un proceso más desde el arranque pesa en instancias de 512 MB)
+INFERENCE_POOL_EAGER = os.getenv('INFERENCE_POOL_EAGER', 'false').lower() == 'true'
+
+# Respuesta NDJSON en streaming (Accept: application/x-ndjson)
+MAX_STREAM_GRID_RESOLUTION = int(os.getenv('MAX_STREAM_GRID_RESOLUTION', '300'))
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', '1000'))
+
+# Teselas de riesgo (slippy map)
+TILE_GRID_SIZE = int(os.getenv('TILE_GRID_SIZE', '16'))
+TILE_CACHE_SIZE = int(os.getenv('TILE_CACHE_SIZE', '4096'))
+MAX_TILE_ZOOM = int(os.getenv('MAX_TILE_ZOOM', '18'))
+TILE_CACHE_MAX_AGE = int(os.getenv('TILE_CACHE_MAX_AGE', '3600'))
+TILE_CACHE_PATH = os.getenv('TILE_CACHE_PATH', 'cache/tile_cache.pkl')
+TILE_CACHE_PERSIST_ENTRIES = int(os.getenv('TILE_CACHE_PERSIST_ENTRIES', '512'))
+
+# Calentamiento al arrancar (readiness en /ready hasta que termina)
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+WARMUP_EARTH_ENGINE_SECONDS = float(os.getenv('WARMUP_EARTH_ENGINE_SECONDS', '15'))
+
+# Áreas de interés con pre-cómputo programado
+AOI_SCHEDULER_ENABLED = os.getenv('AOI_SCHEDULER_ENABLED', 'true').lower() == 'true'
+AOI_STORE_PATH = os.getenv('AOI_STORE_PATH')
+AOI_POLL_SECONDS = int(os.getenv('AOI_POLL_SECONDS', '30'))
+AOI_FORECAST_DAYS = int(os.getenv('AOI_FORECAST_DAYS', '1'))
+# Re-puntuar solo celdas cuyo clima cambió más que la tolerancia (°C, %, m/s)
+AOI_INCREMENTAL_SCORING = os.getenv('AOI_INCREMENTAL_SCORING', 'true').lower() == 'true'
+AOI_RESCORE_TOLERANCES = parse_tolerances(os.getenv('AOI_RESCORE_TOLERANCES'))
+ALERT_WEBHOOK_URL = os.getenv('ALERT_WEBHOOK_URL')
+# Límites de registro y webhooks de clientes (solo hosts públicos, https salvo AOI_WEBHOOK_ALLOW_HTTP)
+AOI_MAX_AREAS_PER_CLIENT = int(os.getenv('AOI_MAX_AREAS_PER_CLIENT', '10'))
+AOI_MAX_AREAS = int(os.getenv('AOI_MAX_AREAS', '500'))
+AOI_WEBHOOK_ALLOWED_HOSTS = tuple(
+    host.strip().lower() for host in os.getenv('AOI_WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()
+) or None
+AOI_WEBHOOK_ALLOW_HTTP = os.getenv('AOI_WEBHOOK_ALLOW_HTTP', 'false').lower() == 'true'
+
+# Control de admisión: costo por cliente (X-API-Key o IP) y tope de peticiones caras
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_CAPACITY = float(os.getenv('RATE_LIMIT_CAPACITY', '60'))
+RATE_LIMIT_REFILL_PER_SECOND = float(os.getenv('RATE_LIMIT_REFILL_PER_SECOND', '1'))
+EXPENSIVE_REQUEST_COST = float(os.getenv('EXPENSIVE_REQUEST_COST', '10'))
+MAX_CONCURRENT_EXPENSIVE = int(os.getenv('MAX_CONCURRENT_EXPENSIVE', '2'))
+
+# Captura de tráfico anonimizado para replay (desactivada si no hay ruta)
+CAPTURE_PATH = os.getenv('CAPTURE_PATH')
+CAPTURE_SAMPLE_RATE = float(os.getenv('CAPTURE_SAMPLE_RATE', '1.0'))
+CAPTURE_MAX_MB = float(os.getenv('CAPTURE_MAX_MB', '100'))
+CAPTURE_SNAP_DEGREES = float(os.getenv('CAPTURE_SNAP_DEGREES', '1.0'))
+CAPTURE_TILE_ZOOM = int(os.getenv('CAPTURE_TILE_ZOOM', '6'))
+
+# Snapshots locales de NDVI/cobertura (JSON en línea o ruta a archivo)
+SNAPSHOT_REGIONS = parse_snapshot_regions(os.getenv('SNAPSHOT_REGIONS'))
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_CHECK_SECONDS = int(os.getenv('SNAPSHOT_CHECK_SECONDS', '3600'))
 
 # Cargar modelo al iniciar
 print("🚀 Inicializando API de Predicción de Incendios...")
-predictor = OptimizedFirePredictor(MODEL_PATH)
+predictor = OptimizedFirePredictor(MODEL_PATH, MODEL_REGIONS)
 
 if not predictor.is_loaded:
     print("❌ ERROR: No se pudo cargar el modelo")
     exit(1)
 
+# Grillas por encima del umbral se puntúan fuera del worker gevent
+inference_pool = InferencePool(
+    predictor,
+    threshold=INFERENCE_PROCESS_THRESHOLD,
+    max_workers=INFERENCE_PROCESSES
+)
+
 # Inicializar API meteorológica
 weather_api = MeteomaticsWeatherAPI(
     METEOMATICS_USER,
     METEOMATICS_PASS,
-    METEOMATICS_URL
+    METEOMATICS_URL,
+    timeout=METEOMATICS_TIMEOUT,
+    circuit_breaker=CircuitBreaker(
+        slow_call_seconds=METEOMATICS_SLOW_CALL_SECONDS,
+        reset_timeout=METEOMATICS_BREAKER_RESET_SECONDS,
+        probe_timeout=2 * METEOMATICS_TIMEOUT
+    ),
+    hedge_enabled=METEOMATICS_HEDGE,
+    min_hedge_delay=METEOMATICS_MIN_HEDGE_DELAY
 )
 
+if CAPTURE_PATH:
+    install_traffic_capture(app, TrafficCapture(
+        CAPTURE_PATH,
+        sample_rate=CAPTURE_SAMPLE_RATE,
+        max_bytes=int(CAPTURE_MAX_MB * 1024 * 1024),
+        snap_degrees=CAPTURE_SNAP_DEGREES,
+        tile_zoom=CAPTURE_TILE_ZOOM
+    ))
+    print(f"📼 Capturando tráfico anonimizado en {CAPTURE_PATH}")
+
+# Admisión de predicciones (None = sin límites)
+admission = AdmissionController(
+    capacity=RATE_LIMIT_CAPACITY,
+    refill_rate=RATE_LIMIT_REFILL_PER_SECOND,
+    expensive_cost=EXPENSIVE_REQUEST_COST,
+    max_concurrent_expensive=MAX_CONCURRENT_EXPENSIVE
+) if ADMISSION_ENABLED else None
+
+# Teselas cacheadas por fecha y versión de modelo
+tile_cache = LRUCache(max_entries=TILE_CACHE_SIZE)
+tile_service = RiskTileService(inference_pool, weather_api, tile_cache, grid_size=TILE_GRID_SIZE)
+
+# Áreas registradas y su refresco en segundo plano
+area_store = AreaOfInterestStore(AOI_STORE_PATH)
+incremental_scorer = IncrementalScorer(predictor, AOI_RESCORE_TOLERANCES) if AOI_INCREMENTAL_SCORING else None
+area_scheduler = AreaRefreshScheduler(
+    area_store,
+    inference_pool,
+    weather_api,
+    poll_seconds=AOI_POLL_SECONDS,
+    forecast_days=AOI_FORECAST_DAYS,
+    alert_webhook_url=ALERT_WEBHOOK_URL,
+    incremental_scorer=incremental_scorer,
+    webhook_allowed_hosts=AOI_WEBHOOK_ALLOWED_HOSTS,
+    webhook_allow_http=AOI_WEBHOOK_ALLOW_HTTP
+)
+if AOI_SCHEDULER_ENABLED:
+    area_scheduler.start()
+
+# Earth Engine se conecta en segundo plano: no bloquea el arranque ni la primera petición
+earth_engine_client.start_background_initialization()
+
+# Snapshots de NDVI/cobertura para las regiones configuradas
+if SNAPSHOT_REGIONS:
+    snapshot_store = RasterSnapshotStore(SNAPSHOT_DIR, SNAPSHOT_REGIONS)
+    earth_engine_client.attach_snapshots(snapshot_store)
+    SnapshotRefresher(snapshot_store, earth_engine_client, SNAPSHOT_CHECK_SECONDS).start()
+
+# Calentamiento en segundo plano: /ready responde 503 hasta que termina
+warmup_steps = [('regional_models', lambda: warm_regional_models(predictor))]
+if INFERENCE_PROCESSES > 0 and INFERENCE_POOL_EAGER:
+    warmup_steps.append(('inference_pool', lambda: inference_pool.warm_up(*synthetic_region_batch(predictor))))
+warmup_steps += [
+    ('tile_cache', lambda: tile_service.load_cache(TILE_CACHE_PATH)),
+    ('meteomatics', weather_api.warm_up),
+    ('earth_engine', lambda: warm_earth_engine(earth_engine_client, WARMUP_EARTH_ENGINE_SECONDS))
+]
+warmup = WarmupRunner(warmup_steps if WARMUP_ENABLED else [])
+warmup.start()
+
+
+def save_warm_caches():
+    """Guarda las teselas más usadas para el próximo worker (hook worker_exit de gunicorn)"""
+    try:
+        saved = tile_service.save_cache(TILE_CACHE_PATH, TILE_CACHE_PERSIST_ENTRIES)
+        print(f"💾 {saved} teselas guardadas en {TILE_CACHE_PATH}")
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar la caché de teselas: {e}")
+
+
 print("API lista para recibir peticiones")
 
 @app.route('/')
@@ -56,10 +262,22 @@ def health_check():
         "service": "Fire Risk Prediction API",
         "version": "1.0",
         "model_loaded": predictor.is_loaded,
+        "shard_regions": predictor.shard_regions,
+        "weather_api": weather_api.get_state(),
+        "earth_engine": earth_engine_client.get_status(),
+        "admission": admission.snapshot() if admission else None,
+        "warmup": warmup.get_status(),
         "timestamp": datetime.now().isoformat()
     }), 200
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 503 hasta que termina el calentamiento del worker"""
+    status = warmup.get_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
 @app.route('/model-info', methods=['GET'])
 def model_info():
     """Endpoint con información del modelo"""
@@ -69,7 +287,9 @@ def model_info():
     return jsonify({
         "model_metadata": predictor.system_metadata,
         "regions_available": list(predictor.regional_models.keys()),
-        "total_models": len(predictor.regional_models)
+        "total_models": len(predictor.regional_models),
+        "package_regions": predictor.package_regions,
+        "shard_regions": predictor.shard_regions
     }), 200
 
 
@@ -84,7 +304,7 @@ def validate_coordinates():
                 "error": "Falta el campo 'bbox_corners' en la petición"
             }), 400
         
-        is_valid, error_message = validate_bbox_coordinates(data['bbox_corners'])
+        is_valid, error_message, normalized_bbox = validate_bbox_coordinates(data['bbox_corners'])
         
         if not is_valid:
             return jsonify({
@@ -95,7 +315,7 @@ def validate_coordinates():
         return jsonify({
             "valid": True,
             "message": "Coordenadas válidas",
-            "bbox_corners": data['bbox_corners']
+            "bbox_corners": normalized_bbox
         }), 200
         
     except Exception as e:
@@ -104,7 +324,79 @@ def validate_coordinates():
         }), 500
 
 
+@app.route('/validate-coordinates/batch', methods=['POST'])
+def validate_coordinates_batch():
+    """Valida y normaliza una lista de bboxes; devuelve un código de error por bbox"""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('bboxes'), list):
+            return jsonify({
+                "error": "Falta el campo 'bboxes' (lista de bbox_corners) en la petición"
+            }), 400
+        
+        if len(data['bboxes']) > MAX_BATCH_BBOXES:
+            return jsonify({
+                "error": f"Máximo {MAX_BATCH_BBOXES} bboxes por petición"
+            }), 400
+        
+        return jsonify(build_bbox_batch_response(data['bboxes'])), 200
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"Error validando coordenadas: {str(e)}"
+        }), 500
+
+
+def admission_controlled(view):
+    """
+    Aplica el control de admisión antes de la vista
+    
+    El costo se estima con grid_resolution y num_samples ya validados; si
+    la petición es inválida pasa sin cobrar y la vista responde 400. El cupo
+    de petición cara se libera al terminar (o al cerrar el stream NDJSON).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if admission is None:
+            return view(*args, **kwargs)
+        
+        data = request.get_json(silent=True) or {}
+        accept = request.headers.get('Accept')
+        stream = requested_binary_format(accept) is None and wants_ndjson(accept)
+        grid_ok, _, grid_resolution = validate_grid_resolution(
+            data.get('grid_resolution'),
+            MAX_STREAM_GRID_RESOLUTION if stream else MAX_GRID_RESOLUTION
+        )
+        options_ok, _, num_samples, _ = validate_response_options(data, MAX_RESPONSE_SAMPLES)
+        if not (grid_ok and options_ok):
+            return view(*args, **kwargs)
+        
+        client_key = request.headers.get('X-API-Key') or request.remote_addr
+        try:
+            ticket = admission.admit(client_key, estimate_request_cost(grid_resolution, num_samples))
+        except AdmissionRejected as e:
+            response = jsonify({"error": e.reason, "retry_after": round(e.retry_after, 1)})
+            response.headers['Retry-After'] = e.retry_after_header
+            return response, 429
+        
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except Exception:
+            ticket.release()
+            raise
+        
+        if response.is_streamed:
+            response.call_on_close(ticket.release)
+        else:
+            ticket.release()
+        return response
+    
+    return wrapper
+
+
 @app.route('/predict-fire-risk', methods=['POST'])
+@admission_controlled
 def predict_fire_risk():
     """
     Endpoint principal de predicción de riesgo de incendios
@@ -115,15 +407,31 @@ def predict_fire_risk():
             "top_left": [-14.219889, -71.271138],
             "bottom_right": [-14.306682, -71.176567]
         },
-        "forecast_date": "2025-10-06"
+        "forecast_date": "2025-10-06",
+        "grid_resolution": 5,           (opcional, puntos por lado)
+        "num_samples": 4,               (opcional, puntos enriquecidos en risk_grid)
+        "grid_format": "rows",          (opcional, "rows" o "columnar")
+        "regions": ["south_america"],   (interno, solo puntos de esos modelos)
+        "features": [[lat, lon, ...]]   (interno, filas ya armadas por el router; no se pide clima)
     }
     
+    "regions" y "features" los manda solo router_app.py, con ROUTER_SHARED_SECRET
+    en la cabecera X-Router-Token; sin ella la petición responde 403.
+    
     Salida JSON:
     {
         "fire_risk_assessment": {...},
         "risk_grid": [...],
         "recommendations": {...}
     }
+    
+    Con Accept: application/vnd.apache.arrow.stream o application/msgpack
+    devuelve la grilla completa en columnas (ver utils/binary_formats.py).
+    Con Accept: application/x-ndjson la respuesta sale en streaming: primero
+    el resumen y después una línea por celda (hasta MAX_STREAM_GRID_RESOLUTION).
+    
+    En modo shard (MODEL_REGIONS) un punto cuyo modelo no está cargado
+    responde 421: la petición tiene que pasar por router_app.py.
     """
     try:
         # 1. Validar petición
@@ -149,42 +457,122 @@ def predict_fire_risk():
         # Usar bbox normalizado (siempre en formato [lat, lon])
         bbox_corners = normalized_bbox
         
+        # Formato negociado por Accept (Arrow / MessagePack / NDJSON en streaming)
+        binary_format = requested_binary_format(request.headers.get('Accept'))
+        if binary_format and not is_format_available(binary_format):
+            return jsonify({"error": f"Formato {binary_format} no disponible en este servidor"}), 406
+        stream = binary_format is None and wants_ndjson(request.headers.get('Accept'))
+        
+        is_valid, error_message, grid_resolution = validate_grid_resolution(
+            data.get('grid_resolution'),
+            MAX_STREAM_GRID_RESOLUTION if stream else MAX_GRID_RESOLUTION
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        is_valid, error_message, num_samples, grid_format = validate_response_options(
+            data,
+            MAX_RESPONSE_SAMPLES
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        # Campos internos del reparto multi-shard: solo desde el router
+        if ('features' in data or 'regions' in data) and not is_trusted_router(
+                request.headers.get(ROUTER_TOKEN_HEADER), ROUTER_SHARED_SECRET):
+            return jsonify({"error": "Los campos 'features' y 'regions' solo se aceptan desde el router"}), 403
+        
+        is_valid, error_message, only_regions = validate_region_filter(
+            data.get('regions'),
+            predictor.package_regions
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        is_valid, error_message, routed_features = validate_feature_rows(
+            data.get('features'),
+            grid_resolution * grid_resolution,
+            bbox_corners
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
         # 3. Validar modelo
         if not predictor.is_loaded:
             return jsonify({"error": "Modelo no cargado"}), 500
         
+        # Áreas registradas: respuesta pre-computada por el scheduler (formato por defecto)
+        precomputed = None
+        if (num_samples == 4 and grid_format == 'rows' and binary_format is None and
+                not stream and only_regions is None and routed_features is None):
+            precomputed = area_store.find_result(bbox_corners, forecast_date, grid_resolution)
+        if precomputed is not None:
+            response = jsonify(precomputed['response'])
+            response.headers['X-Precomputed-At'] = precomputed['computed_at']
+            return response, 200
+        
         print(f"\n🎯 Nueva predicción solicitada:")
         print(f"   Área: {bbox_corners}")
         print(f"   Fecha: {forecast_date}")
+        print(f"   Grilla: {grid_resolution}x{grid_resolution}")
         
-        # 4. Obtener datos meteorológicos
-        weather_data = weather_api.get_weather_for_area(bbox_corners, forecast_date)
-        
-        # Fallback a datos sintéticos si API falla
-        if weather_data is None:
-            print("API meteorológica falló, usando datos sintéticos...")
-            weather_data = generate_synthetic_weather_data(bbox_corners)
+        if routed_features is not None:
+            # Bbox repartido por router_app.py: el clima ya se pidió una sola vez
+            features, regions = predictor.assign_models(routed_features, only_regions=only_regions)
+        else:
+            # 4. Obtener datos meteorológicos
+            weather_data = weather_api.get_weather_for_area(bbox_corners, forecast_date, grid_resolution)
+            
+            # Fallback a datos sintéticos si API falla
+            if weather_data is None:
+                print("API meteorológica falló, usando datos sintéticos...")
+                weather_data = generate_synthetic_weather_data(bbox_corners, grid_resolution, forecast_date)
+            
+            features, regions = predictor.build_feature_matrix(weather_data, only_regions=only_regions)
         
-        # 5. Hacer predicciones
+        # 5. Hacer predicciones (grillas grandes van al pool de procesos)
         print("Realizando predicciones...")
-        predictions = predictor.predict_risk_optimized(weather_data)
+        probabilities = inference_pool.score_features(features, regions)
         
-        if not predictions:
+        if len(probabilities) == 0:
             return jsonify({
                 "error": "No se pudieron generar predicciones"
             }), 500
         
-        # 6. Crear respuesta optimizada
-        response = create_optimized_api_response(
-            predictions,
+        # Clientes máquina: columnas directamente desde los arrays del predictor
+        if binary_format:
+            body, mimetype = create_binary_api_response(
+                features,
+                probabilities,
+                binary_format,
+                num_samples=num_samples
+            )
+            return Response(body, mimetype=mimetype), 200
+        
+        # Grillas grandes: resumen primero y filas en chunks, sin armar la respuesta entera
+        if stream:
+            return Response(
+                iter_ndjson_response(features, probabilities, forecast_date, num_samples, STREAM_CHUNK_ROWS),
+                mimetype=NDJSON_MIMETYPE
+            ), 200
+        
+        # 6. Crear respuesta (estadísticas directamente sobre los arrays)
+        response = create_grid_api_response(
+            features,
+            probabilities,
             forecast_date,
-            bbox_corners
+            bbox_corners,
+            num_samples=num_samples,
+            grid_format=grid_format
         )
         
         print(f"Predicción completada: {response['fire_risk_assessment']['overall_risk_level']}")
         
         return jsonify(response), 200
         
+    except RegionNotLoadedError as e:
+        return jsonify({"error": str(e), "regions": e.regions}), 421
+        
     except Exception as e:
         print(f"Error en predicción: {e}")
         return jsonify({
@@ -192,6 +580,179 @@ def predict_fire_risk():
         }), 500
 
 
+@app.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def risk_tile(z, x, y):
+    """
+    Tesela de riesgo Web Mercator z/x/y
+    
+    Query params:
+        date: "YYYY-MM-DD" (default: hoy, UTC)
+        format: "png" (default) o "bin" (uint8 row-major, fila 0 = norte)
+    """
+    try:
+        if not is_valid_tile(z, x, y, MAX_TILE_ZOOM):
+            return jsonify({"error": f"Tesela inválida (zoom máximo {MAX_TILE_ZOOM})"}), 400
+        
+        forecast_date = request.args.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
+        try:
+            datetime.strptime(forecast_date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({"error": "date debe tener formato YYYY-MM-DD"}), 400
+        
+        tile_format = request.args.get('format', 'png')
+        if tile_format not in ('png', 'bin'):
+            return jsonify({"error": "format debe ser 'png' o 'bin'"}), 400
+        
+        grid, cache_hit, synthetic = tile_service.get_tile(z, x, y, forecast_date)
+        
+        if tile_format == 'png':
+            body, mimetype = encode_tile_png(grid), 'image/png'
+        else:
+            body, mimetype = encode_tile_binary(grid), 'application/octet-stream'
+        
+        response = Response(body, mimetype=mimetype)
+        response.headers['Cache-Control'] = tile_cache_control(synthetic, TILE_CACHE_MAX_AGE)
+        response.headers['X-Tile-Grid-Size'] = str(grid.shape[0])
+        response.headers['X-Model-Version'] = tile_service.model_version
+        response.headers['X-Cache'] = 'HIT' if cache_hit else 'MISS'
+        return response, 200
+        
+    except Exception as e:
+        print(f"Error generando tesela: {e}")
+        return jsonify({
+            "error": f"Error generando tesela: {str(e)}"
+        }), 500
+
+
+def _serialize_area(area, include_results=False):
+    """Registro de área para la API (sin los resultados completos por defecto)"""
+    serialized = {k: v for k, v in area.items() if k not in ('results', 'owner')}
+    serialized['precomputed_dates'] = sorted(area['results'].keys())
+    if include_results:
+        serialized['results'] = area['results']
+    return serialized
+
+
+@app.route('/areas', methods=['POST'])
+def register_area():
+    """
+    Registra un área de interés para pre-computar su riesgo
+    
+    Entrada JSON:
+    {
+        "bbox_corners": {...},
+        "refresh_minutes": 180,
+        "name": "Reserva X",           (opcional)
+        "grid_resolution": 5,          (opcional)
+        "webhook_url": "https://..."   (opcional, alertas de cambio de nivel)
+    }
+    
+    Cada cliente (X-API-Key o IP) puede registrar hasta AOI_MAX_AREAS_PER_CLIENT
+    áreas; el registro se cobra en el control de admisión como un refresco.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or 'bbox_corners' not in data:
+            return jsonify({"error": "Falta el campo 'bbox_corners'"}), 400
+        
+        is_valid, error_message, bbox_corners = validate_bbox_coordinates(data['bbox_corners'])
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        is_valid, error_message, grid_resolution = validate_grid_resolution(
+            data.get('grid_resolution'),
+            MAX_GRID_RESOLUTION
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        refresh_minutes = data.get('refresh_minutes', 180)
+        if isinstance(refresh_minutes, bool) or not isinstance(refresh_minutes, int) or refresh_minutes < 5:
+            return jsonify({"error": "refresh_minutes debe ser un entero >= 5"}), 400
+        
+        webhook_url = data.get('webhook_url')
+        if webhook_url is not None:
+            is_valid, error_message, webhook_url = validate_webhook_url(
+                webhook_url,
+                AOI_WEBHOOK_ALLOWED_HOSTS,
+                AOI_WEBHOOK_ALLOW_HTTP
+            )
+            if not is_valid:
+                return jsonify({"error": error_message}), 400
+        
+        # Se cobra lo que cuesta un refresco (4 puntos enriquecidos por fecha)
+        client_key = request.headers.get('X-API-Key') or request.remote_addr
+        if admission is not None:
+            try:
+                admission.admit(
+                    client_key,
+                    estimate_request_cost(grid_resolution, 4) * AOI_FORECAST_DAYS
+                ).release()
+            except AdmissionRejected as e:
+                response = jsonify({"error": e.reason, "retry_after": round(e.retry_after, 1)})
+                response.headers['Retry-After'] = e.retry_after_header
+                return response, 429
+        
+        try:
+            area = area_store.register(
+                bbox_corners,
+                refresh_minutes=refresh_minutes,
+                name=data.get('name'),
+                grid_resolution=grid_resolution,
+                webhook_url=webhook_url,
+                owner=client_fingerprint(client_key),
+                max_per_owner=AOI_MAX_AREAS_PER_CLIENT,
+                max_total=AOI_MAX_AREAS
+            )
+        except AreaLimitExceeded as e:
+            return jsonify({"error": str(e)}), 403
+        
+        return jsonify(_serialize_area(area)), 201
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"Error registrando área: {str(e)}"
+        }), 500
+
+
+@app.route('/areas', methods=['GET'])
+def list_areas():
+    """Lista las áreas de interés registradas"""
+    return jsonify({
+        "areas": [_serialize_area(area) for area in area_store.list()],
+        "scheduler_enabled": AOI_SCHEDULER_ENABLED,
+        "incremental_scoring": incremental_scorer.get_stats() if incremental_scorer else None
+    }), 200
+
+
+@app.route('/areas/<area_id>', methods=['GET'])
+def get_area(area_id):
+    """Detalle de un área con sus resultados pre-computados"""
+    area = area_store.get(area_id)
+    if area is None:
+        return jsonify({"error": "Área no encontrada"}), 404
+    
+    return jsonify(_serialize_area(area, include_results=True)), 200
+
+
+@app.route('/areas/<area_id>', methods=['DELETE'])
+def delete_area(area_id):
+    """Elimina un área de interés (solo el cliente que la registró)"""
+    area = area_store.get(area_id)
+    if area is None:
+        return jsonify({"error": "Área no encontrada"}), 404
+    
+    owner = area.get('owner')
+    if owner is not None and owner != client_fingerprint(request.headers.get('X-API-Key') or request.remote_addr):
+        return jsonify({"error": "El área pertenece a otro cliente"}), 403
+    
+    if not area_store.remove(area_id):
+        return jsonify({"error": "Área no encontrada"}), 404
+    
+    return jsonify({"deleted": area_id}), 200
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Manejo de rutas no encontradas"""
@@ -199,9 +760,16 @@ def not_found(error):
         "error": "Endpoint no encontrado",
         "available_endpoints": [
             "GET /health",
+            "GET /ready",
             "GET /model-info",
             "POST /validate-coordinates",
-            "POST /predict-fire-risk"
+            "POST /validate-coordinates/batch",
+            "POST /predict-fire-risk",
+            "GET /tiles/{z}/{x}/{y}",
+            "POST /areas",
+            "GET /areas",
+            "GET /areas/{id}",
+            "DELETE /areas/{id}"
         ]
     }), 404
 
@@ -220,9 +788,14 @@ if __name__ == '__main__':
     print("🚀 Iniciando servidor Flask...")
     print("- Endpoints disponibles:")
     print("   GET  /health")
+    print("   GET  /ready")
     print("   GET  /model-info")
     print("   POST /validate-coordinates")
+    print("   POST /validate-coordinates/batch")
     print("   POST /predict-fire-risk")
+    print("   GET  /tiles/<z>/<x>/<y>")
+    print("   POST /areas")
+    print("   GET  /areas")
     print("\n")
     
     app.run(
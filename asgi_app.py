@@ -0,0 +1,562 @@
+"""
+Punto de entrada ASGI alternativo para la API de Predicción de Incendios
+Expone las rutas de predicción de app.py, con cliente HTTP asíncrono (httpx)
+y la inferencia en un pool de hilos acotado.
+
+Limitaciones frente a app.py: no sirve /areas (el pre-cómputo de áreas
+corre en el scheduler de app.py), no captura tráfico, no aplica
+TRUSTED_PROXY_HOPS (usar --proxy-headers de uvicorn) y el calentamiento
+no pre-abre la conexión con Meteomatics ni recarga teselas guardadas.
+
+Uso:
+    uvicorn asgi_app:app --port 5000
+    gunicorn -c gunicorn_asgi_config.py asgi_app:app
+"""
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import partial, wraps
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import (
+    JSONResponse as StarletteJSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse
+)
+from starlette.background import BackgroundTask
+from starlette.routing import Route
+
+from utils.fire_predictor import OptimizedFirePredictor, RegionNotLoadedError
+from utils.earth_engine_api import earth_engine_client
+from utils.circuit_breaker import CircuitBreaker
+from utils.inference_pool import InferencePool
+from utils.cache import LRUCache
+from utils.tile_service import (
+    RiskTileService,
+    is_valid_tile,
+    encode_tile_png,
+    encode_tile_binary,
+    tile_cache_control
+)
+from utils.weather_api import AsyncMeteomaticsWeatherAPI, generate_synthetic_weather_data
+from utils.response_formatter import (
+    create_grid_api_response,
+    create_binary_api_response,
+    iter_ndjson_response,
+    validate_bbox_coordinates,
+    build_bbox_batch_response,
+    validate_grid_resolution,
+    validate_response_options,
+    validate_region_filter,
+    validate_feature_rows
+)
+from utils.response_encoding import dumps_json, wants_ndjson, NDJSON_MIMETYPE
+from utils.binary_formats import requested_binary_format, is_format_available
+from utils.admission import AdmissionController, AdmissionRejected, estimate_request_cost
+from utils.warmup import WarmupRunner, warm_earth_engine, warm_regional_models
+from utils.region_router import ROUTER_TOKEN_HEADER, is_trusted_router, parse_region_list
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Configuración
+MODEL_PATH = os.getenv('MODEL_PATH', 'models/fire_prediction_models_complete.pkl')
+MODEL_REGIONS = parse_region_list(os.getenv('MODEL_REGIONS'))
+# Secreto compartido con router_app.py: habilita los campos internos "features" y "regions"
+ROUTER_SHARED_SECRET = os.getenv('ROUTER_SHARED_SECRET', '')
+METEOMATICS_USER = os.getenv('METEOMATICS_USER')
+METEOMATICS_PASS = os.getenv('METEOMATICS_PASS')
+METEOMATICS_URL = os.getenv('METEOMATICS_URL', 'https://api.meteomatics.com')
+METEOMATICS_TIMEOUT = float(os.getenv('METEOMATICS_TIMEOUT', '30'))
+METEOMATICS_HEDGE = os.getenv('METEOMATICS_HEDGE', 'false').lower() == 'true'
+METEOMATICS_MIN_HEDGE_DELAY = float(os.getenv('METEOMATICS_MIN_HEDGE_DELAY', '1.0'))
+METEOMATICS_BREAKER_RESET_SECONDS = float(os.getenv('METEOMATICS_BREAKER_RESET_SECONDS', '30'))
+METEOMATICS_SLOW_CALL_SECONDS = float(os.getenv('METEOMATICS_SLOW_CALL_SECONDS', '10'))
+
+MAX_GRID_RESOLUTION = int(os.getenv('MAX_GRID_RESOLUTION', '100'))
+MAX_RESPONSE_SAMPLES = int(os.getenv('MAX_RESPONSE_SAMPLES', '500'))
+MAX_BATCH_BBOXES = int(os.getenv('MAX_BATCH_BBOXES', '10000'))
+MAX_STREAM_GRID_RESOLUTION = int(os.getenv('MAX_STREAM_GRID_RESOLUTION', '300'))
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', '1000'))
+TILE_GRID_SIZE = int(os.getenv('TILE_GRID_SIZE', '16'))
+TILE_CACHE_SIZE = int(os.getenv('TILE_CACHE_SIZE', '4096'))
+MAX_TILE_ZOOM = int(os.getenv('MAX_TILE_ZOOM', '18'))
+TILE_CACHE_MAX_AGE = int(os.getenv('TILE_CACHE_MAX_AGE', '3600'))
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_CAPACITY = float(os.getenv('RATE_LIMIT_CAPACITY', '60'))
+RATE_LIMIT_REFILL_PER_SECOND = float(os.getenv('RATE_LIMIT_REFILL_PER_SECOND', '1'))
+EXPENSIVE_REQUEST_COST = float(os.getenv('EXPENSIVE_REQUEST_COST', '10'))
+MAX_CONCURRENT_EXPENSIVE = int(os.getenv('MAX_CONCURRENT_EXPENSIVE', '2'))
+
+# Hilos dedicados a inferencia (acotado para no competir por CPU/memoria)
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '2'))
+
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+WARMUP_EARTH_ENGINE_SECONDS = float(os.getenv('WARMUP_EARTH_ENGINE_SECONDS', '15'))
+
+# Cargar modelo al iniciar
+print("🚀 Inicializando API de Predicción de Incendios (ASGI)...")
+predictor = OptimizedFirePredictor(MODEL_PATH, MODEL_REGIONS)
+
+if not predictor.is_loaded:
+    print("❌ ERROR: No se pudo cargar el modelo")
+    exit(1)
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_THREADS,
+    thread_name_prefix='inference'
+)
+
+# Inicializar API meteorológica asíncrona
+weather_api = AsyncMeteomaticsWeatherAPI(
+    METEOMATICS_USER,
+    METEOMATICS_PASS,
+    METEOMATICS_URL,
+    timeout=METEOMATICS_TIMEOUT,
+    circuit_breaker=CircuitBreaker(
+        slow_call_seconds=METEOMATICS_SLOW_CALL_SECONDS,
+        reset_timeout=METEOMATICS_BREAKER_RESET_SECONDS,
+        probe_timeout=2 * METEOMATICS_TIMEOUT
+    ),
+    hedge_enabled=METEOMATICS_HEDGE,
+    min_hedge_delay=METEOMATICS_MIN_HEDGE_DELAY
+)
+
+# Admisión de predicciones (None = sin límites)
+admission = AdmissionController(
+    capacity=RATE_LIMIT_CAPACITY,
+    refill_rate=RATE_LIMIT_REFILL_PER_SECOND,
+    expensive_cost=EXPENSIVE_REQUEST_COST,
+    max_concurrent_expensive=MAX_CONCURRENT_EXPENSIVE
+) if ADMISSION_ENABLED else None
+
+# Las teselas se calculan en el threadpool: la inferencia queda en línea
+tile_service = RiskTileService(
+    InferencePool(predictor, max_workers=0),
+    weather_api,
+    LRUCache(max_entries=TILE_CACHE_SIZE),
+    grid_size=TILE_GRID_SIZE
+)
+
+# El cliente httpx pertenece al event loop: Meteomatics no se pre-abre desde el hilo de calentamiento
+warmup = WarmupRunner([
+    ('regional_models', lambda: warm_regional_models(predictor)),
+    ('earth_engine', lambda: warm_earth_engine(earth_engine_client, WARMUP_EARTH_ENGINE_SECONDS))
+] if WARMUP_ENABLED else [])
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSONResponse serializada con orjson (acepta tipos NumPy)"""
+    
+    def render(self, content):
+        return dumps_json(content)
+
+
+AVAILABLE_ENDPOINTS = [
+    "GET /health",
+    "GET /ready",
+    "GET /model-info",
+    "POST /validate-coordinates",
+    "POST /validate-coordinates/batch",
+    "POST /predict-fire-risk",
+    "GET /tiles/{z}/{x}/{y}"
+]
+
+
+async def index(request):
+    return PlainTextResponse("API de Predicción de Incendios activa", status_code=200)
+
+
+async def health_check(request):
+    """Endpoint de verificación de estado"""
+    return JSONResponse({
+        "status": "healthy",
+        "service": "Fire Risk Prediction API",
+        "version": "1.0",
+        "model_loaded": predictor.is_loaded,
+        "shard_regions": predictor.shard_regions,
+        "weather_api": weather_api.get_state(),
+        "earth_engine": earth_engine_client.get_status(),
+        "admission": admission.snapshot() if admission else None,
+        "warmup": warmup.get_status(),
+        "timestamp": datetime.now().isoformat()
+    }, status_code=200)
+
+
+async def readiness_check(request):
+    """Readiness: 503 hasta que termina el calentamiento del worker"""
+    status = warmup.get_status()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
+
+async def model_info(request):
+    """Endpoint con información del modelo"""
+    if not predictor.is_loaded:
+        return JSONResponse({"error": "Modelo no cargado"}, status_code=500)
+    
+    return JSONResponse({
+        "model_metadata": predictor.system_metadata,
+        "regions_available": list(predictor.regional_models.keys()),
+        "total_models": len(predictor.regional_models),
+        "package_regions": predictor.package_regions,
+        "shard_regions": predictor.shard_regions
+    }, status_code=200)
+
+
+async def validate_coordinates(request):
+    """Endpoint para validar coordenadas del bbox"""
+    try:
+        data = await request.json()
+        
+        if not data or 'bbox_corners' not in data:
+            return JSONResponse({
+                "error": "Falta el campo 'bbox_corners' en la petición"
+            }, status_code=400)
+        
+        is_valid, error_message, normalized_bbox = validate_bbox_coordinates(data['bbox_corners'])
+        
+        if not is_valid:
+            return JSONResponse({
+                "valid": False,
+                "error": error_message
+            }, status_code=400)
+        
+        return JSONResponse({
+            "valid": True,
+            "message": "Coordenadas válidas",
+            "bbox_corners": normalized_bbox
+        }, status_code=200)
+        
+    except Exception as e:
+        return JSONResponse({
+            "error": f"Error validando coordenadas: {str(e)}"
+        }, status_code=500)
+
+
+async def validate_coordinates_batch(request):
+    """Valida y normaliza una lista de bboxes; devuelve un código de error por bbox"""
+    try:
+        data = await request.json()
+        
+        if not data or not isinstance(data.get('bboxes'), list):
+            return JSONResponse({
+                "error": "Falta el campo 'bboxes' (lista de bbox_corners) en la petición"
+            }, status_code=400)
+        
+        if len(data['bboxes']) > MAX_BATCH_BBOXES:
+            return JSONResponse({
+                "error": f"Máximo {MAX_BATCH_BBOXES} bboxes por petición"
+            }, status_code=400)
+        
+        return JSONResponse(build_bbox_batch_response(data['bboxes']), status_code=200)
+        
+    except Exception as e:
+        return JSONResponse({
+            "error": f"Error validando coordenadas: {str(e)}"
+        }, status_code=500)
+
+
+def admission_controlled(handler):
+    """Control de admisión antes del handler (ver admission_controlled en app.py)"""
+    @wraps(handler)
+    async def wrapper(request):
+        if admission is None:
+            return await handler(request)
+        
+        try:
+            data = await request.json()
+        except Exception:
+            data = None
+        if not isinstance(data, dict):
+            return await handler(request)
+        
+        accept = request.headers.get('accept')
+        stream = requested_binary_format(accept) is None and wants_ndjson(accept)
+        grid_ok, _, grid_resolution = validate_grid_resolution(
+            data.get('grid_resolution'),
+            MAX_STREAM_GRID_RESOLUTION if stream else MAX_GRID_RESOLUTION
+        )
+        options_ok, _, num_samples, _ = validate_response_options(data, MAX_RESPONSE_SAMPLES)
+        if not (grid_ok and options_ok):
+            return await handler(request)
+        
+        client_key = request.headers.get('x-api-key') or (request.client.host if request.client else None)
+        try:
+            ticket = admission.admit(client_key, estimate_request_cost(grid_resolution, num_samples))
+        except AdmissionRejected as e:
+            return JSONResponse(
+                {"error": e.reason, "retry_after": round(e.retry_after, 1)},
+                status_code=429,
+                headers={"Retry-After": e.retry_after_header}
+            )
+        
+        try:
+            response = await handler(request)
+        except Exception:
+            ticket.release()
+            raise
+        
+        # El stream NDJSON mantiene el cupo hasta enviar la última línea
+        if isinstance(response, StreamingResponse) and response.background is None:
+            response.background = BackgroundTask(ticket.release)
+        else:
+            ticket.release()
+        return response
+    
+    return wrapper
+
+
+@admission_controlled
+async def predict_fire_risk(request):
+    """Endpoint principal de predicción (mismo contrato que app.py)"""
+    try:
+        # 1. Validar petición
+        data = await request.json()
+        
+        if not data:
+            return JSONResponse({"error": "No se recibió JSON en la petición"}, status_code=400)
+        
+        if 'bbox_corners' not in data:
+            return JSONResponse({"error": "Falta el campo 'bbox_corners'"}, status_code=400)
+        
+        if 'forecast_date' not in data:
+            return JSONResponse({"error": "Falta el campo 'forecast_date'"}, status_code=400)
+        
+        forecast_date = data['forecast_date']
+        
+        # 2. Validar coordenadas y normalizar formato
+        is_valid, error_message, bbox_corners = validate_bbox_coordinates(data['bbox_corners'])
+        if not is_valid:
+            return JSONResponse({"error": error_message}, status_code=400)
+        
+        # Formato negociado por Accept (Arrow / MessagePack / NDJSON en streaming)
+        binary_format = requested_binary_format(request.headers.get('accept'))
+        if binary_format and not is_format_available(binary_format):
+            return JSONResponse({"error": f"Formato {binary_format} no disponible en este servidor"}, status_code=406)
+        stream = binary_format is None and wants_ndjson(request.headers.get('accept'))
+        
+        is_valid, error_message, grid_resolution = validate_grid_resolution(
+            data.get('grid_resolution'),
+            MAX_STREAM_GRID_RESOLUTION if stream else MAX_GRID_RESOLUTION
+        )
+        if not is_valid:
+            return JSONResponse({"error": error_message}, status_code=400)
+        
+        is_valid, error_message, num_samples, grid_format = validate_response_options(
+            data,
+            MAX_RESPONSE_SAMPLES
+        )
+        if not is_valid:
+            return JSONResponse({"error": error_message}, status_code=400)
+        
+        # Campos internos del reparto multi-shard: solo desde el router
+        if ('features' in data or 'regions' in data) and not is_trusted_router(
+                request.headers.get(ROUTER_TOKEN_HEADER), ROUTER_SHARED_SECRET):
+            return JSONResponse({"error": "Los campos 'features' y 'regions' solo se aceptan desde el router"},
+                                status_code=403)
+        
+        is_valid, error_message, only_regions = validate_region_filter(
+            data.get('regions'),
+            predictor.package_regions
+        )
+        if not is_valid:
+            return JSONResponse({"error": error_message}, status_code=400)
+        
+        is_valid, error_message, routed_features = validate_feature_rows(
+            data.get('features'),
+            grid_resolution * grid_resolution,
+            bbox_corners
+        )
+        if not is_valid:
+            return JSONResponse({"error": error_message}, status_code=400)
+        
+        # 3. Validar modelo
+        if not predictor.is_loaded:
+            return JSONResponse({"error": "Modelo no cargado"}, status_code=500)
+        
+        print(f"\n🎯 Nueva predicción solicitada (async):")
+        print(f"   Área: {bbox_corners}")
+        print(f"   Fecha: {forecast_date}")
+        
+        loop = asyncio.get_running_loop()
+        
+        if routed_features is not None:
+            # Bbox repartido por router_app.py: el clima ya se pidió una sola vez
+            features, regions = predictor.assign_models(routed_features, only_regions=only_regions)
+        else:
+            # 4. Obtener datos meteorológicos sin bloquear el event loop
+            weather_data = await weather_api.get_weather_for_area_async(
+                bbox_corners,
+                forecast_date,
+                grid_resolution
+            )
+            
+            # Fallback a datos sintéticos si API falla
+            if weather_data is None:
+                print("API meteorológica falló, usando datos sintéticos...")
+                weather_data = generate_synthetic_weather_data(bbox_corners, grid_resolution, forecast_date)
+            
+            features, regions = await loop.run_in_executor(
+                inference_executor,
+                partial(predictor.build_feature_matrix, weather_data, only_regions=only_regions)
+            )
+        
+        # 5. Hacer predicciones en el pool de inferencia acotado
+        probabilities = await loop.run_in_executor(
+            inference_executor,
+            predictor.score_features,
+            features,
+            regions
+        )
+        
+        if len(probabilities) == 0:
+            return JSONResponse({
+                "error": "No se pudieron generar predicciones"
+            }, status_code=500)
+        
+        # Clientes máquina: columnas directamente desde los arrays del predictor
+        if binary_format:
+            body, media_type = await run_in_threadpool(
+                create_binary_api_response,
+                features,
+                probabilities,
+                binary_format,
+                num_samples
+            )
+            return Response(body, media_type=media_type)
+        
+        # Grillas grandes: el iterador síncrono corre en el threadpool (Earth Engine bloquea)
+        if stream:
+            return StreamingResponse(
+                iter_ndjson_response(features, probabilities, forecast_date, num_samples, STREAM_CHUNK_ROWS),
+                media_type=NDJSON_MIMETYPE
+            )
+        
+        # 6. Crear respuesta (Earth Engine es bloqueante, va al threadpool general)
+        response = await run_in_threadpool(
+            create_grid_api_response,
+            features,
+            probabilities,
+            forecast_date,
+            bbox_corners,
+            num_samples,
+            grid_format
+        )
+        
+        print(f"Predicción completada: {response['fire_risk_assessment']['overall_risk_level']}")
+        
+        return JSONResponse(response, status_code=200)
+        
+    except RegionNotLoadedError as e:
+        return JSONResponse({"error": str(e), "regions": e.regions}, status_code=421)
+        
+    except Exception as e:
+        print(f"Error en predicción: {e}")
+        return JSONResponse({
+            "error": f"Error procesando predicción: {str(e)}"
+        }, status_code=500)
+
+
+async def risk_tile(request):
+    """Tesela de riesgo Web Mercator z/x/y (mismo contrato que app.py)"""
+    try:
+        z = request.path_params['z']
+        x = request.path_params['x']
+        y = request.path_params['y']
+        
+        if not is_valid_tile(z, x, y, MAX_TILE_ZOOM):
+            return JSONResponse({"error": f"Tesela inválida (zoom máximo {MAX_TILE_ZOOM})"}, status_code=400)
+        
+        forecast_date = request.query_params.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
+        try:
+            datetime.strptime(forecast_date, '%Y-%m-%d')
+        except ValueError:
+            return JSONResponse({"error": "date debe tener formato YYYY-MM-DD"}, status_code=400)
+        
+        tile_format = request.query_params.get('format', 'png')
+        if tile_format not in ('png', 'bin'):
+            return JSONResponse({"error": "format debe ser 'png' o 'bin'"}, status_code=400)
+        
+        grid, cache_hit, synthetic = await run_in_threadpool(tile_service.get_tile, z, x, y, forecast_date)
+        
+        if tile_format == 'png':
+            body, media_type = encode_tile_png(grid), 'image/png'
+        else:
+            body, media_type = encode_tile_binary(grid), 'application/octet-stream'
+        
+        return Response(body, media_type=media_type, headers={
+            'Cache-Control': tile_cache_control(synthetic, TILE_CACHE_MAX_AGE),
+            'X-Tile-Grid-Size': str(grid.shape[0]),
+            'X-Model-Version': tile_service.model_version,
+            'X-Cache': 'HIT' if cache_hit else 'MISS'
+        })
+        
+    except Exception as e:
+        print(f"Error generando tesela: {e}")
+        return JSONResponse({
+            "error": f"Error generando tesela: {str(e)}"
+        }, status_code=500)
+
+
+async def not_found(request, exc):
+    """Manejo de rutas no encontradas"""
+    return JSONResponse({
+        "error": "Endpoint no encontrado",
+        "available_endpoints": AVAILABLE_ENDPOINTS
+    }, status_code=404)
+
+
+async def internal_error(request, exc):
+    """Manejo de errores internos"""
+    return JSONResponse({
+        "error": "Error interno del servidor",
+        "message": str(exc)
+    }, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Earth Engine se conecta en segundo plano: no bloquea el arranque ni la primera petición
+    earth_engine_client.start_background_initialization()
+    warmup.start()
+    print("API ASGI lista para recibir peticiones")
+    yield
+    await weather_api.aclose()
+    inference_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/', index, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+        Route('/ready', readiness_check, methods=['GET']),
+        Route('/model-info', model_info, methods=['GET']),
+        Route('/validate-coordinates', validate_coordinates, methods=['POST']),
+        Route('/validate-coordinates/batch', validate_coordinates_batch, methods=['POST']),
+        Route('/predict-fire-risk', predict_fire_risk, methods=['POST']),
+        Route('/tiles/{z:int}/{x:int}/{y:int}', risk_tile, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(GZipMiddleware, minimum_size=int(os.getenv('COMPRESS_MIN_SIZE', '1024')))
+    ],
+    exception_handlers={404: not_found, 500: internal_error},
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    # Modo desarrollo
+    import uvicorn
+    
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,270 @@
+"""
+Replay de tráfico capturado (CAPTURE_PATH) contra una instancia local
+
+Lee una captura JSON Lines de utils/traffic_capture.py y reproduce las
+peticiones respetando los tiempos entre llegadas originales (divididos por
+--speed), en lazo abierto: una petición lenta no retrasa a las siguientes.
+Por defecto arranca el servidor (gevent o asgi) con el stub de Meteomatics
+(benchmarks/stub_meteomatics.py) y Earth Engine simulado, así la prueba
+no depende de servicios externos.
+
+Reporta latencias (p50/p90/p95/p99/max), tasa de errores y códigos HTTP
+por endpoint, la mezcla de tamaños de grilla y el retraso del propio
+generador respecto del plan.
+
+Uso:
+    python benchmarks/replay_traffic.py --capture captures/traffic.jsonl
+    python benchmarks/replay_traffic.py --capture captures/traffic.jsonl --speed 5 --mode asgi
+    python benchmarks/replay_traffic.py --capture captures/traffic.jsonl --base-url http://127.0.0.1:5000
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving_benchmark import MODES, ROOT  # noqa: E402
+from stub_meteomatics import StubMeteomaticsServer  # noqa: E402
+
+DEFAULT_CAPTURE = os.path.join(ROOT, 'captures', 'traffic.jsonl')
+
+
+def load_capture(path, limit=None):
+    """Peticiones de la captura ordenadas por timestamp, con offset desde la primera"""
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    
+    records.sort(key=lambda record: record['timestamp'])
+    if limit:
+        records = records[:limit]
+    
+    if records:
+        first = records[0]['timestamp']
+        for record in records:
+            record['offset'] = record['timestamp'] - first
+    return records
+
+
+def _endpoint(record):
+    """Nombre agrupado del endpoint (las teselas se agrupan por formato)"""
+    if record['path'].startswith('/tiles/'):
+        return f"GET /tiles ({record['query'].get('format', 'png')})"
+    return f"{record['method']} {record['path']}"
+
+
+def _grid_points(record):
+    payload = record.get('payload') or {}
+    if record['path'] != '/predict-fire-risk':
+        return None
+    resolution = payload.get('grid_resolution', 5)
+    return resolution * resolution if isinstance(resolution, int) else None
+
+
+def _wait_until_ready(base_url, timeout=180):
+    """Espera /ready (o /health si el modo no tiene readiness)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            response = requests.get(f'{base_url}/ready', timeout=2)
+            if response.status_code == 200:
+                return True
+            if response.status_code == 404:
+                if requests.get(f'{base_url}/health', timeout=2).status_code == 200:
+                    return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def replay(records, base_url, speed=1.0, concurrency=64, timeout=120):
+    """
+    Reproduce las peticiones y devuelve un resultado por petición
+    
+    Args:
+        speed: Multiplicador de ritmo (2 = el doble de rápido; 0 = sin esperas)
+        concurrency: Peticiones simultáneas máximas del generador
+    """
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    results = []
+    results_lock = threading.Lock()
+    
+    def send(record, scheduled_at):
+        headers = {}
+        for header, key in (('Accept', 'accept'), ('Accept-Encoding', 'accept_encoding'),
+                            ('X-API-Key', 'client')):
+            if record.get(key):
+                headers[header] = record[key]
+        
+        lag = time.perf_counter() - scheduled_at
+        start = time.perf_counter()
+        try:
+            response = session.request(
+                record['method'],
+                f"{base_url}{record['path']}",
+                params=record.get('query') or None,
+                json=record.get('payload') if record['method'] == 'POST' else None,
+                headers=headers,
+                timeout=timeout
+            )
+            # Incluye la lectura completa del cuerpo (streams NDJSON)
+            _ = response.content
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        
+        with results_lock:
+            results.append({
+                'endpoint': _endpoint(record),
+                'status': status,
+                'latency_ms': (time.perf_counter() - start) * 1000,
+                'lag_ms': lag * 1000,
+                'grid_points': _grid_points(record)
+            })
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            scheduled_at = started + (record['offset'] / speed if speed > 0 else 0)
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, record, scheduled_at)
+    
+    return results, time.perf_counter() - started
+
+
+def _latency_summary(latencies):
+    latencies = np.asarray(latencies)
+    return {
+        'p50': round(float(np.percentile(latencies, 50)), 1),
+        'p90': round(float(np.percentile(latencies, 90)), 1),
+        'p95': round(float(np.percentile(latencies, 95)), 1),
+        'p99': round(float(np.percentile(latencies, 99)), 1),
+        'max': round(float(latencies.max()), 1)
+    }
+
+
+def summarize(results, elapsed):
+    """Métricas globales y por endpoint"""
+    by_endpoint = defaultdict(list)
+    for result in results:
+        by_endpoint[result['endpoint']].append(result)
+    
+    def metrics(group):
+        statuses = Counter('error' if r['status'] is None else str(r['status']) for r in group)
+        # Errores: sin respuesta o 5xx; los 429 (admisión) se informan aparte
+        errors = sum(1 for r in group if r['status'] is None or r['status'] >= 500)
+        return {
+            'requests': len(group),
+            'error_rate': round(errors / len(group), 4),
+            'shed_rate': round(statuses.get('429', 0) / len(group), 4),
+            'status_codes': dict(statuses),
+            'latency_ms': _latency_summary([r['latency_ms'] for r in group])
+        }
+    
+    grid_points = [r['grid_points'] for r in results if r['grid_points']]
+    
+    return {
+        'requests': len(results),
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        'overall': metrics(results) if results else None,
+        'endpoints': {name: metrics(group) for name, group in sorted(by_endpoint.items())},
+        'grid_points_mix': dict(sorted(Counter(grid_points).items())),
+        'generator_lag_ms': _latency_summary([r['lag_ms'] for r in results]) if results else None
+    }
+
+
+def start_server(mode, port, stub_url, extra_env):
+    """Arranca el servidor con Meteomatics stub y Earth Engine simulado"""
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        METEOMATICS_URL=stub_url,
+        METEOMATICS_USER='replay',
+        METEOMATICS_PASS='replay',
+        EARTH_ENGINE_MODE='simulated',
+        AOI_SCHEDULER_ENABLED='false',
+        **extra_env
+    )
+    # El replay no debe volver a capturarse
+    env.pop('CAPTURE_PATH', None)
+    return subprocess.Popen(MODES[mode], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capture', default=DEFAULT_CAPTURE, help='Captura JSON Lines (CAPTURE_PATH)')
+    parser.add_argument('--speed', type=float, default=1.0, help='Multiplicador de ritmo (0 = sin esperas)')
+    parser.add_argument('--limit', type=int, default=None, help='Máximo de peticiones a reproducir')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--mode', default='gevent', choices=list(MODES))
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--base-url', default=None, help='Instancia ya levantada (no arranca servidor ni stubs)')
+    parser.add_argument('--stub-port', type=int, default=0, help='Puerto del stub de Meteomatics (0 = libre)')
+    parser.add_argument('--stub-latency-ms', type=float, default=150.0)
+    parser.add_argument('--stub-jitter-ms', type=float, default=100.0)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--no-admission', action='store_true', help='Desactiva el control de admisión')
+    parser.add_argument('--output', default=None, help='Guarda el reporte JSON en este archivo')
+    args = parser.parse_args()
+    
+    records = load_capture(args.capture, args.limit)
+    if not records:
+        sys.exit(f'La captura {args.capture} está vacía')
+    
+    stub = server = None
+    base_url = args.base_url
+    try:
+        if base_url is None:
+            stub = StubMeteomaticsServer(
+                args.stub_port, args.stub_latency_ms, args.stub_jitter_ms, args.stub_error_rate
+            ).start()
+            extra_env = {'ADMISSION_ENABLED': 'false'} if args.no_admission else {}
+            server = start_server(args.mode, args.port, stub.url, extra_env)
+            base_url = f'http://127.0.0.1:{args.port}'
+            if not _wait_until_ready(base_url):
+                sys.exit(f'El servidor {args.mode} no quedó listo')
+        
+        span = records[-1]['offset'] / args.speed if args.speed > 0 else 0
+        print(f"Reproduciendo {len(records)} peticiones (~{span:.0f}s) contra {base_url}")
+        results, elapsed = replay(records, base_url, args.speed, args.concurrency)
+        report = summarize(results, elapsed)
+        if stub is not None:
+            report['stub_meteomatics_requests'] = stub.requests
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if stub is not None:
+            stub.stop()
+    
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
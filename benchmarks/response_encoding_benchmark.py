@@ -0,0 +1,77 @@
+"""
+Benchmark de codificación de respuestas de /predict-fire-risk
+
+Compara, para una respuesta con N puntos en risk_grid:
+- json estándar (provider por defecto de Flask) vs orjson
+- risk_grid por filas vs columnar
+- tamaño sin comprimir, gzip y brotli
+
+Uso:
+    python benchmarks/response_encoding_benchmark.py --grid 100 --samples 2000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from utils.fire_predictor import OptimizedFirePredictor  # noqa: E402
+from utils.response_formatter import create_grid_api_response  # noqa: E402
+from utils.response_encoding import dumps_json, brotli  # noqa: E402
+from utils.weather_api import generate_synthetic_weather_data  # noqa: E402
+
+
+def _best_of(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', type=int, default=100, help='Puntos por lado de la grilla')
+    parser.add_argument('--samples', type=int, default=2000, help='Puntos en risk_grid')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    predictor = OptimizedFirePredictor(os.path.join(ROOT, 'models', 'fire_prediction_models_complete.pkl'))
+    bbox = {'top_left': [-10.0, -75.0], 'bottom_right': [-15.0, -70.0]}
+    features, regions = predictor.build_feature_matrix(
+        generate_synthetic_weather_data(bbox, args.grid, '2025-10-06')
+    )
+    probabilities = predictor.score_features(features, regions)
+    
+    stdlib_dumps = lambda obj: json.dumps(obj, default=DefaultJSONProvider.default, separators=(',', ':')).encode()  # noqa: E731
+    
+    print(f"\nGrilla {args.grid}x{args.grid}, {args.samples} puntos en risk_grid\n")
+    print(f"{'formato':<10} {'encoder':<8} {'build ms':>9} {'encode ms':>10} {'bytes':>10} {'gzip':>9} {'br':>9}")
+    
+    for grid_format in ('rows', 'columnar'):
+        build_ms, response = _best_of(
+            lambda: create_grid_api_response(
+                features, probabilities, '2025-10-06', bbox, args.samples, grid_format
+            ),
+            args.repeat
+        )
+        
+        for name, dumps in (('json', stdlib_dumps), ('orjson', dumps_json)):
+            encode_ms, body = _best_of(lambda: dumps(response), args.repeat)
+            gzip_size = len(gzip.compress(body, compresslevel=6))
+            br_size = len(brotli.compress(body, quality=6)) if brotli is not None else float('nan')
+            print(f"{grid_format:<10} {name:<8} {build_ms:>9.1f} {encode_ms:>10.2f} "
+                  f"{len(body):>10} {gzip_size:>9} {br_size:>9}")
+
+
+if __name__ == '__main__':
+    main()
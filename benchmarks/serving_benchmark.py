@@ -0,0 +1,155 @@
+"""
+Benchmark de serving: gunicorn+gevent (app.py) vs gunicorn+uvicorn (asgi_app.py)
+
+Arranca cada modo con su archivo de configuración (mismo número de workers,
+es decir, el mismo presupuesto de memoria), dispara peticiones concurrentes a
+/predict-fire-risk y reporta latencias, throughput y memoria RSS máxima.
+
+Uso:
+    python benchmarks/serving_benchmark.py --requests 200 --concurrency 20
+    python benchmarks/serving_benchmark.py --modes asgi --port 5055
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'gevent': ['gunicorn', '-c', 'gunicorn_config.py', 'app:app'],
+    'asgi': ['gunicorn', '-c', 'gunicorn_asgi_config.py', 'asgi_app:app'],
+}
+
+
+def _process_tree_rss_mb(pid):
+    """Suma la RSS (MB) del proceso y sus hijos leyendo /proc"""
+    pids = [pid]
+    try:
+        output = subprocess.run(['pgrep', '-P', str(pid)], capture_output=True, text=True).stdout
+        pids += [int(p) for p in output.split()]
+    except Exception:
+        pass
+    
+    total_kb = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def _wait_until_ready(base_url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{base_url}/health', timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_mode(mode, payload, total_requests, concurrency, port):
+    """Ejecuta el benchmark para un modo y devuelve sus métricas"""
+    env = dict(os.environ, PORT=str(port))
+    server = subprocess.Popen(
+        MODES[mode], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    
+    try:
+        if not _wait_until_ready(base_url):
+            raise RuntimeError(f'El servidor {mode} no respondió a /health')
+        
+        peak_rss = [_process_tree_rss_mb(server.pid)]
+        stop_sampling = threading.Event()
+        
+        def sample_memory():
+            while not stop_sampling.is_set():
+                peak_rss[0] = max(peak_rss[0], _process_tree_rss_mb(server.pid))
+                time.sleep(0.2)
+        
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        sampler.start()
+        
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        session.mount('http://', adapter)
+        
+        def one_request(_):
+            start = time.perf_counter()
+            try:
+                response = session.post(f'{base_url}/predict-fire-risk', json=payload, timeout=120)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - start, ok
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one_request, range(total_requests)))
+        elapsed = time.perf_counter() - started
+        
+        stop_sampling.set()
+        sampler.join()
+        
+        latencies = np.array([r[0] for r in results]) * 1000
+        errors = sum(1 for r in results if not r[1])
+        
+        return {
+            'mode': mode,
+            'requests': total_requests,
+            'concurrency': concurrency,
+            'throughput_rps': round(total_requests / elapsed, 1),
+            'latency_ms': {
+                'p50': round(float(np.percentile(latencies, 50)), 1),
+                'p95': round(float(np.percentile(latencies, 95)), 1),
+                'p99': round(float(np.percentile(latencies, 99)), 1),
+                'max': round(float(latencies.max()), 1)
+            },
+            'errors': errors,
+            'peak_rss_mb': round(peak_rss[0], 1)
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--payload', default=os.path.join(ROOT, 'test_data', 'example_request.json'))
+    args = parser.parse_args()
+    
+    with open(args.payload) as f:
+        payload = json.load(f)
+    
+    for mode in args.modes:
+        print(json.dumps(run_mode(mode, payload, args.requests, args.concurrency, args.port)))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
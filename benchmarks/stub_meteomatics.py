@@ -0,0 +1,134 @@
+"""
+Servidor stub de Meteomatics para pruebas de carga y replay
+
+Responde las URLs que arma MeteomaticsWeatherAPI
+(/{fecha}T12:00:00Z/{parámetros}/{lat_max},{lon_min}_{lat_min},{lon_max}:{N}x{N}/json)
+con el mismo JSON que la API real, generado con los datos sintéticos
+sembrados del fallback. La latencia y la tasa de errores son configurables.
+
+Uso:
+    python benchmarks/stub_meteomatics.py --port 5099 --latency-ms 250
+    METEOMATICS_URL=http://127.0.0.1:5099 gunicorn -c gunicorn_config.py app:app
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.weather_api import generate_synthetic_weather_data  # noqa: E402
+
+REQUEST_PATH = re.compile(
+    r'^/(?P<date>\d{4}-\d{2}-\d{2})T[^/]*/(?P<params>[^/]+)/'
+    r'(?P<lat_max>[-\d.]+),(?P<lon_min>[-\d.]+)_(?P<lat_min>[-\d.]+),(?P<lon_max>[-\d.]+)'
+    r':(?P<n>\d+)x\d+/json$'
+)
+
+
+def build_response(match):
+    """JSON con el formato de Meteomatics para la grilla pedida"""
+    bbox_corners = {
+        'top_left': [float(match['lat_max']), float(match['lon_min'])],
+        'bottom_right': [float(match['lat_min']), float(match['lon_max'])]
+    }
+    weather_df = generate_synthetic_weather_data(bbox_corners, int(match['n']), match['date'])
+    date_iso = f"{match['date']}T12:00:00Z"
+    
+    data = []
+    for parameter in match['params'].split(','):
+        if parameter not in weather_df.columns:
+            continue
+        data.append({
+            'parameter': parameter,
+            'coordinates': [
+                {'lat': lat, 'lon': lon, 'dates': [{'date': date_iso, 'value': value}]}
+                for lat, lon, value in zip(
+                    weather_df['latitude'].tolist(),
+                    weather_df['longitude'].tolist(),
+                    weather_df[parameter].tolist()
+                )
+            ]
+        })
+    return {'version': '3.0', 'status': 'OK', 'data': data}
+
+
+class StubMeteomaticsServer:
+    """Servidor HTTP en un hilo, para usar desde otros scripts"""
+    
+    def __init__(self, port=5099, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.send_response(200)
+                self.end_headers()
+            
+            def do_GET(self):
+                stub.requests += 1
+                delay = stub.latency_ms + random.uniform(0, stub.jitter_ms)
+                time.sleep(delay / 1000)
+                
+                match = REQUEST_PATH.match(self.path)
+                if match is None:
+                    self._send(404, {'status': 'error', 'message': 'URL no soportada'})
+                elif random.random() < stub.error_rate:
+                    self._send(503, {'status': 'error', 'message': 'error simulado'})
+                else:
+                    self._send(200, build_response(match))
+            
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='stub-meteomatics', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    
+    stub = StubMeteomaticsServer(args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Stub de Meteomatics escuchando en {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+# Gunicorn configuration para el punto de entrada ASGI (asgi_app.py)
+# Mismo presupuesto de memoria que gunicorn_config.py (1 worker),
+# cambiando solo la clase de worker
+
+from gunicorn_config import *  # noqa: F401,F403
+
+# Worker ASGI de uvicorn (event loop asyncio en lugar de gevent)
+worker_class = "uvicorn.workers.UvicornWorker"
@@ -2,6 +2,7 @@
 # Para Render, Railway, Heroku, etc.
 
 import os
+import sys
 
 # Bind to PORT provided by hosting service (e.g., Render, Heroku)
 bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
@@ -35,3 +36,20 @@ preload_app = False
 # Max requests per worker before restart (prevents memory leaks)
 max_requests = 1000
 max_requests_jitter = 50
+
+
+def post_worker_init(worker):
+    # Calentamiento: el worker no acepta conexiones hasta terminar (ver utils/warmup.py).
+    # WARMUP_TIMEOUT se lee aquí: gunicorn ignora variables de config que no conoce
+    warmup_timeout = float(os.environ.get('WARMUP_TIMEOUT', '60'))
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'warmup'):
+        if not app_module.warmup.wait(warmup_timeout):
+            worker.log.warning("Calentamiento incompleto tras %ss, aceptando tráfico igual", warmup_timeout)
+
+
+def worker_exit(server, worker):
+    # Teselas más usadas a disco para que el próximo worker arranque con caché
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'save_warm_caches'):
+        app_module.save_warm_caches()
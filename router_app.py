@@ -0,0 +1,506 @@
+"""
+Router de shards regionales para la API de Predicción de Incendios
+
+Cada shard es una instancia de app.py con MODEL_REGIONS (solo algunos
+modelos regionales en memoria). Este proceso no deserializa modelos: lee
+los límites de región del PKL, detecta a qué shard corresponde cada
+petición y la reenvía tal cual. Los bbox y teselas que cruzan shards se
+reparten (cada shard puntúa solo sus regiones) y se combinan acá; para
+los bbox el clima se pide una sola vez en el router y cada shard recibe
+sus filas de la matriz de features.
+
+Uso:
+    SHARD_MAP='{"http://127.0.0.1:5001": ["north_america", "south_america"],
+                "http://127.0.0.1:5002": ["africa", "europe", "asia", "oceania", "other"]}' \\
+        gunicorn -c gunicorn_config.py router_app:app
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import requests
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
+from dotenv import load_dotenv
+
+from utils.fire_predictor import OptimizedFirePredictor
+from utils.circuit_breaker import CircuitBreaker
+from utils.weather_api import MeteomaticsWeatherAPI, generate_synthetic_weather_data
+from utils.tile_service import is_valid_tile, encode_tile_png, encode_tile_binary, tile_cache_control
+from utils.region_router import (
+    ROUTER_TOKEN_HEADER,
+    RegionRouter,
+    UnroutableRegionError,
+    parse_shard_map,
+    parse_ndjson_grid,
+    merge_shard_grids,
+    merge_tile_grids
+)
+from utils.response_formatter import (
+    create_grid_api_response,
+    create_binary_api_response,
+    iter_ndjson_response,
+    validate_bbox_coordinates,
+    build_bbox_batch_response,
+    validate_grid_resolution,
+    validate_response_options
+)
+from utils.response_encoding import install_response_encoding, wants_ndjson, NDJSON_MIMETYPE
+from utils.binary_formats import requested_binary_format, is_format_available
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Inicializar Flask
+app = Flask(__name__)
+CORS(app, resources={r"/*": {"origins": "*"}})
+
+install_response_encoding(
+    app,
+    min_size=int(os.getenv('COMPRESS_MIN_SIZE', '1024')),
+    compress_level=int(os.getenv('COMPRESS_LEVEL', '6'))
+)
+
+# Configuración (mismos límites que los shards)
+MODEL_PATH = os.getenv('MODEL_PATH', 'models/fire_prediction_models_complete.pkl')
+SHARD_MAP = parse_shard_map(os.getenv('SHARD_MAP'))
+ROUTER_TIMEOUT = float(os.getenv('ROUTER_TIMEOUT', '300'))
+ROUTER_FANOUT_THREADS = int(os.getenv('ROUTER_FANOUT_THREADS', '16'))
+# Mismo valor en los shards: autoriza los campos "features" y "regions" del reparto
+ROUTER_SHARED_SECRET = os.getenv('ROUTER_SHARED_SECRET', '')
+MAX_GRID_RESOLUTION = int(os.getenv('MAX_GRID_RESOLUTION', '100'))
+MAX_RESPONSE_SAMPLES = int(os.getenv('MAX_RESPONSE_SAMPLES', '500'))
+MAX_BATCH_BBOXES = int(os.getenv('MAX_BATCH_BBOXES', '10000'))
+MAX_STREAM_GRID_RESOLUTION = int(os.getenv('MAX_STREAM_GRID_RESOLUTION', '300'))
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', '1000'))
+TILE_GRID_SIZE = int(os.getenv('TILE_GRID_SIZE', '16'))
+MAX_TILE_ZOOM = int(os.getenv('MAX_TILE_ZOOM', '18'))
+TILE_CACHE_MAX_AGE = int(os.getenv('TILE_CACHE_MAX_AGE', '3600'))
+
+# Meteomatics: los bbox multi-shard piden el clima una vez desde el router
+METEOMATICS_USER = os.getenv('METEOMATICS_USER')
+METEOMATICS_PASS = os.getenv('METEOMATICS_PASS')
+METEOMATICS_URL = os.getenv('METEOMATICS_URL', 'https://api.meteomatics.com')
+METEOMATICS_TIMEOUT = float(os.getenv('METEOMATICS_TIMEOUT', '30'))
+METEOMATICS_HEDGE = os.getenv('METEOMATICS_HEDGE', 'false').lower() == 'true'
+METEOMATICS_MIN_HEDGE_DELAY = float(os.getenv('METEOMATICS_MIN_HEDGE_DELAY', '1.0'))
+METEOMATICS_BREAKER_RESET_SECONDS = float(os.getenv('METEOMATICS_BREAKER_RESET_SECONDS', '30'))
+METEOMATICS_SLOW_CALL_SECONDS = float(os.getenv('METEOMATICS_SLOW_CALL_SECONDS', '10'))
+
+# Cabeceras que pasan del cliente al shard y del shard al cliente
+FORWARDED_REQUEST_HEADERS = ('Accept', 'Accept-Encoding', 'Content-Type', 'X-API-Key')
+FORWARDED_RESPONSE_HEADERS = (
+    'Content-Type', 'Content-Encoding', 'Vary', 'Retry-After', 'Cache-Control',
+    'X-Precomputed-At', 'X-Tile-Grid-Size', 'X-Model-Version', 'X-Cache'
+)
+
+# Solo límites de región y orden del paquete: ningún modelo en memoria
+print("🚀 Inicializando router de shards...")
+predictor = OptimizedFirePredictor(MODEL_PATH, regions=())
+
+if not predictor.is_loaded:
+    print("❌ ERROR: No se pudo leer el paquete de modelos")
+    exit(1)
+
+if not SHARD_MAP:
+    print("❌ ERROR: SHARD_MAP no está configurado")
+    exit(1)
+
+router = RegionRouter(predictor, SHARD_MAP)
+
+if len(router.shards) > 1 and not ROUTER_SHARED_SECRET:
+    print("⚠️ ROUTER_SHARED_SECRET no está configurado: los shards van a rechazar los bbox multi-shard (403)")
+
+weather_api = MeteomaticsWeatherAPI(
+    METEOMATICS_USER,
+    METEOMATICS_PASS,
+    METEOMATICS_URL,
+    timeout=METEOMATICS_TIMEOUT,
+    circuit_breaker=CircuitBreaker(
+        slow_call_seconds=METEOMATICS_SLOW_CALL_SECONDS,
+        reset_timeout=METEOMATICS_BREAKER_RESET_SECONDS,
+        probe_timeout=2 * METEOMATICS_TIMEOUT
+    ),
+    hedge_enabled=METEOMATICS_HEDGE,
+    min_hedge_delay=METEOMATICS_MIN_HEDGE_DELAY
+)
+
+session = requests.Session()
+session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=100))
+session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=100))
+
+# Reparto de un bbox multi-shard (con gevent son greenlets)
+fanout_executor = ThreadPoolExecutor(max_workers=ROUTER_FANOUT_THREADS)
+
+for shard_url in router.shards:
+    regions = sorted(region for region, url in SHARD_MAP.items() if url == shard_url)
+    print(f"   {shard_url}: {', '.join(regions)}")
+
+print("Router listo para recibir peticiones")
+
+
+def _forward_headers(overrides=None):
+    """Cabeceras para el shard, con la IP del cliente en X-Forwarded-For"""
+    headers = {name: request.headers[name] for name in FORWARDED_REQUEST_HEADERS if name in request.headers}
+    # Sin Accept-Encoding del cliente el shard no comprime (el cuerpo se reenvía tal cual)
+    headers.setdefault('Accept-Encoding', 'identity')
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    headers['X-Forwarded-For'] = f"{forwarded_for}, {request.remote_addr}" if forwarded_for else request.remote_addr
+    headers.update(overrides or {})
+    return headers
+
+
+def _relay(upstream):
+    """Respuesta del shard tal cual (sin descomprimir), en streaming"""
+    response = Response(upstream.raw.stream(64 * 1024, decode_content=False), status=upstream.status_code)
+    for name in FORWARDED_RESPONSE_HEADERS:
+        if name in upstream.headers:
+            response.headers[name] = upstream.headers[name]
+    response.call_on_close(upstream.close)
+    return response
+
+
+def _proxy(shard_url, path):
+    """Reenvía la petición actual a un shard"""
+    upstream = session.request(
+        request.method,
+        f"{shard_url}{path}",
+        params=request.args,
+        data=request.get_data(),
+        headers=_forward_headers(),
+        stream=True,
+        timeout=ROUTER_TIMEOUT
+    )
+    return _relay(upstream)
+
+
+def _fetch_partial_grid(shard_url, regions, features, data, bbox_corners, headers):
+    """
+    Puntuación de las filas del shard, pedida en NDJSON (corre fuera del contexto de la petición)
+    
+    Returns:
+        tuple: (respuesta de error del shard o None, (lats, lons, probabilidades, códigos, terreno))
+    """
+    upstream = session.post(
+        f"{shard_url}/predict-fire-risk",
+        json=dict(data, bbox_corners=bbox_corners, regions=regions, features=features.tolist()),
+        headers=headers,
+        stream=True,
+        timeout=ROUTER_TIMEOUT
+    )
+    if upstream.status_code != 200:
+        return _relay(upstream), None
+    
+    with upstream:
+        _, lats, lons, probabilities, codes, terrain = parse_ndjson_grid(upstream.iter_lines())
+    return None, (lats, lons, probabilities, codes, terrain)
+
+
+def _fetch_partial_tile(shard_url, path, forecast_date, headers):
+    """Tesela del shard en formato bin; las celdas de otras regiones vienen en NO_DATA"""
+    upstream = session.get(
+        f"{shard_url}{path}",
+        params={'date': forecast_date, 'format': 'bin'},
+        headers=headers,
+        stream=True,
+        timeout=ROUTER_TIMEOUT
+    )
+    if upstream.status_code != 200:
+        return upstream, None
+    
+    grid_size = int(upstream.headers.get('X-Tile-Grid-Size', TILE_GRID_SIZE))
+    grid = np.frombuffer(upstream.content, dtype=np.uint8).reshape(grid_size, grid_size)
+    return upstream, grid
+
+
+def _check_shard(shard_url):
+    try:
+        response = session.get(f"{shard_url}/ready", timeout=5)
+        return {"ready": response.status_code == 200, "status_code": response.status_code}
+    except requests.RequestException as e:
+        return {"ready": False, "error": str(e)}
+
+
+def _shards_status():
+    return dict(zip(router.shards, fanout_executor.map(_check_shard, router.shards)))
+
+
+@app.route('/')
+def index():
+    return "Router de shards de la API de Predicción de Incendios activo", 200
+
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Estado del router y readiness de cada shard"""
+    return jsonify({
+        "status": "healthy",
+        "service": "Fire Risk Prediction Router",
+        "version": "1.0",
+        "shards": _shards_status(),
+        "timestamp": datetime.now().isoformat()
+    }), 200
+
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 503 mientras algún shard no esté listo"""
+    shards = _shards_status()
+    ready = all(status['ready'] for status in shards.values())
+    return jsonify({"ready": ready, "shards": shards}), 200 if ready else 503
+
+
+@app.route('/model-info', methods=['GET'])
+def model_info():
+    """Regiones del paquete de modelos y shard asignado a cada una"""
+    return jsonify({
+        "model_metadata": predictor.system_metadata,
+        "package_regions": predictor.package_regions,
+        "shard_map": SHARD_MAP
+    }), 200
+
+
+@app.route('/validate-coordinates', methods=['POST'])
+def validate_coordinates():
+    """Misma validación que los shards, sin salir del router"""
+    data = request.get_json(silent=True)
+    
+    if not data or 'bbox_corners' not in data:
+        return jsonify({"error": "Falta el campo 'bbox_corners' en la petición"}), 400
+    
+    is_valid, error_message, normalized_bbox = validate_bbox_coordinates(data['bbox_corners'])
+    
+    if not is_valid:
+        return jsonify({"valid": False, "error": error_message}), 400
+    
+    return jsonify({
+        "valid": True,
+        "message": "Coordenadas válidas",
+        "bbox_corners": normalized_bbox
+    }), 200
+
+
+@app.route('/validate-coordinates/batch', methods=['POST'])
+def validate_coordinates_batch():
+    """Validación en lote (no necesita modelos)"""
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('bboxes'), list):
+        return jsonify({"error": "Falta el campo 'bboxes' (lista de bbox_corners) en la petición"}), 400
+    
+    if len(data['bboxes']) > MAX_BATCH_BBOXES:
+        return jsonify({"error": f"Máximo {MAX_BATCH_BBOXES} bboxes por petición"}), 400
+    
+    return jsonify(build_bbox_batch_response(data['bboxes'])), 200
+
+
+@app.route('/predict-fire-risk', methods=['POST'])
+def predict_fire_risk():
+    """
+    Predicción ruteada por región (mismo contrato que app.py)
+    
+    Si toda la grilla cae en un shard, la petición se reenvía sin tocar
+    (incluye admisión, pre-cómputo de áreas y formatos). Si cruza shards,
+    cada uno devuelve sus puntos en NDJSON y acá se arma la respuesta en
+    el formato pedido, con estadísticas sobre la grilla completa.
+    """
+    try:
+        data = request.get_json(silent=True)
+        
+        if not data:
+            return jsonify({"error": "No se recibió JSON en la petición"}), 400
+        
+        if 'bbox_corners' not in data:
+            return jsonify({"error": "Falta el campo 'bbox_corners'"}), 400
+        
+        if 'forecast_date' not in data:
+            return jsonify({"error": "Falta el campo 'forecast_date'"}), 400
+        
+        is_valid, error_message, bbox_corners = validate_bbox_coordinates(data['bbox_corners'])
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        binary_format = requested_binary_format(request.headers.get('Accept'))
+        stream = binary_format is None and wants_ndjson(request.headers.get('Accept'))
+        
+        is_valid, error_message, grid_resolution = validate_grid_resolution(
+            data.get('grid_resolution'),
+            MAX_STREAM_GRID_RESOLUTION if stream else MAX_GRID_RESOLUTION
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        route = router.route_bbox(bbox_corners, grid_resolution)
+        
+        if len(route) == 1:
+            return _proxy(next(iter(route)), '/predict-fire-risk')
+        
+        # Bbox multi-shard: el formato se resuelve en el router
+        if binary_format and not is_format_available(binary_format):
+            return jsonify({"error": f"Formato {binary_format} no disponible en este servidor"}), 406
+        
+        is_valid, error_message, num_samples, grid_format = validate_response_options(
+            data,
+            MAX_RESPONSE_SAMPLES
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+        
+        forecast_date = data['forecast_date']
+        
+        # Clima una sola vez para toda la grilla (no una llamada a Meteomatics por shard)
+        weather_data = weather_api.get_weather_for_area(bbox_corners, forecast_date, grid_resolution)
+        if weather_data is None:
+            print("API meteorológica falló, usando datos sintéticos...")
+            weather_data = generate_synthetic_weather_data(bbox_corners, grid_resolution, forecast_date)
+        
+        # Las features se arman sobre la grilla completa (el relleno de elevación
+        # depende de ella) y el reparto se hace con los puntos que devolvió el clima
+        grid_features, grid_regions = predictor.package_feature_matrix(weather_data)
+        route = router.route_points(grid_features[:, 0], grid_features[:, 1])
+        indices = [np.flatnonzero(np.isin(grid_regions, regions)) for regions in route.values()]
+        
+        print(f"🔀 Bbox repartido entre {len(route)} shards: {route}")
+        
+        headers = _forward_headers({'Accept': NDJSON_MIMETYPE, ROUTER_TOKEN_HEADER: ROUTER_SHARED_SECRET})
+        results = list(fanout_executor.map(
+            lambda item: _fetch_partial_grid(item[0][0], item[0][1], grid_features[item[1]],
+                                             data, bbox_corners, headers),
+            zip(route.items(), indices)
+        ))
+        for error_response, _ in results:
+            if error_response is not None:
+                return error_response
+        
+        features, probabilities, codes, terrain = merge_shard_grids([part for _, part in results], indices)
+        
+        if binary_format:
+            body, mimetype = create_binary_api_response(
+                features,
+                probabilities,
+                binary_format,
+                num_samples=num_samples,
+                terrain=terrain,
+                codes=codes
+            )
+            return Response(body, mimetype=mimetype), 200
+        
+        if stream:
+            return Response(
+                iter_ndjson_response(features, probabilities, forecast_date, num_samples,
+                                     STREAM_CHUNK_ROWS, terrain=terrain, codes=codes),
+                mimetype=NDJSON_MIMETYPE
+            ), 200
+        
+        return jsonify(create_grid_api_response(
+            features,
+            probabilities,
+            forecast_date,
+            bbox_corners,
+            num_samples=num_samples,
+            grid_format=grid_format,
+            terrain=terrain,
+            codes=codes
+        )), 200
+    
+    except UnroutableRegionError as e:
+        return jsonify({"error": str(e), "regions": e.regions}), 503
+    
+    except requests.RequestException as e:
+        print(f"Error contactando shard: {e}")
+        return jsonify({"error": f"Shard no disponible: {str(e)}"}), 502
+    
+    except Exception as e:
+        print(f"Error en predicción ruteada: {e}")
+        return jsonify({
+            "error": f"Error procesando predicción: {str(e)}"
+        }), 500
+
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def risk_tile(z, x, y):
+    """Tesela ruteada por región; las que cruzan shards se combinan celda a celda"""
+    try:
+        if not is_valid_tile(z, x, y, MAX_TILE_ZOOM):
+            return jsonify({"error": f"Tesela inválida (zoom máximo {MAX_TILE_ZOOM})"}), 400
+        
+        tile_format = request.args.get('format', 'png')
+        if tile_format not in ('png', 'bin'):
+            return jsonify({"error": "format debe ser 'png' o 'bin'"}), 400
+        
+        path = f'/tiles/{z}/{x}/{y}'
+        route = router.route_tile(z, x, y, TILE_GRID_SIZE)
+        
+        if len(route) == 1:
+            return _proxy(next(iter(route)), path)
+        
+        # La fecha se fija acá para que todos los shards usen la misma
+        forecast_date = request.args.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
+        headers = _forward_headers()
+        results = list(fanout_executor.map(
+            lambda shard_url: _fetch_partial_tile(shard_url, path, forecast_date, headers),
+            route
+        ))
+        for upstream, grid in results:
+            if grid is None:
+                return _relay(upstream)
+            upstream.close()
+        
+        grid = merge_tile_grids([grid for _, grid in results])
+        
+        if tile_format == 'png':
+            body, mimetype = encode_tile_png(grid), 'image/png'
+        else:
+            body, mimetype = encode_tile_binary(grid), 'application/octet-stream'
+        
+        # Si algún shard puntuó con clima sintético, la tesela combinada tampoco se cachea
+        synthetic = any('no-store' in upstream.headers.get('Cache-Control', '') for upstream, _ in results)
+        
+        response = Response(body, mimetype=mimetype)
+        response.headers['Cache-Control'] = tile_cache_control(synthetic, TILE_CACHE_MAX_AGE)
+        response.headers['X-Tile-Grid-Size'] = str(grid.shape[0])
+        response.headers['X-Model-Version'] = results[0][0].headers.get('X-Model-Version', '')
+        response.headers['X-Cache'] = 'HIT' if all(
+            upstream.headers.get('X-Cache') == 'HIT' for upstream, _ in results
+        ) else 'MISS'
+        return response, 200
+    
+    except UnroutableRegionError as e:
+        return jsonify({"error": str(e), "regions": e.regions}), 503
+    
+    except requests.RequestException as e:
+        print(f"Error contactando shard: {e}")
+        return jsonify({"error": f"Shard no disponible: {str(e)}"}), 502
+    
+    except Exception as e:
+        print(f"Error en tesela ruteada: {e}")
+        return jsonify({
+            "error": f"Error generando tesela: {str(e)}"
+        }), 500
+
+
+@app.errorhandler(404)
+def not_found(error):
+    """Manejo de rutas no encontradas (las áreas se registran en el shard de su región)"""
+    return jsonify({
+        "error": "Endpoint no encontrado",
+        "available_endpoints": [
+            "GET /health",
+            "GET /ready",
+            "GET /model-info",
+            "POST /validate-coordinates",
+            "POST /validate-coordinates/batch",
+            "POST /predict-fire-risk",
+            "GET /tiles/{z}/{x}/{y}"
+        ]
+    }), 404
+
+
+if __name__ == '__main__':
+    app.run(
+        host='0.0.0.0',
+        port=int(os.getenv('PORT', '5000')),
+        debug=False
+    )
@@ -0,0 +1,101 @@
+import pytest
+
+from utils import admission as admission_module
+from utils.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    TokenBucket,
+    estimate_request_cost
+)
+
+
+class FakeMonotonic:
+    def __init__(self):
+        self.now = 100.0
+    
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeMonotonic()
+    monkeypatch.setattr(admission_module, 'time', clock)
+    return clock
+
+
+def test_request_cost_grows_with_grid_and_samples():
+    assert estimate_request_cost(5, 4) == pytest.approx(1.425)
+    assert estimate_request_cost(100, 4) == pytest.approx(11.4)
+    assert estimate_request_cost(5, 40) > estimate_request_cost(5, 4)
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(capacity=10, refill_rate=2, now=0.0)
+    
+    assert bucket.try_consume(8, now=0.0) == (True, 0.0)
+    admitted, retry_after = bucket.try_consume(5, now=0.0)
+    assert not admitted
+    assert retry_after == pytest.approx(1.5)
+    
+    assert bucket.try_consume(5, now=1.5)[0]
+    
+    bucket.try_consume(0, now=1000.0)
+    assert bucket.tokens == 10
+
+
+def test_rate_limit_is_per_client(clock):
+    controller = AdmissionController(capacity=3, refill_rate=1, expensive_cost=100)
+    for _ in range(3):
+        controller.admit('alice', 1).release()
+    
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('alice', 1)
+    assert rejected.value.retry_after_header == '1'
+    
+    controller.admit('bob', 1).release()
+    clock.now += 1
+    controller.admit('alice', 1).release()
+    assert controller.rejected_rate == 1
+
+
+def test_request_above_capacity_is_admitted_with_full_bucket(clock):
+    controller = AdmissionController(capacity=5, refill_rate=1, expensive_cost=100)
+    controller.admit('alice', 50).release()
+    
+    with pytest.raises(AdmissionRejected):
+        controller.admit('alice', 1)
+
+
+def test_expensive_requests_are_capped_until_released(clock):
+    controller = AdmissionController(capacity=100, refill_rate=1, expensive_cost=10, max_concurrent_expensive=1)
+    ticket = controller.admit('alice', 12)
+    
+    with pytest.raises(AdmissionRejected):
+        controller.admit('bob', 12)
+    assert controller.rejected_concurrency == 1
+    
+    # Las baratas siguen entrando
+    controller.admit('bob', 1).release()
+    
+    clock.now += 4
+    ticket.release()
+    ticket.release()  # idempotente
+    assert controller.snapshot()['expensive_in_flight'] == 0
+    
+    # Retry-After sugiere la duración promedio de las peticiones caras
+    controller.admit('carol', 12)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('dave', 12)
+    assert rejected.value.retry_after == pytest.approx(4.0)
+
+
+def test_least_recent_clients_are_evicted(clock):
+    controller = AdmissionController(capacity=1, refill_rate=0.001, max_clients=2)
+    controller.admit('a', 1).release()
+    controller.admit('b', 1).release()
+    controller.admit('c', 1).release()
+    
+    # 'a' se descartó y vuelve con el bucket lleno
+    controller.admit('a', 1).release()
+    assert controller.snapshot()['clients'] == 2
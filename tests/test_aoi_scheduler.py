@@ -0,0 +1,185 @@
+import numpy as np
+import pytest
+
+from utils import aoi_scheduler
+from utils.aoi_scheduler import (
+    AreaLimitExceeded,
+    AreaOfInterestStore,
+    AreaRefreshScheduler,
+    client_fingerprint,
+    validate_webhook_url
+)
+
+BBOX = {'top_left': [-14.2, -71.3], 'bottom_right': [-14.3, -71.2]}
+
+
+@pytest.mark.parametrize('url', [
+    'https://127.0.0.1/hook',
+    'https://169.254.169.254/latest/meta-data/',
+    'https://10.0.0.5/hook',
+    'https://192.168.1.10:8443/hook',
+    'https://[::1]/hook',
+    'https://[::ffff:127.0.0.1]/hook',
+    'https://0.0.0.0/hook',
+    'https://localhost/hook'
+])
+def test_webhook_rejects_internal_addresses(url):
+    is_valid, error_message, _ = validate_webhook_url(url)
+    assert not is_valid
+    assert error_message
+
+
+@pytest.mark.parametrize('url', ['http://8.8.8.8/hook', 'ftp://8.8.8.8/hook', 'file:///etc/passwd', 'hook', 42])
+def test_webhook_rejects_other_schemes(url):
+    is_valid, _, _ = validate_webhook_url(url)
+    assert not is_valid
+
+
+def test_webhook_accepts_public_address():
+    assert validate_webhook_url('https://8.8.8.8/hook') == (True, None, 'https://8.8.8.8/hook')
+    assert validate_webhook_url('http://8.8.8.8/hook', allow_http=True)[0]
+
+
+def test_webhook_allowlist():
+    assert not validate_webhook_url('https://8.8.8.8/hook', allowed_hosts=('alerts.example.org',))[0]
+    
+    is_valid, error_message, _ = validate_webhook_url(
+        'https://evil-example.org/hook', allowed_hosts=('example.org',)
+    )
+    assert not is_valid
+    assert 'permitidos' in error_message
+
+
+def test_register_limits_areas_per_owner():
+    store = AreaOfInterestStore()
+    alice, bob = client_fingerprint('alice'), client_fingerprint('bob')
+    
+    for _ in range(2):
+        store.register(BBOX, owner=alice, max_per_owner=2)
+    with pytest.raises(AreaLimitExceeded):
+        store.register(BBOX, owner=alice, max_per_owner=2)
+    
+    store.register(BBOX, owner=bob, max_per_owner=2)
+    assert len(store.list()) == 3
+
+
+def test_register_limits_total_areas():
+    store = AreaOfInterestStore()
+    store.register(BBOX, owner='a', max_total=1)
+    with pytest.raises(AreaLimitExceeded):
+        store.register(BBOX, owner='b', max_total=1)
+
+
+def test_owner_is_not_stored_in_clear():
+    area = AreaOfInterestStore().register(BBOX, owner=client_fingerprint('secret-api-key'))
+    assert 'secret-api-key' not in area['owner']
+
+
+def _alert_response(level):
+    return {
+        'fire_risk_assessment': {'overall_risk_level': level},
+        'recommendations': {}
+    }
+
+
+def test_alert_skips_webhook_that_now_resolves_to_private_address(monkeypatch):
+    posted = []
+    monkeypatch.setattr(aoi_scheduler.requests, 'post', lambda url, **kwargs: posted.append(url))
+    scheduler = AreaRefreshScheduler(AreaOfInterestStore(), None, None)
+    area = AreaOfInterestStore().register(BBOX, webhook_url='https://127.0.0.1/hook')
+    area['last_risk_level'] = 'LOW'
+    
+    scheduler._check_alert(area, _alert_response('HIGH'))
+    
+    assert posted == []
+    assert area['last_risk_level'] == 'HIGH'
+
+
+def test_alert_posts_to_operator_webhook(monkeypatch):
+    posted = []
+    monkeypatch.setattr(aoi_scheduler.requests, 'post', lambda url, **kwargs: posted.append((url, kwargs)))
+    scheduler = AreaRefreshScheduler(AreaOfInterestStore(), None, None, alert_webhook_url='http://alerts.internal/hook')
+    area = AreaOfInterestStore().register(BBOX)
+    area['last_risk_level'] = 'LOW'
+    
+    scheduler._check_alert(area, _alert_response('HIGH'))
+    
+    assert posted[0][0] == 'http://alerts.internal/hook'
+    assert posted[0][1]['allow_redirects'] is False
+
+
+class FakePredictor:
+    def build_feature_matrix(self, weather_df, strict=True):
+        if (weather_df['latitude'] > 80).any():
+            raise ValueError("sin modelo")
+        features = weather_df[['latitude', 'longitude']].to_numpy(dtype=float)
+        return features, np.full(len(features), 'other', dtype=object)
+
+
+class FakePool:
+    predictor = FakePredictor()
+    
+    def __init__(self):
+        self.batches = []
+    
+    def score_features(self, features, regions):
+        self.batches.append(len(features))
+        if (features[:, 1] > 170).any():
+            raise RuntimeError("inferencia falló")
+        return np.full(len(features), 10.0)
+
+
+class FakeWeather:
+    def get_weather_for_area(self, bbox_corners, forecast_date, grid_resolution):
+        return None
+
+
+def _scheduler(monkeypatch):
+    monkeypatch.setattr(aoi_scheduler, 'create_grid_api_response', lambda features, probabilities, date, bbox: {
+        'fire_risk_assessment': {'overall_risk_level': 'LOW'},
+        'recommendations': {},
+        'cells': len(probabilities)
+    })
+    store = AreaOfInterestStore()
+    return store, AreaRefreshScheduler(store, FakePool(), FakeWeather(), poll_seconds=30)
+
+
+def test_failing_area_does_not_block_the_batch(monkeypatch):
+    store, scheduler = _scheduler(monkeypatch)
+    good = store.register(BBOX, grid_resolution=3)
+    bad_features = store.register({'top_left': [85, 0], 'bottom_right': [84, 1]}, grid_resolution=3)
+    bad_scoring = store.register({'top_left': [0, 175], 'bottom_right': [-1, 176]}, grid_resolution=3)
+    
+    assert scheduler.refresh_due_areas() == 1
+    
+    assert good['last_refresh'] is not None and good['results']
+    for area in (bad_features, bad_scoring):
+        assert area['last_refresh'] is None and not area['results']
+        assert area['failures'] == 1
+    # El lote completo falló y se reintentó área por área
+    assert scheduler.inference_pool.batches == [18, 9, 9]
+
+
+def test_failing_area_backs_off(monkeypatch):
+    store, scheduler = _scheduler(monkeypatch)
+    bad = store.register({'top_left': [85, 0], 'bottom_right': [84, 1]}, grid_resolution=3, refresh_minutes=3)
+    
+    scheduler.refresh_due_areas()
+    retry_at = bad['retry_at']
+    assert store.due_areas(now=retry_at - 1) == []
+    assert store.due_areas(now=retry_at) == [bad]
+    
+    # Espera exponencial, acotada al intervalo de refresco del área
+    scheduler._back_off(bad, ValueError(), 0)
+    assert bad['retry_at'] == 120
+    scheduler._back_off(bad, ValueError(), 0)
+    assert bad['retry_at'] == 180
+
+
+def test_recovered_area_clears_backoff(monkeypatch):
+    store, scheduler = _scheduler(monkeypatch)
+    area = store.register(BBOX, grid_resolution=3)
+    area.update(failures=2, retry_at=0)
+    
+    assert scheduler.refresh_due_areas() == 1
+    assert area['failures'] == 0 and 'retry_at' not in area
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from utils.bbox_validation import (
+    BBOX_BAD_BOTTOM_RIGHT,
+    BBOX_BAD_TOP_LEFT,
+    BBOX_ERROR_MESSAGES,
+    BBOX_LATITUDE_RANGE,
+    BBOX_LONGITUDE_RANGE,
+    BBOX_MISSING_CORNERS,
+    BBOX_NOT_DICT,
+    BBOX_NOT_NUMERIC,
+    BBOX_OK,
+    corners_to_bbox,
+    validate_bboxes,
+)
+from utils.response_formatter import build_bbox_batch_response, validate_bbox_coordinates
+
+VALID_LAT_LON = {'top_left': [35.0, -120.0], 'bottom_right': [34.0, -119.0]}
+# [lon, lat] solo se detecta cuando algún primer valor no puede ser latitud
+VALID_LON_LAT = {'top_left': [-120.0, 35.0], 'bottom_right': [-119.0, 34.0]}
+
+
+@pytest.mark.parametrize('bbox, expected', [
+    (VALID_LAT_LON, BBOX_OK),
+    (VALID_LON_LAT, BBOX_OK),
+    (None, BBOX_NOT_DICT),
+    ([[-14, -72], [-15, -71]], BBOX_NOT_DICT),
+    ({'top_left': [-14, -72]}, BBOX_MISSING_CORNERS),
+    ({'top_left': (-14, -72), 'bottom_right': [-15, -71]}, BBOX_BAD_TOP_LEFT),
+    ({'top_left': [-14, -72], 'bottom_right': [-15]}, BBOX_BAD_BOTTOM_RIGHT),
+    ({'top_left': [-14, '-72'], 'bottom_right': [-15, -71]}, BBOX_NOT_NUMERIC),
+    ({'top_left': [True, -72], 'bottom_right': [-15, -71]}, BBOX_NOT_NUMERIC),
+    ({'top_left': [95, 100], 'bottom_right': [-15, -71]}, BBOX_LATITUDE_RANGE),
+    ({'top_left': [-14, -190], 'bottom_right': [-15, -71]}, BBOX_LONGITUDE_RANGE),
+    ({'top_left': [-14, float('nan')], 'bottom_right': [-15, -71]}, BBOX_LONGITUDE_RANGE),
+])
+def test_error_codes(bbox, expected):
+    codes, _, _ = validate_bboxes([bbox])
+    assert codes[0] == expected
+
+
+def test_every_error_code_has_a_message():
+    for code in (BBOX_NOT_DICT, BBOX_MISSING_CORNERS, BBOX_BAD_TOP_LEFT, BBOX_BAD_BOTTOM_RIGHT,
+                 BBOX_NOT_NUMERIC, BBOX_LATITUDE_RANGE, BBOX_LONGITUDE_RANGE):
+        assert BBOX_ERROR_MESSAGES[code]
+    assert BBOX_OK not in BBOX_ERROR_MESSAGES
+
+
+def test_lon_lat_input_is_normalized_to_lat_lon():
+    codes, normalized, swapped = validate_bboxes([VALID_LAT_LON, VALID_LON_LAT])
+    
+    assert codes.tolist() == [BBOX_OK, BBOX_OK]
+    assert swapped.tolist() == [False, True]
+    np.testing.assert_array_equal(normalized[0], normalized[1])
+    assert corners_to_bbox(normalized[1]) == VALID_LAT_LON
+
+
+def test_single_bbox_wrapper_matches_batch():
+    assert validate_bbox_coordinates(VALID_LON_LAT) == (True, None, VALID_LAT_LON)
+    
+    ok, error, normalized = validate_bbox_coordinates({'top_left': [-14, -72]})
+    assert (ok, normalized) == (False, None)
+    assert error == BBOX_ERROR_MESSAGES[BBOX_MISSING_CORNERS]
+
+
+def test_batch_response_keeps_input_order():
+    bboxes = [VALID_LON_LAT, None, {'top_left': [-14, -190], 'bottom_right': [-15, -71]}, VALID_LAT_LON]
+    response = build_bbox_batch_response(bboxes)
+    
+    assert response['total'] == 4
+    assert response['valid_count'] == 2
+    assert response['valid'] == [True, False, False, True]
+    assert response['error_codes'] == [BBOX_OK, BBOX_NOT_DICT, BBOX_LONGITUDE_RANGE, BBOX_OK]
+    assert response['errors'] == [None, BBOX_ERROR_MESSAGES[BBOX_NOT_DICT],
+                                  BBOX_ERROR_MESSAGES[BBOX_LONGITUDE_RANGE], None]
+    assert response['axis_swapped'] == [True, False, False, False]
+    assert response['bbox_corners'] == [VALID_LAT_LON, None, None, VALID_LAT_LON]
+
+
+def test_empty_batch():
+    response = build_bbox_batch_response([])
+    assert response['total'] == 0
+    assert response['valid'] == []
+    assert response['bbox_corners'] == []
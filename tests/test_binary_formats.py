@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from utils.binary_formats import build_grid_columns, encode_grid, requested_binary_format
+from utils.response_encoding import wants_ndjson
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, None),
+    ('', None),
+    ('*/*', None),
+    ('application/json', None),
+    ('application/msgpack', 'msgpack'),
+    ('application/x-msgpack', 'msgpack'),
+    ('application/vnd.apache.arrow.stream', 'arrow'),
+    ('application/vnd.apache.arrow.file', 'arrow_file'),
+    ('application/json, application/msgpack;q=0.1', None),
+    ('application/json;q=0.5, application/msgpack', 'msgpack'),
+    ('application/msgpack;q=0.9, application/vnd.apache.arrow.stream', 'arrow'),
+    ('application/x-ndjson, application/msgpack;q=0.5', None),
+    ('application/msgpack;q=0', None),
+    ('text/html,application/xhtml+xml,*/*;q=0.8', None),
+])
+def test_requested_binary_format(accept, expected):
+    assert requested_binary_format(accept) == expected
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, False),
+    ('*/*', False),
+    ('application/x-ndjson', True),
+    ('application/json, application/x-ndjson;q=0.2', False),
+    ('application/json;q=0.2, application/x-ndjson', True),
+])
+def test_wants_ndjson(accept, expected):
+    assert wants_ndjson(accept) is expected
+
+
+def _columns():
+    features = np.array([[10.0, 20.0], [10.0, 21.0], [11.0, 20.0]])
+    probabilities = np.array([12.5, 45.0, 88.0])
+    terrain = [{'terrain': {'elevation': 100.0, 'slope': 3.0, 'land_cover': 'forest'},
+                'vegetation': {'density': 'high'}}]
+    return build_grid_columns(features, probabilities, [1], terrain)
+
+
+@pytest.mark.parametrize('binary_format, reader', [
+    ('arrow', 'open_stream'),
+    ('arrow_file', 'open_file'),
+])
+def test_arrow_encodings_match_their_mimetype(binary_format, reader):
+    pa = pytest.importorskip('pyarrow')
+    body, mimetype = encode_grid(binary_format, _columns(), {'overall_risk_level': 'HIGH'})
+    
+    assert mimetype.endswith('stream' if binary_format == 'arrow' else 'file')
+    table = getattr(pa.ipc, reader)(pa.BufferReader(body)).read_all()
+    assert table.column('fire_risk_percentage').to_pylist() == [12.5, 45.0, 88.0]
+    assert table.column('risk_category').to_pylist() == ['LOW', 'MEDIUM', 'HIGH']
+    assert table.column('elevation').to_pylist() == [None, 100.0, None]
@@ -0,0 +1,197 @@
+import asyncio
+
+import pytest
+
+from utils import circuit_breaker
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from utils.weather_api import AsyncMeteomaticsWeatherAPI, MeteomaticsWeatherAPI
+
+BBOX = {'top_left': [-14.2, -71.3], 'bottom_right': [-14.3, -71.2]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return clock
+
+
+def _breaker(**kwargs):
+    options = dict(min_requests=4, consecutive_failures=3, reset_timeout=30, slow_call_seconds=5, probe_timeout=60)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def _open(breaker):
+    for _ in range(breaker.consecutive_failures):
+        permit = breaker.allow_request()
+        breaker.record_failure(0.1, permit)
+        breaker.release(permit)
+    assert breaker.state == OPEN
+
+
+def test_closed_open_half_open_closed_cycle(clock):
+    breaker = _breaker()
+    assert breaker.state == CLOSED
+    
+    _open(breaker)
+    assert not breaker.allow_request()
+    
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+    probe = breaker.allow_request()
+    assert probe and probe.probe
+    # Solo una prueba a la vez
+    assert not breaker.allow_request()
+    
+    breaker.record_success(0.2, probe)
+    breaker.release(probe)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+    
+    probe = breaker.allow_request()
+    breaker.record_failure(0.1, probe)
+    breaker.release(probe)
+    
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_slow_probe_reopens(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+    
+    probe = breaker.allow_request()
+    breaker.record_success(6.0, probe)
+    
+    assert breaker.state == OPEN
+
+
+def test_late_result_of_earlier_call_does_not_decide_half_open(clock):
+    breaker = _breaker()
+    late = breaker.allow_request()
+    _open(breaker)
+    clock.now += 30
+    
+    probe = breaker.allow_request()
+    breaker.record_success(0.2, late)
+    breaker.release(late)
+    
+    # La prueba sigue en curso y es la única que puede cerrar el circuito
+    assert breaker.state == HALF_OPEN
+    assert breaker.snapshot()['probe_in_flight']
+    breaker.record_success(0.2, probe)
+    breaker.release(probe)
+    assert breaker.state == CLOSED
+
+
+def test_failure_rate_opens_circuit(clock):
+    breaker = _breaker(consecutive_failures=100)
+    for ok in (True, False, True, False):
+        breaker.allow_request()
+        breaker._record(ok, 0.1)
+    
+    assert breaker.state == OPEN
+
+
+def test_released_probe_without_outcome_allows_new_probe(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+    
+    probe = breaker.allow_request()
+    breaker.release(probe)  # cancelada: no registró resultado
+    
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_stale_permit_does_not_release_current_probe(clock):
+    breaker = _breaker()
+    stale = breaker.allow_request()
+    _open(breaker)
+    clock.now += 30
+    
+    probe = breaker.allow_request()
+    breaker.release(stale)
+    
+    assert not breaker.allow_request()
+    breaker.release(probe)
+    assert breaker.allow_request()
+
+
+def test_lost_probe_expires(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+    
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    
+    clock.now += 60
+    assert breaker.allow_request()
+
+
+class Killed(BaseException):
+    """Como GreenletExit/Timeout de gevent: no hereda de Exception"""
+
+
+class KilledSession:
+    def get(self, *args, **kwargs):
+        raise Killed()
+
+
+def test_killed_sync_probe_releases_breaker(clock):
+    api = MeteomaticsWeatherAPI('user', 'pass', 'https://api.example.org', circuit_breaker=_breaker())
+    _open(api.circuit_breaker)
+    clock.now += 30
+    api.session = KilledSession()
+    
+    with pytest.raises(Killed):
+        api.get_weather_for_area(BBOX, '2025-08-01')
+    
+    assert api.circuit_breaker.state == HALF_OPEN
+    assert api.circuit_breaker.allow_request()
+
+
+class HangingClient:
+    async def get(self, url):
+        await asyncio.sleep(3600)
+    
+    async def aclose(self):
+        pass
+
+
+def test_cancelled_async_probe_releases_breaker(clock):
+    api = AsyncMeteomaticsWeatherAPI('user', 'pass', 'https://api.example.org', circuit_breaker=_breaker())
+    _open(api.circuit_breaker)
+    clock.now += 30
+    api.client = HangingClient()
+    
+    async def cancel_probe():
+        task = asyncio.ensure_future(api.get_weather_for_area_async(BBOX, '2025-08-01'))
+        await asyncio.sleep(0.01)
+        assert api.circuit_breaker.snapshot()['probe_in_flight']
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    
+    asyncio.run(cancel_probe())
+    
+    assert api.circuit_breaker.state == HALF_OPEN
+    assert api.circuit_breaker.allow_request()
@@ -0,0 +1,74 @@
+import numpy as np
+
+from utils.earth_engine_api import LC_CLASSES, EarthEngineAPI
+
+LATS = np.array([-14.25, -14.0, 10.0, 45.0, -70.0, 0.0])
+LONS = np.array([-71.75, -71.5, -60.0, 5.0, 30.0, 0.0])
+
+
+class FakeSnapshots:
+    """Cubre solo el primer punto: NDVI alto y cobertura 'urban' (código 13)"""
+    
+    def sample(self, layer, lats, lons):
+        values = np.full(len(lats), np.nan)
+        values[0] = 0.9 if layer == 'ndvi' else 13
+        return values
+
+
+def _client():
+    # Sin inicializar: todo el terreno sale de la simulación, sin red
+    return EarthEngineAPI(auto_initialize=False)
+
+
+def test_batch_matches_per_point_simulation():
+    client = _client()
+    
+    batch = client.get_complete_terrain_info_batch(LATS, LONS)
+    
+    assert batch == [client.get_complete_terrain_info(lat, lon) for lat, lon in zip(LATS, LONS)]
+
+
+def test_simulation_is_deterministic_per_coordinate():
+    client = _client()
+    first = client.get_complete_terrain_info_batch(LATS, LONS)
+    
+    # Mismo punto en otro lote (y otra posición): mismo terreno
+    again = client.get_complete_terrain_info_batch(LATS[::-1], LONS[::-1])
+    alone = _client().get_complete_terrain_info_batch(LATS[2:3], LONS[2:3])
+    
+    assert again == first[::-1]
+    assert alone == first[2:3]
+
+
+def test_simulated_values_stay_in_range():
+    client = _client()
+    lats = np.linspace(-89, 89, 200)
+    lons = np.linspace(-179, 179, 200)
+    
+    elevation, slope = client._simulate_terrain_batch(lats, lons)
+    density = client._simulate_density_batch(lats, lons)
+    land_cover = client._simulate_land_cover_batch(lats, lons)
+    
+    assert elevation.shape == slope.shape == density.shape == land_cover.shape == (200,)
+    assert (elevation >= 0).all()
+    assert ((slope >= 0) & (slope <= 25)).all()
+    assert set(density) <= {'low', 'medium', 'high'}
+    assert set(land_cover[np.abs(lats) >= 50]) <= {'barren', 'snow_ice', 'grassland'}
+    assert set(land_cover[np.abs(lats) < 23]) <= {'forest', 'grassland', 'savanna', 'cropland'}
+
+
+def test_snapshot_values_override_simulation():
+    client = _client()
+    simulated = client.get_complete_terrain_info_batch(LATS, LONS)
+    
+    client.attach_snapshots(FakeSnapshots())
+    batch = client.get_complete_terrain_info_batch(LATS, LONS)
+    
+    assert batch[0]['vegetation'] == {'density': 'high'}
+    assert batch[0]['terrain']['land_cover'] == LC_CLASSES[13]
+    assert batch[0]['terrain']['elevation'] == simulated[0]['terrain']['elevation']
+    assert batch[1:] == simulated[1:]
+
+
+def test_empty_batch():
+    assert _client().get_complete_terrain_info_batch([], []) == []
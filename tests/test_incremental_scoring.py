@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.fire_predictor import OptimizedFirePredictor, WEATHER_FEATURE_COLUMNS
+from utils.incremental_scoring import DEFAULT_TOLERANCES, IncrementalScorer, parse_tolerances
+
+
+class FakePredictor:
+    """build_feature_matrix, weather_inputs y weather_features del predictor real, sin modelos"""
+    
+    def __init__(self):
+        self._predictor = OptimizedFirePredictor()
+        self._predictor.is_loaded = True
+        self.builds = 0
+    
+    def build_feature_matrix(self, weather_df, strict=True):
+        self.builds += 1
+        features, _ = self._predictor.package_feature_matrix(weather_df)
+        return features, np.full(len(features), 'other', dtype=object)
+    
+    def weather_inputs(self, weather_df):
+        return self._predictor.weather_inputs(weather_df)
+    
+    def weather_features(self, inputs):
+        return self._predictor.weather_features(inputs)
+
+
+def _weather(temperature, resolution=3, offset=0.0):
+    lats, lons = np.meshgrid(np.linspace(0, 1, resolution) + offset, np.linspace(0, 1, resolution), indexing='ij')
+    n_points = resolution * resolution
+    return pd.DataFrame({
+        'latitude': lats.ravel(),
+        'longitude': lons.ravel(),
+        't_2m:C': np.broadcast_to(temperature, n_points).astype(float),
+        'relative_humidity_2m:p': np.full(n_points, 60.0),
+        'wind_speed_10m:ms': np.full(n_points, 5.0)
+    })
+
+
+def _score(plan):
+    # Probabilidad ficticia: la temperatura simulada (bright_t31) de cada celda
+    return plan['features'][plan['stale'], WEATHER_FEATURE_COLUMNS[0]] - 273.15
+
+
+def test_first_refresh_scores_every_cell():
+    scorer = IncrementalScorer(FakePredictor())
+    plan = scorer.prepare('area', '2025-10-06', _weather(20.0))
+    
+    assert plan['stale'].all()
+    probabilities = scorer.commit(plan, _score(plan))
+    np.testing.assert_allclose(probabilities, 20.0)
+    assert scorer.stats['cells_scored'] == 9
+
+
+def test_only_cells_beyond_tolerance_are_rescored():
+    predictor = FakePredictor()
+    scorer = IncrementalScorer(predictor)
+    plan = scorer.prepare('area', '2025-10-06', _weather(20.0))
+    scorer.commit(plan, _score(plan))
+    
+    temperatures = np.full(9, 20.05)
+    temperatures[[2, 7]] = 25.0
+    plan = scorer.prepare('area', '2025-10-06', _weather(temperatures))
+    
+    assert np.flatnonzero(plan['stale']).tolist() == [2, 7]
+    # Las features nuevas llevan el clima del refresco aunque la celda no se re-puntúe
+    np.testing.assert_allclose(plan['features'][:, WEATHER_FEATURE_COLUMNS[0]] - 273.15, temperatures)
+    
+    probabilities = scorer.commit(plan, _score(plan))
+    expected = np.full(9, 20.0)
+    expected[[2, 7]] = 25.0
+    np.testing.assert_allclose(probabilities, expected)
+    assert predictor.builds == 1
+    assert scorer.get_stats()['cells_reused'] == 7
+
+
+def test_drift_is_measured_against_last_scored_value():
+    scorer = IncrementalScorer(FakePredictor())
+    stale = []
+    for temperature in (20.0, 20.06, 20.12):
+        plan = scorer.prepare('area', '2025-10-06', _weather(temperature))
+        probabilities = scorer.commit(plan, _score(plan))
+        stale.append(bool(plan['stale'].all()))
+    
+    # 20.06 quedó dentro de la tolerancia de 20.0; 20.12 ya no
+    assert stale == [True, False, True]
+    np.testing.assert_allclose(probabilities, 20.12)
+
+
+def test_missing_weather_counts_as_change():
+    scorer = IncrementalScorer(FakePredictor())
+    plan = scorer.prepare('area', '2025-10-06', _weather(20.0))
+    scorer.commit(plan, _score(plan))
+    
+    temperatures = np.full(9, 20.0)
+    temperatures[4] = np.nan
+    plan = scorer.prepare('area', '2025-10-06', _weather(temperatures))
+    assert np.flatnonzero(plan['stale']).tolist() == [4]
+
+
+def test_new_grid_rebuilds_static_block_and_drops_scores():
+    predictor = FakePredictor()
+    scorer = IncrementalScorer(predictor)
+    plan = scorer.prepare('area', '2025-10-06', _weather(20.0))
+    scorer.commit(plan, _score(plan))
+    
+    plan = scorer.prepare('area', '2025-10-06', _weather(20.0, offset=0.5))
+    assert predictor.builds == 2
+    assert plan['previous'] is None and plan['stale'].all()
+
+
+def test_dates_are_scored_independently():
+    scorer = IncrementalScorer(FakePredictor())
+    plan = scorer.prepare('area', '2025-10-06', _weather(20.0))
+    scorer.commit(plan, _score(plan))
+    
+    plan = scorer.prepare('area', '2025-10-07', _weather(20.0))
+    assert plan['stale'].all()
+    assert scorer.stats['static_hits'] == 1
+
+
+def test_prune_drops_removed_areas_and_old_dates():
+    scorer = IncrementalScorer(FakePredictor())
+    for area_id, forecast_date in (('a', '2025-10-06'), ('a', '2025-10-07'), ('b', '2025-10-07')):
+        plan = scorer.prepare(area_id, forecast_date, _weather(20.0))
+        scorer.commit(plan, _score(plan))
+    
+    scorer.prune(['a'], ['2025-10-07'])
+    
+    assert scorer.get_stats()['areas_cached'] == 1
+    assert scorer.prepare('a', '2025-10-06', _weather(20.0))['stale'].all()
+    assert not scorer.prepare('a', '2025-10-07', _weather(20.0))['stale'].any()
+    assert scorer.prepare('b', '2025-10-07', _weather(20.0))['stale'].all()
+
+
+def test_parse_tolerances():
+    assert parse_tolerances('') == DEFAULT_TOLERANCES
+    assert parse_tolerances('0.2,1,0.3') == (0.2, 1.0, 0.3)
+    for value in ('0.1,0.2', '0.1,-1,0.1'):
+        with pytest.raises(ValueError):
+            parse_tolerances(value)
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.inference_pool import InferencePool
+
+CRASH = -1.0
+
+
+class PidPredictor:
+    """Probabilidad = lat + lon; la columna 2 guarda el pid del proceso que puntuó"""
+    
+    def __init__(self):
+        self.parent_pid = os.getpid()
+    
+    def score_features(self, features, regions):
+        # Un lat == CRASH tumba al proceso hijo (nunca al de los tests)
+        if os.getpid() != self.parent_pid and (features[:, 0] == CRASH).any():
+            os._exit(1)
+        return np.column_stack([features[:, 0] + features[:, 1], np.full(len(features), os.getpid())])
+
+
+def _batch(n_points, lat=0.0):
+    features = np.column_stack([np.full(n_points, lat), np.arange(n_points, dtype=float)])
+    return features, np.full(n_points, 'other', dtype=object)
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(PidPredictor(), threshold=100, max_workers=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_small_batches_run_inline(pool):
+    features, regions = _batch(10)
+    result = pool.score_features(features, regions)
+    
+    assert (result[:, 1] == os.getpid()).all()
+    assert pool._executor is None
+    np.testing.assert_array_equal(result[:, 0], features[:, 1])
+
+
+def test_large_batches_go_through_the_pool(pool):
+    features, regions = _batch(500)
+    result = pool.score_features(features, regions)
+    
+    assert (result[:, 1] != os.getpid()).all()
+    np.testing.assert_array_equal(result[:, 0], pool.predictor.score_features(features, regions)[:, 0])
+
+
+def test_disabled_pool_always_runs_inline():
+    pool = InferencePool(PidPredictor(), threshold=100, max_workers=0)
+    features, regions = _batch(500)
+    
+    assert (pool.score_features(features, regions)[:, 1] == os.getpid()).all()
+    assert pool.warm_up(features, regions) is False
+    assert pool._executor is None
+
+
+def test_broken_pool_falls_back_inline_and_recovers(pool):
+    features, regions = _batch(500, lat=CRASH)
+    result = pool.score_features(features, regions)
+    
+    # El hijo murió: se puntuó en línea y el pool se descartó
+    assert (result[:, 1] == os.getpid()).all()
+    np.testing.assert_array_equal(result[:, 0], features[:, 1] + CRASH)
+    assert pool._executor is None
+    
+    features, regions = _batch(500)
+    assert (pool.score_features(features, regions)[:, 1] != os.getpid()).all()
+
+
+def test_warm_up_forks_the_pool(pool):
+    features, regions = _batch(2)
+    
+    assert pool.warm_up(features, regions) is True
+    assert pool._executor is not None
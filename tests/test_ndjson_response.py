@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils import response_formatter
+from utils.response_formatter import iter_ndjson_response
+
+pytest.importorskip('orjson')
+
+
+class FakeEarthEngine:
+    """Terreno con la latitud como elevación; registra cada consulta"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def get_complete_terrain_info_batch(self, lats, lons):
+        self.calls.append(len(lats))
+        return [
+            {'terrain': {'elevation': float(lat), 'slope': 1.0, 'land_cover': 'forest'},
+             'vegetation': {'density': 'low'}}
+            for lat in lats
+        ]
+
+
+@pytest.fixture
+def earth_engine(monkeypatch):
+    client = FakeEarthEngine()
+    monkeypatch.setattr(response_formatter, 'earth_engine_client', client)
+    return client
+
+
+def _grid(n):
+    features = np.column_stack([np.linspace(-14, -13, n), np.linspace(-72, -71, n)])
+    probabilities = np.linspace(0, 100, n)
+    return features, probabilities
+
+
+def _lines(chunks):
+    return [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+
+
+def test_summary_line_comes_first(earth_engine):
+    features, probabilities = _grid(10)
+    
+    summary, *rows = _lines(iter_ndjson_response(features, probabilities, '2025-08-01'))
+    
+    assert summary['type'] == 'summary'
+    assert summary['forecast_date'] == '2025-08-01'
+    assert summary['total_points'] == 10
+    assert summary['fire_risk_assessment']['statistics']['maximum_risk_percentage'] == 100.0
+    assert 'primary_action' in summary['recommendations']
+    assert len(rows) == 10
+
+
+def test_chunk_boundaries_keep_every_row_once(earth_engine):
+    features, probabilities = _grid(25)
+    
+    chunks = list(iter_ndjson_response(features, probabilities, '2025-08-01', chunk_rows=10))
+    rows = _lines(chunks[1:])
+    
+    # Resumen + 10 + 10 + 5, cada chunk termina en salto de línea
+    assert len(chunks) == 4
+    assert all(chunk.endswith(b'\n') for chunk in chunks)
+    assert [len(chunk.splitlines()) for chunk in chunks[1:]] == [10, 10, 5]
+    assert [row['lat'] for row in rows] == features[:, 0].tolist()
+    assert [row['fire_risk_percentage'] for row in rows] == np.round(probabilities, 2).tolist()
+
+
+def test_only_sampled_points_are_enriched(earth_engine):
+    features, probabilities = _grid(25)
+    
+    rows = _lines(iter_ndjson_response(features, probabilities, '2025-08-01', num_samples=4,
+                                       chunk_rows=10))[1:]
+    
+    enriched = [row for row in rows if 'terrain' in row]
+    assert len(enriched) == 4
+    assert sum(earth_engine.calls) == 4
+    # Cada punto recibe su propio terreno, aunque se consulte por chunk
+    assert all(row['terrain']['elevation'] == row['lat'] for row in enriched)
+    assert all('vegetation' not in row for row in rows if 'terrain' not in row)
+
+
+def test_known_terrain_skips_earth_engine(earth_engine):
+    features, probabilities = _grid(25)
+    terrain = {
+        i: {'terrain': {'elevation': i, 'slope': 0.0, 'land_cover': 'urban'}, 'vegetation': {'density': 'high'}}
+        for i in (3, 12, 24)
+    }
+    
+    rows = _lines(iter_ndjson_response(features, probabilities, '2025-08-01', num_samples=10,
+                                       chunk_rows=10, terrain=terrain))[1:]
+    
+    assert earth_engine.calls == []
+    assert {i: row['terrain']['elevation'] for i, row in enumerate(rows) if 'terrain' in row} == {3: 3, 12: 12, 24: 24}
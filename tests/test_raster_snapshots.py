@@ -0,0 +1,89 @@
+import numpy as np
+
+from utils.raster_snapshots import MAX_SNAPSHOT_PIXELS, RasterSnapshotStore, SnapshotRefresher
+
+BOUNDS = {'lat_min': -16.0, 'lat_max': -12.0, 'lon_min': -73.0, 'lon_max': -69.0}
+REGIONS = [{'name': 'peru_sur', 'bounds': BOUNDS}]
+
+
+def _gradient():
+    # Fila 0 = norte: el valor codifica fila y columna (fila * 10 + columna)
+    rows, cols = np.mgrid[0:4, 0:4]
+    return (rows * 10 + cols).astype(float)
+
+
+class FakeEarthEngine:
+    def __init__(self):
+        self.exports = []
+    
+    def export_layer_pixels(self, layer, bounds, width, height):
+        self.exports.append((layer, width, height))
+        return np.zeros((height, width), dtype=np.float32)
+
+
+def test_written_snapshot_is_memory_mapped(tmp_path):
+    store = RasterSnapshotStore(str(tmp_path), REGIONS)
+    store.write_snapshot('peru_sur', 'ndvi', _gradient(), BOUNDS, source='test')
+    
+    snapshot = store._snapshots[('peru_sur', 'ndvi')]
+    assert isinstance(snapshot['array'], np.memmap)
+    assert snapshot['array'].dtype == np.float32
+    assert snapshot['meta']['shape'] == [4, 4]
+    assert store.age_days('peru_sur', 'ndvi') < 1
+    assert 'peru_sur/ndvi' in store.status()
+
+
+def test_existing_snapshots_are_opened_on_start(tmp_path):
+    RasterSnapshotStore(str(tmp_path), REGIONS).write_snapshot('peru_sur', 'ndvi', _gradient(), BOUNDS)
+    
+    reopened = RasterSnapshotStore(str(tmp_path), REGIONS)
+    
+    assert reopened.age_days('peru_sur', 'ndvi') is not None
+    assert reopened.age_days('peru_sur', 'land_cover') is None
+    assert reopened.sample('ndvi', [-12.5], [-72.5])[0] == 0.0
+
+
+def test_sample_uses_north_as_row_zero(tmp_path):
+    store = RasterSnapshotStore(str(tmp_path), REGIONS)
+    store.write_snapshot('peru_sur', 'ndvi', _gradient(), BOUNDS)
+    
+    values = store.sample('ndvi', [-12.5, -15.5, -15.5, -12.0, -16.0], [-72.5, -72.5, -69.5, -73.0, -69.0])
+    
+    # Noroeste, suroeste, sureste y las esquinas exactas (recortadas al borde)
+    assert values.tolist() == [0.0, 30.0, 33.0, 0.0, 33.0]
+
+
+def test_points_outside_every_snapshot_are_nan(tmp_path):
+    store = RasterSnapshotStore(str(tmp_path), REGIONS)
+    store.write_snapshot('peru_sur', 'ndvi', _gradient(), BOUNDS)
+    
+    values = store.sample('ndvi', [-14.0, -11.9, -14.0], [-71.0, -71.0, -68.9])
+    
+    assert not np.isnan(values[0])
+    assert np.isnan(values[1:]).all()
+    # Capa sin snapshot: todo NaN
+    assert np.isnan(store.sample('land_cover', [-14.0], [-71.0])).all()
+
+
+def test_refresh_clamps_export_size(tmp_path):
+    huge = {'lat_min': -40.0, 'lat_max': 0.0, 'lon_min': -80.0, 'lon_max': -79.999}
+    store = RasterSnapshotStore(str(tmp_path), [{'name': 'andes', 'bounds': huge}])
+    client = FakeEarthEngine()
+    
+    assert SnapshotRefresher(store, client).refresh_stale() == 2
+    
+    for layer, width, height in client.exports:
+        assert width == 1
+        assert height == MAX_SNAPSHOT_PIXELS
+    assert store.sample('ndvi', [-20.0], [-79.9995])[0] == 0.0
+
+
+def test_refresh_skips_fresh_layers(tmp_path):
+    store = RasterSnapshotStore(str(tmp_path), REGIONS)
+    client = FakeEarthEngine()
+    refresher = SnapshotRefresher(store, client)
+    
+    refresher.refresh_stale()
+    
+    assert sorted(client.exports) == [('land_cover', 800, 800), ('ndvi', 400, 400)]
+    assert refresher.refresh_stale() == 0
@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils.fire_predictor import RISK_LEVELS
+from utils.region_router import is_trusted_router, merge_shard_grids, parse_ndjson_grid
+from utils.response_formatter import validate_feature_rows
+
+BBOX = {'top_left': [3.0, 1.0], 'bottom_right': [1.0, 3.0]}
+
+
+def _ndjson(lats, lons, probabilities, terrain_rows=()):
+    lines = [json.dumps({'summary': True})]
+    for index, (lat, lon, probability) in enumerate(zip(lats, lons, probabilities)):
+        row = {'lat': lat, 'lon': lon, 'fire_risk_percentage': probability,
+               'risk_category': 'HIGH' if probability > 70 else 'LOW'}
+        if index in terrain_rows:
+            row.update(terrain={'elevation': index}, vegetation={'ndvi': index})
+        lines.append(json.dumps(row))
+    return lines
+
+
+def test_merge_restores_original_grid_order():
+    # Grilla 3x3 en el orden de Meteomatics, repartida en columnas alternadas
+    lat_grid, lon_grid = np.meshgrid([3.0, 2.0, 1.0], [10.0, 30.0, 20.0], indexing='ij')
+    lats, lons = lat_grid.ravel(), lon_grid.ravel()
+    probabilities = np.arange(9) * 10.0
+    indices = [np.array([0, 2, 4, 6, 8]), np.array([1, 3, 5, 7])]
+    
+    parts = []
+    for index in indices:
+        _, *part = parse_ndjson_grid(_ndjson(lats[index].tolist(), lons[index].tolist(),
+                                             probabilities[index].tolist(), terrain_rows=(1,)))
+        parts.append(tuple(part))
+    
+    features, merged, codes, terrain = merge_shard_grids(parts, indices)
+    
+    np.testing.assert_array_equal(features[:, 0], lats)
+    np.testing.assert_array_equal(features[:, 1], lons)
+    np.testing.assert_array_equal(merged, probabilities)
+    assert [RISK_LEVELS[code] for code in codes] == ['HIGH' if p > 70 else 'LOW' for p in probabilities]
+    # Terreno de la segunda fila de cada shard, en su posición original
+    assert sorted(terrain) == [2, 3]
+
+
+def test_merge_rejects_incomplete_shard_response():
+    _, *part = parse_ndjson_grid(_ndjson([1.0], [2.0], [5.0]))
+    
+    with pytest.raises(ValueError, match='1 puntos de 2'):
+        merge_shard_grids([tuple(part)], [np.array([0, 1])])
+
+
+def test_feature_rows_validation():
+    assert validate_feature_rows(None, 4, BBOX) == (True, None, None)
+    
+    is_valid, _, features = validate_feature_rows([[1, 2, 3, 4, 5, 6, 7]] * 2, 4, BBOX)
+    assert is_valid and features.shape == (2, 7)
+    
+    for rows in ([[1, 2, 3]], [[1] * 7, [1] * 6], [['a'] * 7], {'rows': []}, [[1] * 7] * 5):
+        is_valid, error_message, features = validate_feature_rows(rows, 4, BBOX)
+        assert not is_valid and error_message and features is None
+
+
+def test_feature_rows_outside_bbox_are_rejected():
+    inside = [3.0, 1.0, 0, 0, 0, 0, 0]
+    
+    for point in ([3.5, 2.0], [2.0, 0.5], [0.9, 2.0], [float('nan'), 2.0]):
+        is_valid, error_message, features = validate_feature_rows([inside, point + [0] * 5], 4, BBOX)
+        assert not is_valid and '1 filas fuera' in error_message and features is None
+    
+    # Redondeo de coordenadas en el borde del bbox
+    assert validate_feature_rows([[3.0000001, 0.9999999, 0, 0, 0, 0, 0]], 4, BBOX)[0]
+
+
+def test_router_token():
+    assert is_trusted_router('s3cret', 's3cret')
+    assert not is_trusted_router('otro', 's3cret')
+    assert not is_trusted_router(None, 's3cret')
+    # Sin secreto configurado no se confía en nadie, ni en un token vacío
+    assert not is_trusted_router('', '')
+    assert not is_trusted_router('algo', '')
@@ -0,0 +1,40 @@
+import json
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from flask import Flask, jsonify
+
+from utils.response_encoding import dumps_json, install_response_encoding
+
+pytest.importorskip('orjson')
+
+
+def _app():
+    app = Flask(__name__)
+    install_response_encoding(app)
+    return app
+
+
+def test_datetimes_keep_flask_format():
+    payload = {'at': datetime(2025, 10, 6, 12, 30, 5), 'day': date(2025, 10, 6)}
+    app = _app()
+    
+    with app.app_context():
+        body = jsonify(payload).get_json()
+    
+    assert body == json.loads(Flask('reference').json.dumps(payload))
+    assert body['at'] == 'Mon, 06 Oct 2025 12:30:05 GMT'
+
+
+def test_numpy_values_are_serialized():
+    app = _app()
+    
+    with app.app_context():
+        body = jsonify({'values': np.array([1.5, 2.5]), 'count': np.int64(2)}).get_json()
+    
+    assert body == {'values': [1.5, 2.5], 'count': 2}
+
+
+def test_dumps_json_matches_flask_dates():
+    assert dumps_json({'at': datetime(2025, 10, 6, 12, 30, 5)}) == b'{"at":"Mon, 06 Oct 2025 12:30:05 GMT"}'
@@ -0,0 +1,58 @@
+import numpy as np
+
+from utils.fire_predictor import RISK_LEVELS
+from utils.risk_statistics import PERCENTILES, compute_grid_statistics
+
+
+def _grid(resolution=30, seed=3):
+    lats, lons = np.meshgrid(np.linspace(-15, -14, resolution), np.linspace(-72, -71, resolution), indexing='ij')
+    probabilities = np.random.default_rng(seed).uniform(0, 100, resolution * resolution)
+    return lats.ravel(), lons.ravel(), probabilities
+
+
+def test_summary_matches_reference_reductions():
+    lats, lons, probabilities = _grid()
+    statistics = compute_grid_statistics(lats, lons, probabilities)
+    
+    assert statistics['average_risk_percentage'] == round(float(probabilities.mean()), 1)
+    assert statistics['maximum_risk_percentage'] == round(float(probabilities.max()), 1)
+    assert statistics['minimum_risk_percentage'] == round(float(probabilities.min()), 1)
+    assert statistics['std_risk_percentage'] == round(float(probabilities.std()), 1)
+    for p in PERCENTILES:
+        assert statistics['percentiles'][f"p{p}"] == round(float(np.percentile(probabilities, p)), 1)
+
+
+def test_category_counts_use_thresholds():
+    lats, lons, probabilities = _grid()
+    statistics = compute_grid_statistics(lats, lons, probabilities)
+    
+    expected = {
+        'LOW': int((probabilities <= 30).sum()),
+        'MEDIUM': int(((probabilities > 30) & (probabilities <= 70)).sum()),
+        'HIGH': int((probabilities > 70).sum())
+    }
+    assert {level: statistics['categories'][level]['count'] for level in RISK_LEVELS} == expected
+    assert statistics['total_points'] == len(probabilities)
+    
+    category_area = sum(statistics['categories'][level]['area_km2'] for level in RISK_LEVELS)
+    assert abs(category_area - statistics['total_area_km2']) < 0.05
+
+
+def test_given_codes_take_precedence():
+    # Probabilidades redondeadas en el límite: la categoría viene del shard
+    lats, lons = np.array([0.0, 0.0, 1.0, 1.0]), np.array([0.0, 1.0, 0.0, 1.0])
+    probabilities = np.array([70.0, 70.0, 10.0, 10.0])
+    statistics = compute_grid_statistics(lats, lons, probabilities, codes=np.array([2, 2, 0, 0], dtype=np.int8))
+    
+    assert statistics['categories']['HIGH']['count'] == 2
+    assert statistics['hotspot_centroid']['basis'] == 'HIGH'
+    assert statistics['hotspot_centroid']['lat'] == 0.0
+
+
+def test_hotspot_falls_back_to_top_decile():
+    lats, lons, _ = _grid(10)
+    probabilities = np.linspace(0, 20, 100)
+    statistics = compute_grid_statistics(lats, lons, probabilities)
+    
+    assert statistics['hotspot_centroid']['basis'] == 'p90'
+    assert statistics['hotspot_centroid']['cells'] == 10
@@ -0,0 +1,75 @@
+import numpy as np
+
+from utils.seeding import coordinate_uniform, seeded_rng
+from utils.weather_api import generate_synthetic_weather_data
+
+BBOX = {'top_left': [-14.0, -72.0], 'bottom_right': [-14.5, -71.5]}
+
+
+def test_same_key_parts_give_same_stream():
+    first = seeded_rng('weather', -14.5, -14.0, 5, '2025-08-01').uniform(size=10)
+    second = seeded_rng('weather', -14.5, -14.0, 5, '2025-08-01').uniform(size=10)
+    
+    assert np.array_equal(first, second)
+
+
+def test_different_key_parts_give_different_streams():
+    base = seeded_rng('weather', -14.5, '2025-08-01').uniform(size=10)
+    
+    assert not np.array_equal(base, seeded_rng('terrain', -14.5, '2025-08-01').uniform(size=10))
+    assert not np.array_equal(base, seeded_rng('weather', -14.5, '2025-08-02').uniform(size=10))
+
+
+def test_array_key_parts_are_rounded():
+    lats = np.array([-14.1, -14.2])
+    
+    first = seeded_rng('grid', lats).uniform(size=5)
+    second = seeded_rng('grid', lats + 1e-9).uniform(size=5)
+    
+    assert np.array_equal(first, second)
+
+
+def test_coordinate_uniform_is_deterministic():
+    lats = np.linspace(-15, -13, 50)
+    lons = np.linspace(-73, -70, 50)
+    
+    assert np.array_equal(coordinate_uniform(lats, lons, 'slope'), coordinate_uniform(lats, lons, 'slope'))
+
+
+def test_coordinate_uniform_salts_differ():
+    lats = np.linspace(-15, -13, 50)
+    lons = np.linspace(-73, -70, 50)
+    
+    assert not np.array_equal(coordinate_uniform(lats, lons, 'slope'), coordinate_uniform(lats, lons, 'elevation'))
+
+
+def test_coordinate_uniform_ignores_rest_of_batch():
+    lats = np.array([-14.25, 10.0, 45.5, -70.0])
+    lons = np.array([-71.75, -60.0, 5.25, 30.0])
+    
+    batch = coordinate_uniform(lats, lons, 'ndvi')
+    
+    for i in range(len(lats)):
+        alone = coordinate_uniform(lats[i:i + 1], lons[i:i + 1], 'ndvi')
+        assert alone[0] == batch[i]
+    assert np.array_equal(coordinate_uniform(lats[::-1], lons[::-1], 'ndvi'), batch[::-1])
+
+
+def test_coordinate_uniform_range():
+    lats = np.linspace(-90, 90, 1000)
+    lons = np.linspace(-180, 180, 1000)
+    
+    values = coordinate_uniform(lats, lons, 'slope', 0, 25)
+    
+    assert ((values >= 0) & (values < 25)).all()
+    # Sin colapsar a unos pocos valores
+    assert len(np.unique(values)) == len(values)
+
+
+def test_synthetic_weather_is_reproducible():
+    first = generate_synthetic_weather_data(BBOX, 5, '2025-08-01')
+    second = generate_synthetic_weather_data(BBOX, 5, '2025-08-01')
+    other_day = generate_synthetic_weather_data(BBOX, 5, '2025-08-02')
+    
+    assert first.equals(second)
+    assert not first['t_2m:C'].equals(other_day['t_2m:C'])
@@ -0,0 +1,143 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from utils.cache import LRUCache
+from utils.tile_service import NO_DATA, RiskTileService, tile_bounds, tile_cache_control, tile_cell_centers
+from utils.weather_api import generate_synthetic_weather_data
+
+
+class FakePredictor:
+    system_metadata = {'version': 'test', 'training_date': '2025-01-01'}
+    shard_regions = None
+    
+    def build_feature_matrix(self, weather_df, only_regions=None):
+        features = weather_df[['latitude', 'longitude']].to_numpy(dtype=float)
+        return features, np.full(len(features), 'other', dtype=object)
+
+
+class FakePool:
+    predictor = FakePredictor()
+    
+    def score_features(self, features, regions):
+        # Probabilidad = latitud (recortada) para poder verificar la fila de cada celda
+        return np.clip(features[:, 0], 0, 100)
+
+
+class NoWeather:
+    def get_weather_for_area(self, bbox_corners, forecast_date, grid_resolution):
+        return None
+
+
+class FakeWeather:
+    """Meteomatics respondiendo (con la misma grilla que el fallback)"""
+    
+    def get_weather_for_area(self, bbox_corners, forecast_date, grid_resolution):
+        return generate_synthetic_weather_data(bbox_corners, grid_resolution, forecast_date)
+
+
+def _service(grid_size=16, weather_api=None):
+    return RiskTileService(FakePool(), weather_api or FakeWeather(), LRUCache(max_entries=16), grid_size=grid_size)
+
+
+def _mercator_y(lat):
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def test_row_centers_are_evenly_spaced_in_projected_y():
+    row_lats, col_lons = tile_cell_centers(0, 0, 0, 16)
+    
+    assert row_lats[2] == pytest.approx(76.8408, abs=1e-3)
+    projected = np.array([_mercator_y(lat) for lat in row_lats])
+    np.testing.assert_allclose(np.diff(projected), np.diff(projected)[0])
+    np.testing.assert_allclose(np.diff(col_lons), 360 / 16)
+
+
+def test_row_centers_stay_inside_tile():
+    north, south, west, east = tile_bounds(5, 10, 12)
+    row_lats, col_lons = tile_cell_centers(5, 10, 12, 8)
+    
+    assert np.all(np.diff(row_lats) < 0)
+    assert south < row_lats.min() and row_lats.max() < north
+    assert west < col_lons.min() and col_lons.max() < east
+
+
+def test_tile_is_scored_at_mercator_latitudes():
+    service = _service(grid_size=16)
+    grid, cache_hit, synthetic = service.get_tile(0, 0, 0, '2025-08-01')
+    
+    row_lats, _ = tile_cell_centers(0, 0, 0, 16)
+    expected = np.rint(np.clip(row_lats, 0, 100)).astype(np.uint8)
+    
+    assert not cache_hit and not synthetic
+    assert grid.shape == (16, 16)
+    assert not (grid == NO_DATA).any()
+    np.testing.assert_array_equal(grid[:, 0], expected)
+
+
+def test_second_request_is_a_cache_hit():
+    service = _service()
+    first, _, _ = service.get_tile(3, 2, 1, '2025-08-01')
+    second, cache_hit, _ = service.get_tile(3, 2, 1, '2025-08-01')
+    
+    assert cache_hit
+    np.testing.assert_array_equal(first, second)
+
+
+def test_concurrent_misses_compute_once():
+    service = _service()
+    compute = service._compute_tile
+    calls = []
+    
+    def slow_compute(*args):
+        calls.append(args)
+        time.sleep(0.2)
+        return compute(*args)
+    
+    service._compute_tile = slow_compute
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: service.get_tile(4, 3, 5, '2025-08-01'), range(8)))
+    
+    assert len(calls) == 1
+    for grid, _, _ in results:
+        np.testing.assert_array_equal(grid, results[0][0])
+    assert service._in_flight == {}
+
+
+def test_failed_computation_is_shared_and_not_cached():
+    service = _service()
+    
+    def failing_compute(*args):
+        time.sleep(0.2)
+        raise RuntimeError("sin datos")
+    
+    service._compute_tile = failing_compute
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(service.get_tile, 1, 0, 0, '2025-08-01') for _ in range(4)]
+        errors = [future.exception() for future in futures]
+    
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert service._in_flight == {}
+    assert service.cache.peek(service.cache_key(1, 0, 0, '2025-08-01')) is None
+
+
+def test_fallback_tiles_are_not_cached():
+    service = _service(weather_api=NoWeather())
+    _, cache_hit, synthetic = service.get_tile(2, 1, 1, '2025-08-01')
+    
+    assert synthetic and not cache_hit
+    assert service.cache.peek(service.cache_key(2, 1, 1, '2025-08-01')) is None
+    
+    # Con Meteomatics de vuelta la tesela se recalcula y recién ahí se guarda
+    service.weather_api = FakeWeather()
+    _, cache_hit, synthetic = service.get_tile(2, 1, 1, '2025-08-01')
+    assert not synthetic and not cache_hit
+    assert service.get_tile(2, 1, 1, '2025-08-01')[1]
+
+
+def test_fallback_tiles_are_not_stored_by_clients():
+    assert tile_cache_control(True, 3600) == 'no-store'
+    assert tile_cache_control(False, 3600) == 'public, max-age=3600'
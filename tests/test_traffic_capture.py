@@ -0,0 +1,59 @@
+import json
+import time
+
+from flask import Flask, Response, stream_with_context
+
+from utils.traffic_capture import TrafficCapture, install_traffic_capture
+
+BBOX = {'top_left': [-14.2, -72.3], 'bottom_right': [-14.7, -71.8]}
+
+
+def _app(tmp_path, delay):
+    app = Flask(__name__)
+    capture = TrafficCapture(str(tmp_path / 'traffic.jsonl'))
+    install_traffic_capture(app, capture)
+    
+    @app.route('/predict-fire-risk', methods=['POST'])
+    def predict():
+        def generate():
+            for _ in range(3):
+                time.sleep(delay)
+                yield '{}\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    return app, capture
+
+
+def _lines(capture):
+    with open(capture.path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_streamed_latency_includes_body(tmp_path):
+    app, capture = _app(tmp_path, delay=0.05)
+    
+    with app.test_client() as client:
+        response = client.post('/predict-fire-risk', json={'bbox_corners': BBOX, 'grid_resolution': 10},
+                               headers={'Accept': 'application/x-ndjson', 'X-API-Key': 'secreta'})
+        assert response.get_data(as_text=True) == '{}\n' * 3
+        response.close()
+    
+    [line] = _lines(capture)
+    assert line['latency_ms'] >= 150
+    assert line['status'] == 200
+    assert line['accept'] == 'application/x-ndjson'
+    assert line['payload']['grid_resolution'] == 10
+    assert line['payload']['bbox_corners'] == {'top_left': [-13.75, -72.25], 'bottom_right': [-14.25, -71.75]}
+    assert line['client'] and 'secreta' not in line['client']
+
+
+def test_nothing_is_recorded_before_the_response_closes(tmp_path):
+    app, capture = _app(tmp_path, delay=0)
+    
+    with app.test_client() as client:
+        response = client.post('/predict-fire-risk', json={}, buffered=False)
+        assert capture.captured == 0
+        response.get_data()
+        response.close()
+    
+    assert capture.captured == 1
@@ -0,0 +1,190 @@
+"""
+Control de admisión para /predict-fire-risk
+
+Antes de hacer trabajo se estima el costo de la petición (puntos de la
+grilla y puntos enriquecidos con Earth Engine) y se decide si entra:
+
+- Token bucket por cliente (API key o IP): el costo se descuenta del
+  bucket, que se recarga a ritmo constante.
+- Tope de peticiones caras concurrentes: una grilla enorme no puede
+  acaparar el único worker gevent.
+
+Si no hay presupuesto se rechaza con 429 y Retry-After, en lugar de
+encolar y degradar la latencia de todos.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Costo en unidades: 1 por petición + grilla + enriquecimiento
+BASE_COST = 1.0
+POINTS_PER_COST_UNIT = 1000
+SAMPLES_PER_COST_UNIT = 10
+
+
+def estimate_request_cost(grid_resolution, num_samples):
+    """
+    Costo estimado de una predicción (petición por defecto ≈ 1.4 unidades)
+    
+    Args:
+        grid_resolution: Puntos por lado de la grilla
+        num_samples: Puntos enriquecidos con Earth Engine
+    
+    Returns:
+        float: Unidades de costo
+    """
+    return (BASE_COST +
+            grid_resolution * grid_resolution / POINTS_PER_COST_UNIT +
+            num_samples / SAMPLES_PER_COST_UNIT)
+
+
+class TokenBucket:
+    """Bucket de capacidad fija que se recarga refill_rate unidades por segundo"""
+    
+    def __init__(self, capacity, refill_rate, now):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = now
+    
+    def try_consume(self, cost, now):
+        """
+        Descuenta cost si alcanza
+        
+        Returns:
+            tuple: (admitida, segundos hasta tener saldo suficiente)
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+        
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        
+        return False, (cost - self.tokens) / self.refill_rate
+
+
+class AdmissionTicket:
+    """Petición admitida; release() libera el cupo de petición cara (idempotente)"""
+    
+    def __init__(self, controller, cost, expensive):
+        self.cost = cost
+        self.expensive = expensive
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+    
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        if self.expensive:
+            self._controller._release_expensive(time.monotonic() - self._started)
+
+
+class AdmissionRejected(Exception):
+    """Petición rechazada por falta de presupuesto"""
+    
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+    
+    @property
+    def retry_after_header(self):
+        """Valor de Retry-After (segundos enteros, mínimo 1)"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionController:
+    """Token buckets por cliente + tope de peticiones caras concurrentes"""
+    
+    def __init__(self, capacity=60, refill_rate=1.0, expensive_cost=10,
+                 max_concurrent_expensive=2, max_clients=10000):
+        """
+        Args:
+            capacity: Unidades de costo acumulables por cliente (ráfaga máxima)
+            refill_rate: Unidades por segundo que recupera cada cliente
+            expensive_cost: Costo a partir del cual una petición es cara
+            max_concurrent_expensive: Peticiones caras simultáneas permitidas
+            max_clients: Buckets en memoria (se descartan los menos recientes)
+        """
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.expensive_cost = expensive_cost
+        self.max_concurrent_expensive = max_concurrent_expensive
+        self.max_clients = max_clients
+        
+        self._buckets = OrderedDict()
+        self._expensive_in_flight = 0
+        self._expensive_duration = None  # promedio móvil (segundos)
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected_rate = 0
+        self.rejected_concurrency = 0
+    
+    def admit(self, client_key, cost):
+        """
+        Admite la petición o lanza AdmissionRejected
+        
+        Args:
+            client_key: API key o IP del cliente
+            cost: Costo estimado (ver estimate_request_cost)
+        
+        Returns:
+            AdmissionTicket: Hay que llamar a release() al terminar
+        """
+        # Una petición más cara que la ráfaga máxima se admite con el bucket lleno
+        charged = min(cost, self.capacity)
+        expensive = cost >= self.expensive_cost
+        
+        with self._lock:
+            if expensive and self._expensive_in_flight >= self.max_concurrent_expensive:
+                self.rejected_concurrency += 1
+                raise AdmissionRejected(
+                    "Demasiadas peticiones costosas en curso",
+                    self._expensive_duration or 1.0
+                )
+            
+            now = time.monotonic()
+            bucket = self._buckets.get(client_key)
+            if bucket is None:
+                bucket = TokenBucket(self.capacity, self.refill_rate, now)
+                self._buckets[client_key] = bucket
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_key)
+            
+            admitted, retry_after = bucket.try_consume(charged, now)
+            if not admitted:
+                self.rejected_rate += 1
+                raise AdmissionRejected("Límite de peticiones excedido", retry_after)
+            
+            if expensive:
+                self._expensive_in_flight += 1
+            self.admitted += 1
+        
+        return AdmissionTicket(self, cost, expensive)
+    
+    def _release_expensive(self, duration):
+        with self._lock:
+            self._expensive_in_flight -= 1
+            if self._expensive_duration is None:
+                self._expensive_duration = duration
+            else:
+                self._expensive_duration = 0.8 * self._expensive_duration + 0.2 * duration
+    
+    def snapshot(self):
+        """Estado para /health"""
+        with self._lock:
+            return {
+                "clients": len(self._buckets),
+                "expensive_in_flight": self._expensive_in_flight,
+                "max_concurrent_expensive": self.max_concurrent_expensive,
+                "admitted": self.admitted,
+                "rejected_rate_limit": self.rejected_rate,
+                "rejected_concurrency": self.rejected_concurrency
+            }
@@ -0,0 +1,448 @@
+"""
+Áreas de interés (AOI) con pre-cómputo programado del riesgo
+
+Las áreas registradas se refrescan en segundo plano cada N minutos:
+se obtiene el clima, se puntúan todas las áreas vencidas en un solo lote
+con OptimizedFirePredictor, se enriquecen las respuestas y se guardan.
+Con un IncrementalScorer solo entran al lote las celdas cuyo clima cambió
+desde la última vez que se puntuaron.
+/predict-fire-risk sobre esas áreas pasa a ser una búsqueda en el store,
+y se envía una alerta cuando cambia overall_risk_level.
+
+Cada área guarda un hash de su dueño (API key o IP) para limitar cuántas
+registra cada cliente; los webhooks de las áreas solo pueden apuntar a
+hosts públicos (se valida al registrar y otra vez antes de cada envío).
+"""
+
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+
+from utils.weather_api import generate_synthetic_weather_data
+from utils.response_formatter import create_grid_api_response
+
+
+def client_fingerprint(client_key):
+    """Hash del cliente que registra un área (no se guarda la API key en claro)"""
+    return hashlib.sha256(str(client_key).encode()).hexdigest()[:16]
+
+
+def _is_public_address(address):
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved or
+                ip.is_multicast or ip.is_unspecified)
+
+
+def validate_webhook_url(webhook_url, allowed_hosts=None, allow_http=False):
+    """
+    Valida el webhook de un área para no hacer peticiones a la red interna
+    
+    Args:
+        webhook_url: URL indicada por el cliente
+        allowed_hosts: Hosts permitidos (también sus subdominios); None = cualquier host público
+        allow_http: Aceptar http además de https
+    
+    Returns:
+        tuple: (es_valido, mensaje_error, url)
+    """
+    if not isinstance(webhook_url, str):
+        return False, "webhook_url debe ser un string", None
+    
+    try:
+        parts = urlsplit(webhook_url)
+        port = parts.port
+    except ValueError:
+        return False, "webhook_url no es una URL válida", None
+    
+    schemes = ('https', 'http') if allow_http else ('https',)
+    if parts.scheme not in schemes:
+        return False, f"webhook_url debe usar {' o '.join(schemes)}", None
+    
+    host = (parts.hostname or '').rstrip('.').lower()
+    if not host:
+        return False, "webhook_url no tiene host", None
+    
+    if allowed_hosts and not any(host == allowed or host.endswith('.' + allowed) for allowed in allowed_hosts):
+        return False, f"El host '{host}' no está en la lista de webhooks permitidos", None
+    
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        return False, f"No se pudo resolver el host '{host}'", None
+    
+    if not addresses or not all(_is_public_address(address.split('%')[0]) for address in addresses):
+        return False, f"El host '{host}' resuelve a una dirección privada o reservada", None
+    
+    return True, None, webhook_url
+
+
+class AreaLimitExceeded(ValueError):
+    """Se alcanzó el máximo de áreas (por cliente o en total)"""
+
+
+def _bbox_key(bbox_corners, grid_resolution):
+    """Clave estable de un bbox normalizado [lat, lon]"""
+    top_left = bbox_corners['top_left']
+    bottom_right = bbox_corners['bottom_right']
+    return (
+        round(float(top_left[0]), 6), round(float(top_left[1]), 6),
+        round(float(bottom_right[0]), 6), round(float(bottom_right[1]), 6),
+        grid_resolution
+    )
+
+
+class AreaOfInterestStore:
+    """Registro de áreas y resultados pre-computados (memoria + JSON opcional)"""
+    
+    def __init__(self, persist_path=None):
+        """
+        Args:
+            persist_path: Archivo JSON donde se guardan los registros (None = solo memoria)
+        """
+        self.persist_path = persist_path
+        self._areas = {}
+        self._lock = threading.Lock()
+        
+        if persist_path and os.path.exists(persist_path):
+            self._load()
+    
+    def register(self, bbox_corners, refresh_minutes=180, name=None,
+                 grid_resolution=5, webhook_url=None, owner=None,
+                 max_per_owner=None, max_total=None):
+        """
+        Registra un área (bbox ya normalizado) y devuelve su registro
+        
+        Args:
+            owner: client_fingerprint de quien la registra
+            max_per_owner: Máximo de áreas por dueño (None = sin límite)
+            max_total: Máximo de áreas en el store (None = sin límite)
+        
+        Raises:
+            AreaLimitExceeded: Si se supera alguno de los límites
+        """
+        area = {
+            'id': uuid.uuid4().hex[:12],
+            'owner': owner,
+            'name': name,
+            'bbox_corners': bbox_corners,
+            'grid_resolution': grid_resolution,
+            'refresh_minutes': refresh_minutes,
+            'webhook_url': webhook_url,
+            'created_at': datetime.utcnow().isoformat(),
+            'last_refresh': None,
+            'last_risk_level': None,
+            'results': {}
+        }
+        
+        with self._lock:
+            if max_total is not None and len(self._areas) >= max_total:
+                raise AreaLimitExceeded(f"Se alcanzó el máximo de {max_total} áreas registradas")
+            owned = sum(1 for registered in self._areas.values() if registered.get('owner') == owner)
+            if max_per_owner is not None and owned >= max_per_owner:
+                raise AreaLimitExceeded(f"Máximo {max_per_owner} áreas por cliente")
+            
+            self._areas[area['id']] = area
+            self._save()
+        
+        return area
+    
+    def remove(self, area_id):
+        with self._lock:
+            removed = self._areas.pop(area_id, None)
+            self._save()
+        return removed is not None
+    
+    def get(self, area_id):
+        return self._areas.get(area_id)
+    
+    def list(self):
+        return list(self._areas.values())
+    
+    def find_result(self, bbox_corners, forecast_date, grid_resolution):
+        """Devuelve la respuesta pre-computada si el bbox coincide con un área registrada"""
+        key = _bbox_key(bbox_corners, grid_resolution)
+        
+        for area in self.list():
+            if _bbox_key(area['bbox_corners'], area['grid_resolution']) != key:
+                continue
+            
+            result = area['results'].get(forecast_date)
+            if result is not None:
+                return result
+        return None
+    
+    def due_areas(self, now=None):
+        """Áreas cuyo intervalo de refresco ya venció (y que no están esperando un reintento)"""
+        now = now or time.time()
+        return [
+            area for area in self.list()
+            if now >= (area.get('retry_at') or 0) and (
+                area['last_refresh'] is None
+                or now - area['last_refresh'] >= area['refresh_minutes'] * 60)
+        ]
+    
+    def store_result(self, area_id, forecast_date, response, keep_dates):
+        """Guarda una respuesta y descarta fechas fuera de la ventana"""
+        with self._lock:
+            area = self._areas.get(area_id)
+            if area is None:
+                return
+            
+            area['results'][forecast_date] = {
+                'response': response,
+                'computed_at': datetime.utcnow().isoformat()
+            }
+            for date in list(area['results']):
+                if date not in keep_dates:
+                    del area['results'][date]
+    
+    def _save(self):
+        """Persiste solo los registros (los resultados se recalculan)"""
+        if not self.persist_path:
+            return
+        
+        registrations = [
+            {k: v for k, v in area.items() if k not in ('results', 'last_refresh', 'failures', 'retry_at')}
+            for area in self._areas.values()
+        ]
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(registrations, f)
+        os.replace(tmp_path, self.persist_path)
+    
+    def _load(self):
+        try:
+            with open(self.persist_path) as f:
+                for area in json.load(f):
+                    area['results'] = {}
+                    area['last_refresh'] = None
+                    self._areas[area['id']] = area
+            print(f"📍 {len(self._areas)} áreas de interés cargadas")
+        except Exception as e:
+            print(f"⚠️ Error cargando áreas de interés: {e}")
+
+
+class AreaRefreshScheduler:
+    """Refresca en segundo plano las áreas vencidas"""
+    
+    def __init__(self, store, inference_pool, weather_api, poll_seconds=30,
+                 forecast_days=1, alert_webhook_url=None, incremental_scorer=None,
+                 webhook_allowed_hosts=None, webhook_allow_http=False):
+        """
+        Args:
+            store: AreaOfInterestStore
+            inference_pool: InferencePool usado para la inferencia por lotes
+            weather_api: MeteomaticsWeatherAPI
+            poll_seconds: Cada cuánto se revisan las áreas vencidas
+            forecast_days: Días (desde hoy, UTC) que se pre-computan
+            alert_webhook_url: Webhook por defecto para alertas de cambio de nivel
+            incremental_scorer: IncrementalScorer (None = se puntúan todas las celdas)
+            webhook_allowed_hosts: Hosts permitidos para los webhooks de las áreas
+            webhook_allow_http: Aceptar webhooks http (ver validate_webhook_url)
+        """
+        self.store = store
+        self.inference_pool = inference_pool
+        self.weather_api = weather_api
+        self.poll_seconds = poll_seconds
+        self.forecast_days = forecast_days
+        self.alert_webhook_url = alert_webhook_url
+        self.incremental_scorer = incremental_scorer
+        self.webhook_allowed_hosts = webhook_allowed_hosts
+        self.webhook_allow_http = webhook_allow_http
+        self._thread = None
+        self._stop = threading.Event()
+    
+    def start(self):
+        """Arranca el hilo (greenlet bajo gevent) del scheduler"""
+        if self._thread is not None:
+            return
+        
+        self._thread = threading.Thread(target=self._run, name='aoi-scheduler', daemon=True)
+        self._thread.start()
+        print(f"⏱️ Scheduler de áreas de interés activo (cada {self.poll_seconds}s)")
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_due_areas()
+            except Exception as e:
+                print(f"⚠️ Error en scheduler de áreas: {e}")
+            self._stop.wait(self.poll_seconds)
+    
+    def forecast_dates(self):
+        today = datetime.utcnow().date()
+        return [(today + timedelta(days=i)).isoformat() for i in range(self.forecast_days)]
+    
+    def _fetch_weather(self, area, date):
+        """Clima del área (fallback sintético si Meteomatics falla)"""
+        weather_data = self.weather_api.get_weather_for_area(
+            area['bbox_corners'], date, area['grid_resolution']
+        )
+        if weather_data is None:
+            weather_data = generate_synthetic_weather_data(
+                area['bbox_corners'], area['grid_resolution'], date
+            )
+        return weather_data
+    
+    def _plan(self, area, date, weather_data):
+        """Features del área y máscara de celdas a puntuar (ver IncrementalScorer.prepare)"""
+        if self.incremental_scorer is not None:
+            return self.incremental_scorer.prepare(area['id'], date, weather_data)
+        
+        # En modo shard los puntos de modelos no cargados usan el primer modelo del shard
+        features, regions = self.inference_pool.predictor.build_feature_matrix(weather_data, strict=False)
+        return {'features': features, 'regions': regions, 'stale': np.ones(len(features), dtype=bool)}
+    
+    def _score_plans(self, plans):
+        """Puntúa en un solo lote las celdas stale de todos los planes; probabilidades por plan"""
+        counts = [int(plan['stale'].sum()) for plan in plans]
+        if not sum(counts):
+            return [np.empty(0) for _ in plans]
+        
+        scored = self.inference_pool.score_features(
+            np.concatenate([plan['features'][plan['stale']] for plan in plans]),
+            np.concatenate([plan['regions'][plan['stale']] for plan in plans])
+        )
+        return np.split(scored, np.cumsum(counts)[:-1])
+    
+    def _back_off(self, area, error, now):
+        """Saca el área del lote y la reintenta más tarde (espera exponencial, hasta su intervalo)"""
+        area['failures'] = area.get('failures', 0) + 1
+        delay = min(self.poll_seconds * 2 ** area['failures'], area['refresh_minutes'] * 60)
+        area['retry_at'] = now + delay
+        print(f"⚠️ Área {area['id']} falló ({error}); se reintenta en {delay:.0f}s")
+    
+    def refresh_due_areas(self):
+        """
+        Refresca todas las áreas vencidas en un solo lote de inferencia
+        
+        Un área que falla (clima, features, inferencia o guardado) sale del
+        lote con backoff; el resto se refresca igual.
+        
+        Returns:
+            int: Áreas refrescadas
+        """
+        areas = self.store.due_areas()
+        if not areas:
+            return 0
+        
+        dates = self.forecast_dates()
+        now = time.time()
+        print(f"⏱️ Pre-computando {len(areas)} áreas x {len(dates)} fechas")
+        
+        # 1. Clima y features de cada (área, fecha)
+        planned = []
+        for area in areas:
+            try:
+                plans = [self._plan(area, date, self._fetch_weather(area, date)) for date in dates]
+            except Exception as e:
+                self._back_off(area, e, now)
+                continue
+            planned.append((area, plans))
+        
+        # 2. Inferencia por lotes: una sola matriz con las celdas a puntuar de todas las áreas
+        try:
+            scored = self._score_plans([plan for _, area_plans in planned for plan in area_plans])
+        except Exception as e:
+            # Si el lote falla, cada área se puntúa por separado para aislar la que falla
+            print(f"⚠️ Lote de áreas falló ({e}), se puntúa cada área por separado")
+            scored, batch = [], planned
+            planned = []
+            for area, plans in batch:
+                try:
+                    scored.extend(self._score_plans(plans))
+                except Exception as area_error:
+                    self._back_off(area, area_error, now)
+                    continue
+                planned.append((area, plans))
+        
+        stale_count = sum(len(probabilities) for probabilities in scored)
+        total_count = sum(len(plan['stale']) for _, plans in planned for plan in plans)
+        if stale_count < total_count:
+            print(f"♻️ {total_count - stale_count}/{total_count} celdas sin cambios de clima, no se re-puntúan")
+        
+        # 3. Separar por área, enriquecer y guardar
+        scored = iter(scored)
+        refreshed = 0
+        for area, plans in planned:
+            area_scored = [next(scored) for _ in plans]
+            try:
+                for date, plan, probabilities in zip(dates, plans, area_scored):
+                    if self.incremental_scorer is not None:
+                        probabilities = self.incremental_scorer.commit(plan, probabilities)
+                    
+                    response = create_grid_api_response(
+                        plan['features'], probabilities, date, area['bbox_corners']
+                    )
+                    self.store.store_result(area['id'], date, response, dates)
+                    
+                    if date == dates[0]:
+                        self._check_alert(area, response)
+            except Exception as e:
+                self._back_off(area, e, now)
+                continue
+            
+            area['last_refresh'] = now
+            area['failures'] = 0
+            area.pop('retry_at', None)
+            refreshed += 1
+        
+        if self.incremental_scorer is not None:
+            self.incremental_scorer.prune([area['id'] for area in self.store.list()], dates)
+        
+        return refreshed
+    
+    def _check_alert(self, area, response):
+        """Envía una alerta si cambió el nivel de riesgo general del área"""
+        new_level = response['fire_risk_assessment']['overall_risk_level']
+        previous_level = area['last_risk_level']
+        area['last_risk_level'] = new_level
+        
+        if previous_level is None or previous_level == new_level:
+            return
+        
+        print(f"🚨 Área {area['id']}: riesgo {previous_level} -> {new_level}")
+        
+        webhook_url = area.get('webhook_url')
+        if webhook_url:
+            # El DNS pudo cambiar desde el registro
+            is_valid, error_message, _ = validate_webhook_url(
+                webhook_url, self.webhook_allowed_hosts, self.webhook_allow_http
+            )
+            if not is_valid:
+                print(f"⚠️ Webhook del área {area['id']} descartado: {error_message}")
+                return
+        else:
+            # ALERT_WEBHOOK_URL lo configura el operador: no se valida
+            webhook_url = self.alert_webhook_url
+        if not webhook_url:
+            return
+        
+        try:
+            requests.post(webhook_url, json={
+                'area_id': area['id'],
+                'name': area['name'],
+                'bbox_corners': area['bbox_corners'],
+                'previous_risk_level': previous_level,
+                'overall_risk_level': new_level,
+                'fire_risk_assessment': response['fire_risk_assessment'],
+                'recommendations': response['recommendations'],
+                'timestamp': datetime.utcnow().isoformat()
+            }, timeout=10, allow_redirects=False)
+        except Exception as e:
+            print(f"⚠️ Error enviando alerta al webhook: {e}")
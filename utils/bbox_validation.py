@@ -0,0 +1,125 @@
+"""
+Validación y normalización de bboxes en lote
+
+Las esquinas se validan como un array (n, 2, 2) [[top_left], [bottom_right]]:
+detección de orden de ejes ([lon, lat] estilo Cesium/GeoJSON vs [lat, lon]),
+normalización a [lat, lon] y chequeo de rangos en una sola pasada de NumPy.
+Cada bbox recibe un código de error (BBOX_OK = válido).
+
+validate_bbox_coordinates (response_formatter) es un wrapper de un solo bbox.
+"""
+
+import numpy as np
+
+BBOX_OK = 0
+BBOX_NOT_DICT = 1
+BBOX_MISSING_CORNERS = 2
+BBOX_BAD_TOP_LEFT = 3
+BBOX_BAD_BOTTOM_RIGHT = 4
+BBOX_NOT_NUMERIC = 5
+BBOX_LATITUDE_RANGE = 6
+BBOX_LONGITUDE_RANGE = 7
+
+BBOX_ERROR_MESSAGES = {
+    BBOX_NOT_DICT: "bbox_corners debe ser un diccionario",
+    BBOX_MISSING_CORNERS: "bbox_corners debe contener 'top_left' y 'bottom_right'",
+    BBOX_BAD_TOP_LEFT: "top_left debe ser una lista [lat, lon] o [lon, lat]",
+    BBOX_BAD_BOTTOM_RIGHT: "bottom_right debe ser una lista [lat, lon] o [lon, lat]",
+    BBOX_NOT_NUMERIC: "Las coordenadas deben ser numéricas",
+    BBOX_LATITUDE_RANGE: "Latitud debe estar entre -90 y 90",
+    BBOX_LONGITUDE_RANGE: "Longitud debe estar entre -180 y 180"
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _structure_code(bbox):
+    """Código de error de estructura de un bbox en formato dict"""
+    if not bbox or not isinstance(bbox, dict):
+        return BBOX_NOT_DICT
+    
+    if 'top_left' not in bbox or 'bottom_right' not in bbox:
+        return BBOX_MISSING_CORNERS
+    
+    top_left = bbox['top_left']
+    bottom_right = bbox['bottom_right']
+    
+    if not isinstance(top_left, list) or len(top_left) != 2:
+        return BBOX_BAD_TOP_LEFT
+    
+    if not isinstance(bottom_right, list) or len(bottom_right) != 2:
+        return BBOX_BAD_BOTTOM_RIGHT
+    
+    if not all(_is_number(value) for value in top_left + bottom_right):
+        return BBOX_NOT_NUMERIC
+    
+    return BBOX_OK
+
+
+def bboxes_to_array(bboxes):
+    """
+    Convierte bboxes {top_left, bottom_right} al array de esquinas
+    
+    Returns:
+        tuple: (corners (n, 2, 2) con NaN en los inválidos, códigos de estructura int8)
+    """
+    codes = np.fromiter((_structure_code(bbox) for bbox in bboxes), dtype=np.int8, count=len(bboxes))
+    corners = np.full((len(bboxes), 2, 2), np.nan)
+    
+    well_formed = np.flatnonzero(codes == BBOX_OK)
+    if len(well_formed):
+        corners[well_formed] = [
+            (bboxes[i]['top_left'], bboxes[i]['bottom_right']) for i in well_formed
+        ]
+    
+    return corners, codes
+
+
+def validate_corner_array(corners, codes=None):
+    """
+    Detecta orden de ejes, normaliza a [lat, lon] y valida rangos
+    
+    Si el primer valor de alguna esquina está fuera del rango de latitud se
+    asume [lon, lat] para todo el bbox y se invierten los ejes.
+    
+    Args:
+        corners: Array (n, 2, 2) de esquinas [[top_left], [bottom_right]]
+        codes: Códigos previos (p. ej. de estructura); solo se validan los BBOX_OK
+    
+    Returns:
+        tuple: (códigos int8, esquinas normalizadas [lat, lon], máscara de ejes invertidos)
+    """
+    corners = np.asarray(corners, dtype=float).reshape(-1, 2, 2)
+    codes = np.zeros(len(corners), dtype=np.int8) if codes is None else np.array(codes, dtype=np.int8)
+    
+    swapped = (np.abs(corners[:, :, 0]) > 90).any(axis=1)
+    normalized = np.where(swapped[:, None, None], corners[:, :, ::-1], corners)
+    
+    # Comparaciones con NaN dan False: quedan como fuera de rango
+    lat_ok = ((normalized[:, :, 0] >= -90) & (normalized[:, :, 0] <= 90)).all(axis=1)
+    lon_ok = ((normalized[:, :, 1] >= -180) & (normalized[:, :, 1] <= 180)).all(axis=1)
+    
+    pending = codes == BBOX_OK
+    codes[pending & ~lat_ok] = BBOX_LATITUDE_RANGE
+    codes[pending & lat_ok & ~lon_ok] = BBOX_LONGITUDE_RANGE
+    
+    return codes, normalized, swapped & (codes == BBOX_OK)
+
+
+def validate_bboxes(bboxes):
+    """
+    Valida una lista de bboxes {top_left, bottom_right}
+    
+    Returns:
+        tuple: (códigos int8, esquinas normalizadas (n, 2, 2), máscara de ejes invertidos)
+    """
+    corners, codes = bboxes_to_array(bboxes)
+    return validate_corner_array(corners, codes)
+
+
+def corners_to_bbox(corners):
+    """Esquinas (2, 2) normalizadas al dict {top_left, bottom_right} de la API"""
+    top_left, bottom_right = np.asarray(corners).tolist()
+    return {'top_left': top_left, 'bottom_right': bottom_right}
@@ -0,0 +1,181 @@
+"""
+Formatos binarios para clientes máquina (Apache Arrow IPC y MessagePack)
+
+La grilla completa se arma directamente desde los arrays del predictor
+(features y probabilidades), sin pasar por la lista de dicts del JSON:
+
+- lat, lon, fire_risk_percentage (float64)
+- risk_category (diccionario LOW/MEDIUM/HIGH)
+- elevation, slope (float64, nulos fuera de los puntos enriquecidos)
+- land_cover, vegetation_density (diccionario, nulos fuera de los puntos enriquecidos)
+
+La evaluación general (fire_risk_assessment, recommendations) viaja en la
+metadata del schema Arrow (clave "summary", JSON) o en la clave "summary"
+del mapa MessagePack.
+
+Arrow se sirve como stream IPC (application/vnd.apache.arrow.stream) o
+como archivo IPC (application/vnd.apache.arrow.file, con footer para
+acceso aleatorio). El formato sale de Accept respetando los valores q:
+un binario solo se elige si el cliente no prefiere JSON o NDJSON.
+
+pyarrow y msgpack son opcionales: si falta la librería el formato no se ofrece.
+"""
+
+import json
+
+import numpy as np
+
+from utils.fire_predictor import RISK_LEVELS, risk_level_codes
+from utils.response_encoding import NDJSON_MIMETYPE, best_mimetype
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - dependencia opcional
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+ARROW_FILE_MIMETYPE = 'application/vnd.apache.arrow.file'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# Tipos MIME aceptados en Accept para cada formato
+BINARY_FORMATS = {
+    ARROW_MIMETYPE: 'arrow',
+    ARROW_FILE_MIMETYPE: 'arrow_file',
+    MSGPACK_MIMETYPE: 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.msgpack': 'msgpack',
+}
+
+# Todo lo que ofrece /predict-fire-risk; JSON primero: gana los empates y */*
+RESPONSE_MIMETYPES = ['application/json', NDJSON_MIMETYPE] + list(BINARY_FORMATS)
+
+
+def requested_binary_format(accept_header):
+    """Formato binario preferido en Accept ('arrow', 'arrow_file', 'msgpack' o None para JSON/NDJSON)"""
+    return BINARY_FORMATS.get(best_mimetype(accept_header, RESPONSE_MIMETYPES))
+
+
+def is_format_available(binary_format):
+    if binary_format in ('arrow', 'arrow_file'):
+        return pa is not None
+    if binary_format == 'msgpack':
+        return msgpack is not None
+    return False
+
+
+def _dictionary_encode(values, size, indices):
+    """Códigos int8 (-1 = nulo) y diccionario para valores presentes solo en indices"""
+    dictionary = sorted(set(values))
+    lookup = {value: code for code, value in enumerate(dictionary)}
+    codes = np.full(size, -1, dtype=np.int8)
+    codes[indices] = [lookup[value] for value in values]
+    return codes, dictionary
+
+
+def build_grid_columns(features, probabilities, enriched_indices, terrain_infos, codes=None):
+    """
+    Columnas de la grilla completa a partir de los arrays del predictor
+    
+    Args:
+        features: Matriz de features (lat y lon en las columnas 0 y 1)
+        probabilities: Probabilidad (0-100) de cada punto
+        enriched_indices: Índices de los puntos enriquecidos con Earth Engine
+        terrain_infos: Datos de terreno de esos puntos (mismo orden)
+        codes: Categorías de riesgo ya calculadas (por defecto, desde probabilities)
+        
+    Returns:
+        dict: {nombre: ndarray} y {nombre: (códigos, diccionario)} para categóricas
+    """
+    size = len(probabilities)
+    enriched_indices = np.asarray(enriched_indices, dtype=int)
+    
+    elevation = np.full(size, np.nan)
+    slope = np.full(size, np.nan)
+    elevation[enriched_indices] = [info['terrain']['elevation'] for info in terrain_infos]
+    slope[enriched_indices] = [info['terrain']['slope'] for info in terrain_infos]
+    
+    return {
+        'lat': np.ascontiguousarray(features[:, 0]),
+        'lon': np.ascontiguousarray(features[:, 1]),
+        'fire_risk_percentage': np.round(probabilities, 2),
+        'risk_category': (risk_level_codes(probabilities) if codes is None else codes, list(RISK_LEVELS)),
+        'elevation': elevation,
+        'slope': slope,
+        'land_cover': _dictionary_encode(
+            [info['terrain']['land_cover'] for info in terrain_infos], size, enriched_indices
+        ),
+        'vegetation_density': _dictionary_encode(
+            [info['vegetation']['density'] for info in terrain_infos], size, enriched_indices
+        ),
+    }
+
+
+def encode_arrow(columns, summary, file_format=False):
+    """Serializa las columnas como stream Arrow IPC o, con file_format, como archivo IPC (un record batch)"""
+    arrays = []
+    names = []
+    
+    for name, column in columns.items():
+        if isinstance(column, tuple):
+            codes, dictionary = column
+            indices = pa.array(codes, mask=codes < 0, type=pa.int8())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(dictionary, type=pa.string())))
+        else:
+            arrays.append(pa.array(column, mask=np.isnan(column), type=pa.float64()))
+        names.append(name)
+    
+    batch = pa.RecordBatch.from_arrays(arrays, names=names)
+    schema = batch.schema.with_metadata({'summary': json.dumps(summary, default=float)})
+    batch = batch.replace_schema_metadata(schema.metadata)
+    
+    sink = pa.BufferOutputStream()
+    new_writer = pa.ipc.new_file if file_format else pa.ipc.new_stream
+    with new_writer(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(columns, summary):
+    """
+    Serializa las columnas como MessagePack con buffers tipados
+    
+    Cada columna numérica es {"dtype": "<f8", "data": bytes} (NaN = nulo) y cada
+    categórica {"dtype": "<i1", "data": bytes, "dictionary": [...]} (-1 = nulo),
+    así el cliente la reconstruye con np.frombuffer sin parsear elementos.
+    """
+    packed_columns = {}
+    
+    for name, column in columns.items():
+        if isinstance(column, tuple):
+            codes, dictionary = column
+            packed_columns[name] = {
+                'dtype': codes.dtype.str,
+                'data': codes.tobytes(),
+                'dictionary': dictionary
+            }
+        else:
+            data = np.ascontiguousarray(column, dtype='<f8')
+            packed_columns[name] = {'dtype': data.dtype.str, 'data': data.tobytes()}
+    
+    return msgpack.packb({
+        'summary': json.loads(json.dumps(summary, default=float)),
+        'num_rows': len(columns['lat']),
+        'columns': packed_columns
+    }, use_bin_type=True)
+
+
+def encode_grid(binary_format, columns, summary):
+    """
+    Returns:
+        tuple: (bytes, mimetype)
+    """
+    if binary_format == 'arrow':
+        return encode_arrow(columns, summary), ARROW_MIMETYPE
+    if binary_format == 'arrow_file':
+        return encode_arrow(columns, summary, file_format=True), ARROW_FILE_MIMETYPE
+    return encode_msgpack(columns, summary), MSGPACK_MIMETYPE
@@ -0,0 +1,111 @@
+"""
+Caché LRU en memoria, segura entre hilos/greenlets
+
+Las entradas más recientes pueden guardarse en disco (pickle) y recargarse
+al arrancar un worker nuevo, para no empezar con la caché vacía.
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Caché LRU acotada por número de entradas"""
+    
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Devuelve el valor cacheado o None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+    
+    def peek(self, key):
+        """Como get, pero sin contar acierto/fallo ni cambiar el orden LRU"""
+        with self._lock:
+            return self._entries.get(key)
+    
+    def set(self, key, value):
+        """Guarda un valor, descartando la entrada menos usada si se llena"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def save(self, path, max_entries=None):
+        """
+        Guarda las entradas más usadas recientemente (escritura atómica)
+        
+        Returns:
+            int: Entradas guardadas
+        """
+        with self._lock:
+            items = list(self._entries.items())
+        if max_entries is not None:
+            items = items[-max_entries:] if max_entries > 0 else []
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return len(items)
+    
+    def load(self, path, accept=None):
+        """
+        Carga entradas guardadas con save (las existentes tienen prioridad)
+        
+        Args:
+            path: Archivo generado por save
+            accept: Filtro opcional accept(key) -> bool (p. ej. versión de modelo)
+            
+        Returns:
+            int: Entradas cargadas (0 si no hay archivo)
+        """
+        if not os.path.exists(path):
+            return 0
+        
+        with open(path, 'rb') as f:
+            items = pickle.load(f)
+        
+        loaded = 0
+        with self._lock:
+            # Se insertan primero para que queden como las menos recientes
+            restored = OrderedDict(
+                (key, value) for key, value in items
+                if key not in self._entries and (accept is None or accept(key))
+            )
+            loaded = len(restored)
+            restored.update(self._entries)
+            self._entries = restored
+            
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        
+        return loaded
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self):
+        """Estadísticas para /health"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses
+        }
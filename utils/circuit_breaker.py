@@ -0,0 +1,198 @@
+"""
+Circuit breaker con ventana deslizante de errores y latencias
+
+Protege a los workers cuando un servicio externo (Meteomatics) está lento
+o caído: al superar la tasa de errores o de llamadas lentas se abre el
+circuito y las peticiones fallan de inmediato hacia el fallback.
+
+allow_request devuelve un permiso que el llamador pasa a record_success/
+record_failure y entrega a release() al terminar (en un finally): si la
+llamada de prueba de half_open se cancela sin registrar resultado, el
+permiso la libera. Además la prueba vence a los probe_timeout segundos
+por si el llamador nunca vuelve. En half_open solo el resultado de la
+prueba (su permiso) cierra o reabre el circuito.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitPermit:
+    """Permiso devuelto por allow_request (probe=True si es la llamada de prueba)"""
+    
+    def __init__(self, probe=False):
+        self.probe = probe
+        self.started = time.time()
+
+
+class CircuitBreaker:
+    """Breaker closed -> open -> half_open basado en tasas de error y lentitud"""
+    
+    def __init__(self, window_size=20, window_seconds=60, min_requests=10,
+                 failure_rate_threshold=0.5, slow_call_seconds=10,
+                 slow_call_rate_threshold=0.5, consecutive_failures=5,
+                 reset_timeout=30, probe_timeout=60):
+        """
+        Args:
+            window_size: Máximo de llamadas recientes consideradas
+            window_seconds: Antigüedad máxima de las llamadas consideradas
+            min_requests: Llamadas mínimas en la ventana antes de evaluar tasas
+            failure_rate_threshold: Tasa de errores que abre el circuito
+            slow_call_seconds: Latencia a partir de la cual una llamada es lenta
+            slow_call_rate_threshold: Tasa de llamadas lentas que abre el circuito
+            consecutive_failures: Errores seguidos que abren el circuito sin esperar a la tasa
+            reset_timeout: Segundos en estado open antes de probar (half_open)
+            probe_timeout: Segundos tras los que una prueba sin resultado se da por perdida
+        """
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.consecutive_failures = consecutive_failures
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        
+        self._calls = deque(maxlen=window_size)  # (timestamp, ok, latency)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probe = None  # CircuitPermit de la prueba en curso
+        self._failure_streak = 0
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected_calls = 0
+    
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+    
+    def allow_request(self):
+        """
+        Indica si se puede llamar al servicio
+        
+        Returns:
+            CircuitPermit (se pasa a release al terminar) o False para fallar rápido
+        """
+        with self._lock:
+            self._maybe_half_open()
+            
+            if self._state == CLOSED:
+                return CircuitPermit()
+            
+            # En half_open solo se permite una llamada de prueba a la vez
+            if self._state == HALF_OPEN:
+                if self._probe is not None and time.time() - self._probe.started >= self.probe_timeout:
+                    print(f"⚡ Prueba del circuit breaker sin resultado tras {self.probe_timeout}s, se permite otra")
+                    self._probe = None
+                if self._probe is None:
+                    self._probe = CircuitPermit(probe=True)
+                    return self._probe
+            
+            self.rejected_calls += 1
+            return False
+    
+    def release(self, permit):
+        """
+        Libera el permiso al terminar la llamada, con o sin resultado registrado
+        
+        Una prueba cancelada (CancelledError, GreenletExit, Timeout de gevent)
+        no registra éxito ni fallo; sin esto el circuito quedaba en half_open
+        rechazando todo.
+        """
+        with self._lock:
+            if permit and self._probe is permit:
+                self._probe = None
+    
+    def record_success(self, latency, permit=None):
+        self._record(True, latency, permit)
+    
+    def record_failure(self, latency, permit=None):
+        self._record(False, latency, permit)
+    
+    def latency_percentile(self, percentile=95):
+        """Percentil de latencia de las llamadas exitosas recientes (None sin datos)"""
+        with self._lock:
+            latencies = [latency for _, ok, latency in self._recent_calls() if ok]
+        
+        if len(latencies) < self.min_requests:
+            return None
+        return float(np.percentile(latencies, percentile))
+    
+    def snapshot(self):
+        """Estado serializable para /health"""
+        with self._lock:
+            self._maybe_half_open()
+            calls = self._recent_calls()
+            failure_rate, slow_rate = self._rates(calls)
+            return {
+                "state": self._state,
+                "recent_calls": len(calls),
+                "failure_rate": round(failure_rate, 3),
+                "slow_call_rate": round(slow_rate, 3),
+                "probe_in_flight": self._probe is not None,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected_calls
+            }
+    
+    def _record(self, ok, latency, permit=None):
+        with self._lock:
+            self._calls.append((time.time(), ok, latency))
+            self._failure_streak = 0 if ok else self._failure_streak + 1
+            
+            if self._state == HALF_OPEN:
+                # Solo la prueba decide: una respuesta tardía de una llamada
+                # permitida antes de abrir el circuito queda en la ventana
+                if permit is None or permit is not self._probe:
+                    return
+                self._probe = None
+                if ok and latency < self.slow_call_seconds:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+            
+            if self._state == CLOSED:
+                if self._failure_streak >= self.consecutive_failures:
+                    self._open()
+                    return
+                
+                calls = self._recent_calls()
+                if len(calls) < self.min_requests:
+                    return
+                
+                failure_rate, slow_rate = self._rates(calls)
+                if (failure_rate >= self.failure_rate_threshold or
+                        slow_rate >= self.slow_call_rate_threshold):
+                    self._open()
+    
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.time()
+        self.times_opened += 1
+        print(f"⚡ Circuit breaker abierto por {self.reset_timeout}s")
+    
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.time() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probe = None
+    
+    def _recent_calls(self):
+        cutoff = time.time() - self.window_seconds
+        return [call for call in self._calls if call[0] >= cutoff]
+    
+    def _rates(self, calls):
+        if not calls:
+            return 0.0, 0.0
+        failures = sum(1 for _, ok, _ in calls if not ok)
+        slow = sum(1 for _, _, latency in calls if latency >= self.slow_call_seconds)
+        return failures / len(calls), slow / len(calls)
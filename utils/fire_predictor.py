@@ -2,31 +2,84 @@ import pickle
 import numpy as np
 import lightgbm as lgb
 
+# Categorías de riesgo (índice = código usado en formatos columnares)
+RISK_LEVELS = ('LOW', 'MEDIUM', 'HIGH')
+
+# Columnas de la matriz de features, en el orden del entrenamiento
+FEATURE_COLUMNS = ('latitude', 'longitude', 'bright_t31', 'confidence', 'frp', 'elevation', 'slope')
+
+# Columnas de la matriz de features que dependen del clima; lat, lon,
+# elevación y pendiente son fijas para cada punto
+WEATHER_FEATURE_COLUMNS = [2, 3, 4]
+
+
+def risk_level_codes(probabilities):
+    """Código de categoría (0=LOW, 1=MEDIUM, 2=HIGH) de cada probabilidad"""
+    probabilities = np.asarray(probabilities)
+    return np.select([probabilities > 70, probabilities > 30], [2, 1], default=0).astype(np.int8)
+
+
+def _column(df, candidates, default):
+    """Primera columna de candidates presente en df (como float); si no hay, default en todas las filas"""
+    for name in candidates:
+        if name in df.columns:
+            return df[name].to_numpy(dtype=float)
+    return np.full(len(df), default, dtype=float)
+
+
+class RegionNotLoadedError(ValueError):
+    """Puntos cuya región tiene modelo en el PKL pero no está cargado en este shard"""
+    
+    def __init__(self, regions):
+        self.regions = sorted(regions)
+        super().__init__(f"Regiones no cargadas en este shard: {', '.join(self.regions)}")
+
 
 class OptimizedFirePredictor:
     """Predictor que carga modelos desde PKL para inferencia rápida"""
     
-    def __init__(self, pkl_path=None):
+    def __init__(self, pkl_path=None, regions=None):
+        """
+        Args:
+            pkl_path: Paquete de modelos
+            regions: Regiones a cargar (shard); None carga todas
+        """
         self.regional_models = {}
+        self.package_regions = []
+        self.shard_regions = None
         self.preprocessing_params = {}
         self.system_metadata = {}
         self.region_boundaries = {}
         self.is_loaded = False
         
         if pkl_path:
-            self.load_models_from_pkl(pkl_path)
+            self.load_models_from_pkl(pkl_path, regions)
     
-    def load_models_from_pkl(self, pkl_path):
-        """Carga modelos entrenados desde archivo PKL"""
+    def load_models_from_pkl(self, pkl_path, regions=None):
+        """
+        Carga modelos entrenados desde archivo PKL
+        
+        Con regions solo se deserializan esos modelos (modo shard); los
+        límites de región y el orden del paquete se conservan completos
+        para que el ruteo y el fallback sean los mismos en todos los shards.
+        """
         try:
             print(f"Cargando modelos desde: {pkl_path}")
             
             with open(pkl_path, 'rb') as f:
                 model_package = pickle.load(f)
             
+            package_regions = list(model_package['regional_models'].keys())
+            if regions is not None:
+                unknown = set(regions) - set(package_regions)
+                if unknown:
+                    print(f"⚠️ Regiones sin modelo en el PKL: {', '.join(sorted(unknown))}")
+            
             # Deserializar modelos desde string
             deserialized_models = {}
             for region, model_info in model_package['regional_models'].items():
+                if regions is not None and region not in regions:
+                    continue
                 model_copy = model_info.copy()
                 # Reconstruir modelo desde string
                 if isinstance(model_info['model'], str):
@@ -36,12 +89,17 @@ class OptimizedFirePredictor:
                 deserialized_models[region] = model_copy
             
             self.regional_models = deserialized_models
+            self.package_regions = package_regions
+            self.shard_regions = tuple(deserialized_models) if regions is not None else None
             self.preprocessing_params = model_package['preprocessing_params']
             self.system_metadata = model_package['system_metadata']
             self.region_boundaries = self.preprocessing_params.get('region_boundaries', {})
             
             print(f"Modelos cargados correctamente")
             print(f"   {len(self.regional_models)} modelos regionales disponibles")
+            if self.shard_regions is not None:
+                print(f"   Shard: {', '.join(self.shard_regions) or 'sin modelos'} "
+                      f"({len(self.shard_regions)}/{len(package_regions)} regiones)")
             
             self.is_loaded = True
             return True
@@ -72,71 +130,177 @@ class OptimizedFirePredictor:
         
         processed_df = weather_df.copy()
         
+        # Generador local: el global de NumPy lo comparten todos los hilos de
+        # inferencia y las peticiones concurrentes se mezclaban los valores.
+        # RandomState(42) produce la misma secuencia que np.random.seed(42)
+        rng = np.random.RandomState(42)
+        
         # Agregar elevation y slope sintéticos si no existen
         if 'elevation' not in processed_df.columns:
-            np.random.seed(42)
-            processed_df['elevation'] = np.maximum(0, 
-                1000 + (processed_df['latitude'] * 50) + 
-                np.random.uniform(-500, 500, len(processed_df))
+            processed_df['elevation'] = np.maximum(0,
+                1000 + (processed_df['latitude'] * 50) +
+                rng.uniform(-500, 500, len(processed_df))
             )
         
         if 'slope' not in processed_df.columns:
-            processed_df['slope'] = np.minimum(45, 
-                processed_df['elevation'] / 100 + 
-                np.random.uniform(0, 10, len(processed_df))
+            processed_df['slope'] = np.minimum(45,
+                processed_df['elevation'] / 100 +
+                rng.uniform(0, 10, len(processed_df))
             )
         
         return processed_df
     
-    def predict_risk_optimized(self, weather_df):
-        """Predice riesgo usando modelos cargados desde PKL"""
+    def detect_regions(self, lats, lons):
+        """
+        Versión vectorizada de detect_region
+        
+        Returns:
+            Array con el nombre de región de cada punto (misma prioridad que detect_region)
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        regions = np.full(len(lats), 'other', dtype=object)
+        unassigned = np.ones(len(lats), dtype=bool)
+        
+        for region, bounds in self.region_boundaries.items():
+            if region == 'other':
+                continue
+            lat_range, lon_range = bounds['lat'], bounds['lon']
+            inside = (unassigned &
+                      (lats >= lat_range[0]) & (lats <= lat_range[1]) &
+                      (lons >= lon_range[0]) & (lons <= lon_range[1]))
+            regions[inside] = region
+            unassigned &= ~inside
+        
+        return regions
+    
+    def model_regions(self, lats, lons):
+        """
+        Modelo del paquete que corresponde a cada punto
+        
+        Regiones sin modelo propio usan el primer modelo del paquete (el mismo
+        en todos los shards, esté cargado o no en este proceso).
+        """
+        regions = self.detect_regions(lats, lons)
+        if self.package_regions:
+            missing = ~np.isin(regions, self.package_regions)
+            regions[missing] = self.package_regions[0]
+        return regions
+    
+    def build_feature_matrix(self, weather_df, only_regions=None, strict=True):
+        """
+        Construye la matriz de features (orden de entrenamiento) y la región de cada punto
+        
+        Args:
+            weather_df: Datos meteorológicos de la grilla
+            only_regions: Si se indica, solo se devuelven los puntos de esos modelos
+                (el router reparte un bbox multi-región entre shards)
+            strict: Si un punto cae en un modelo no cargado lanza RegionNotLoadedError;
+                con False usa el primer modelo cargado
+        
+        Returns:
+            tuple: (features ndarray (n, 7), regions ndarray con el nombre del modelo a usar)
+        """
+        features, regions = self.package_feature_matrix(weather_df)
+        return self.assign_models(features, regions, only_regions=only_regions, strict=strict)
+    
+    def package_feature_matrix(self, weather_df):
+        """
+        Matriz de features y modelo del paquete de cada punto, esté cargado o no
+        
+        El router la arma una sola vez para toda la grilla y reparte las filas
+        entre los shards (que completan con assign_models).
+        """
         if not self.is_loaded:
             raise ValueError("Modelos no cargados")
         
         # Preprocesar datos
         processed_df = self.preprocess_weather_data(weather_df)
+        
+        lats = processed_df['latitude'].to_numpy(dtype=float)
+        lons = processed_df['longitude'].to_numpy(dtype=float)
+        elevation = _column(processed_df, ['elevation'], 1000)
+        slope = _column(processed_df, ['slope'], 10)
+        
+        # Features en el orden del entrenamiento
+        features = np.column_stack([
+            lats, lons,
+            self.weather_features(self.weather_inputs(processed_df)),
+            elevation,
+            slope
+        ])
+        
+        return features, self.model_regions(lats, lons)
+    
+    def assign_models(self, features, regions=None, only_regions=None, strict=True):
+        """
+        Filtra la matriz por only_regions y resuelve los modelos no cargados en este shard
+        
+        Args:
+            features: Matriz (n, 7) de package_feature_matrix
+            regions: Modelo del paquete de cada fila (None lo calcula con lat y lon)
+            only_regions: Si se indica, solo se devuelven las filas de esos modelos
+            strict: Ver build_feature_matrix
+        
+        Returns:
+            tuple: (features, regions)
+        """
+        if regions is None:
+            regions = self.model_regions(features[:, 0], features[:, 1])
+        
+        # El filtro va después de armar las features: el relleno sintético
+        # de elevación depende de la grilla completa
+        if only_regions is not None:
+            selected = np.isin(regions, list(only_regions))
+            features, regions = features[selected], regions[selected]
+        
+        # Modo shard: modelos del paquete que este proceso no cargó (sin
+        # ningún modelo cargado no hay a cuál recurrir ni con strict=False)
+        not_loaded = ~np.isin(regions, list(self.regional_models.keys()))
+        if not_loaded.any():
+            if strict or not self.regional_models:
+                raise RegionNotLoadedError(set(regions[not_loaded]))
+            regions = np.where(not_loaded, next(iter(self.regional_models)), regions)
+        
+        return features, regions
+    
+    def weather_inputs(self, weather_df):
+        """
+        Variables meteorológicas de cada punto, en sus unidades
+        
+        Returns:
+            ndarray (n, 3): temperatura (°C), humedad relativa (%), viento (m/s)
+        """
+        return np.column_stack([
+            _column(weather_df, ['t_2m:C', 'temperature'], 25),
+            _column(weather_df, ['relative_humidity_2m:p', 'humidity'], 60),
+            _column(weather_df, ['wind_speed_10m:ms', 'wind_speed'], 5)
+        ])
+    
+    def weather_features(self, inputs):
+        """Columnas WEATHER_FEATURE_COLUMNS de la matriz a partir de weather_inputs"""
+        return np.column_stack([
+            inputs[:, 0] + 273.15,  # bright_t31 simulado
+            inputs[:, 1],           # confidence simulado
+            inputs[:, 2] * 10       # frp simulado
+        ])
+    
+    def score_features(self, features, regions):
+        """Predice la probabilidad (0-100) con una llamada al modelo por región"""
+        probabilities = np.empty(len(features), dtype=float)
+        
+        for region in np.unique(regions):
+            mask = regions == region
+            model = self.regional_models[region]['model']
+            probabilities[mask] = model.predict(features[mask])
+        
+        return np.clip(probabilities, 0, 100)
+    
+    def format_predictions(self, features, probabilities):
+        """Convierte los arrays de inferencia en la lista de predicciones de la API"""
         predictions = []
         
-        for idx, row in processed_df.iterrows():
-            lat, lon = row['latitude'], row['longitude']
-            
-            # Detectar región
-            region = self.detect_region(lat, lon)
-            
-            # Obtener modelo regional
-            if region in self.regional_models:
-                model_info = self.regional_models[region]
-                model = model_info['model']
-            else:
-                # Fallback al primer modelo disponible
-                model_info = list(self.regional_models.values())[0]
-                model = model_info['model']
-            
-            # Preparar features
-            temp_col = 't_2m:C' if 't_2m:C' in row else 'temperature'
-            humid_col = 'relative_humidity_2m:p' if 'relative_humidity_2m:p' in row else 'humidity'
-            wind_col = 'wind_speed_10m:ms' if 'wind_speed_10m:ms' in row else 'wind_speed'
-            
-            temperature = row.get(temp_col, 25)
-            humidity = row.get(humid_col, 60)
-            wind_speed = row.get(wind_col, 5)
-            elevation = row.get('elevation', 1000)
-            slope = row.get('slope', 10)
-            
-            # Features en el orden del entrenamiento
-            features = np.array([[
-                lat, lon,
-                temperature + 273.15,  # bright_t31 simulado
-                humidity,              # confidence simulado
-                wind_speed * 10,       # frp simulado
-                elevation,
-                slope
-            ]])
-            
-            # Hacer predicción
-            fire_probability = model.predict(features)[0]
-            fire_probability = max(0, min(100, fire_probability))
-            
+        for (lat, lon), fire_probability in zip(features[:, :2], probabilities):
             # Clasificar riesgo
             if fire_probability > 70:
                 risk_level = 'HIGH'
@@ -155,3 +319,9 @@ class OptimizedFirePredictor:
             predictions.append(prediction)
         
         return predictions
+    
+    def predict_risk_optimized(self, weather_df):
+        """Predice riesgo usando modelos cargados desde PKL"""
+        features, regions = self.build_feature_matrix(weather_df)
+        probabilities = self.score_features(features, regions)
+        return self.format_predictions(features, probabilities)
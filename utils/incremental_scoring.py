@@ -0,0 +1,156 @@
+"""
+Re-puntuación incremental de áreas que se consultan periódicamente
+
+En cada refresco de un área solo cambia el clima: lat, lon, elevación,
+pendiente y región de cada punto son los mismos. IncrementalScorer guarda
+ese bloque estático por área y, por (área, fecha), el clima con el que se
+puntuó cada celda y su probabilidad. En el refresco siguiente se copian
+las columnas de clima nuevas sobre el bloque y solo se vuelven a puntuar
+las celdas cuyo clima se movió más que la tolerancia respecto del último
+valor puntuado (no del refresco anterior, así el desvío no se acumula).
+"""
+
+import threading
+
+import numpy as np
+
+from utils.fire_predictor import WEATHER_FEATURE_COLUMNS
+
+# Tolerancias por variable: temperatura (°C), humedad relativa (%), viento (m/s)
+DEFAULT_TOLERANCES = (0.1, 0.5, 0.1)
+
+
+def parse_tolerances(value):
+    """'0.1,0.5,0.1' -> (0.1, 0.5, 0.1); vacío -> DEFAULT_TOLERANCES"""
+    if not value:
+        return DEFAULT_TOLERANCES
+    
+    tolerances = tuple(float(part) for part in value.split(','))
+    if len(tolerances) != len(DEFAULT_TOLERANCES) or min(tolerances) < 0:
+        raise ValueError("Se esperan 3 tolerancias >= 0: temperatura (°C), humedad (%), viento (m/s)")
+    return tolerances
+
+
+class IncrementalScorer:
+    """Bloques estáticos por área y últimas entradas puntuadas por (área, fecha)"""
+    
+    def __init__(self, predictor, tolerances=DEFAULT_TOLERANCES):
+        """
+        Args:
+            predictor: OptimizedFirePredictor
+            tolerances: Cambio máximo de (temperatura, humedad, viento) que no re-puntúa
+        """
+        self.predictor = predictor
+        self.tolerances = np.asarray(tolerances, dtype=float)
+        self._static = {}
+        self._scored = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'static_builds': 0,
+            'static_hits': 0,
+            'cells_scored': 0,
+            'cells_reused': 0
+        }
+    
+    def _static_block(self, area_id, weather_df):
+        """Bloque estático del área; se rearma si la grilla que devolvió el clima cambió"""
+        lats = weather_df['latitude'].to_numpy(dtype=float)
+        lons = weather_df['longitude'].to_numpy(dtype=float)
+        
+        static = self._static.get(area_id)
+        if (static is not None and np.array_equal(static['lats'], lats) and
+                np.array_equal(static['lons'], lons)):
+            self.stats['static_hits'] += 1
+            return static, False
+        
+        # En modo shard los puntos de modelos no cargados usan el primer modelo del shard
+        features, regions = self.predictor.build_feature_matrix(weather_df, strict=False)
+        static = {'lats': lats, 'lons': lons, 'features': features, 'regions': regions}
+        self.stats['static_builds'] += 1
+        
+        with self._lock:
+            self._static[area_id] = static
+            # Las probabilidades guardadas eran de la grilla anterior
+            for key in [key for key in self._scored if key[0] == area_id]:
+                del self._scored[key]
+        return static, True
+    
+    def prepare(self, area_id, forecast_date, weather_df):
+        """
+        Features del refresco y celdas que hay que volver a puntuar
+        
+        Returns:
+            dict: plan con 'features', 'regions' y 'stale' (máscara de celdas a puntuar);
+                  se completa con commit() después de puntuar features[stale]
+        """
+        static, rebuilt = self._static_block(area_id, weather_df)
+        inputs = self.predictor.weather_inputs(weather_df)
+        
+        if rebuilt:
+            features = static['features']
+        else:
+            features = static['features'].copy()
+            features[:, WEATHER_FEATURE_COLUMNS] = self.predictor.weather_features(inputs)
+        
+        previous = self._scored.get((area_id, forecast_date))
+        if previous is None:
+            stale = np.ones(len(features), dtype=bool)
+        else:
+            # NaN (dato faltante) compara como cambio
+            within = np.abs(inputs - previous['inputs']) <= self.tolerances
+            stale = ~within.all(axis=1)
+        
+        return {
+            'key': (area_id, forecast_date),
+            'features': features,
+            'regions': static['regions'],
+            'inputs': inputs,
+            'stale': stale,
+            'previous': previous
+        }
+    
+    def commit(self, plan, probabilities):
+        """
+        Combina las probabilidades nuevas (solo de features[stale]) con las guardadas
+        
+        Returns:
+            ndarray: Probabilidades de todas las celdas del área
+        """
+        stale = plan['stale']
+        previous = plan['previous']
+        
+        if previous is None:
+            scored = {'inputs': plan['inputs'], 'probabilities': np.asarray(probabilities, dtype=float)}
+        else:
+            scored = {'inputs': previous['inputs'].copy(), 'probabilities': previous['probabilities'].copy()}
+            scored['inputs'][stale] = plan['inputs'][stale]
+            scored['probabilities'][stale] = probabilities
+        
+        with self._lock:
+            self._scored[plan['key']] = scored
+        
+        self.stats['cells_scored'] += int(stale.sum())
+        self.stats['cells_reused'] += int(len(stale) - stale.sum())
+        return scored['probabilities']
+    
+    def prune(self, area_ids, forecast_dates):
+        """Descarta áreas eliminadas y fechas fuera de la ventana de pre-cómputo"""
+        area_ids = set(area_ids)
+        forecast_dates = set(forecast_dates)
+        
+        with self._lock:
+            for area_id in [area_id for area_id in self._static if area_id not in area_ids]:
+                del self._static[area_id]
+            for key in [key for key in self._scored
+                        if key[0] not in area_ids or key[1] not in forecast_dates]:
+                del self._scored[key]
+    
+    def get_stats(self):
+        """Contadores para /areas"""
+        total = self.stats['cells_scored'] + self.stats['cells_reused']
+        return {
+            **self.stats,
+            'areas_cached': len(self._static),
+            'reuse_rate': round(self.stats['cells_reused'] / total, 4) if total else None,
+            'tolerances': self.tolerances.tolist()
+        }
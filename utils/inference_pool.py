@@ -0,0 +1,94 @@
+"""
+Descarga de inferencia a un pool de procesos para grillas grandes
+
+Con workers gevent, una predicción LightGBM grande bloquea a todos los
+greenlets del worker. Las grillas que superan el umbral se puntúan en un
+proceso hijo (fork, comparte los modelos ya cargados por copy-on-write);
+las grillas pequeñas siguen en línea.
+
+Solo viajan entre procesos la matriz de features y el vector de
+probabilidades, nunca DataFrames ni listas de predicciones.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+# Predictor heredado por los procesos hijos al hacer fork
+_worker_predictor = None
+
+
+def _score_in_worker(features, regions):
+    """Se ejecuta en el proceso hijo: solo devuelve el vector de probabilidades"""
+    return _worker_predictor.score_features(features, regions)
+
+
+class InferencePool:
+    """Decide si una grilla se puntúa en línea o en el pool de procesos"""
+    
+    def __init__(self, predictor, threshold=2500, max_workers=1):
+        """
+        Args:
+            predictor: OptimizedFirePredictor ya cargado
+            threshold: Número de puntos a partir del cual se usa el pool
+            max_workers: Procesos del pool (0 desactiva la descarga)
+        """
+        self.predictor = predictor
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self._executor = None
+    
+    def _get_executor(self):
+        """Crea el pool bajo demanda (después del fork del worker de gunicorn)"""
+        global _worker_predictor
+        
+        if self._executor is None:
+            _worker_predictor = self.predictor
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('fork')
+            )
+        return self._executor
+    
+    def score_features(self, features, regions):
+        """Puntúa en línea o en el pool según el tamaño de la grilla"""
+        if self.max_workers <= 0 or len(features) < self.threshold:
+            return self.predictor.score_features(features, regions)
+        
+        try:
+            # Array unicode de ancho fijo: se serializa como un único buffer
+            future = self._get_executor().submit(
+                _score_in_worker,
+                np.ascontiguousarray(features),
+                regions.astype(str)
+            )
+            return future.result()
+        except BrokenProcessPool as e:
+            print(f"⚠️ Pool de inferencia caído, puntuando en línea: {e}")
+            self._executor = None
+            return self.predictor.score_features(features, regions)
+    
+    def warm_up(self, features, regions):
+        """Crea el pool y puntúa un lote chico en el proceso hijo (sin pasar por el umbral)"""
+        if self.max_workers <= 0:
+            return False
+        
+        self._get_executor().submit(
+            _score_in_worker,
+            np.ascontiguousarray(features),
+            regions.astype(str)
+        ).result()
+        return True
+    
+    def predict_risk_optimized(self, weather_df):
+        """Misma salida que OptimizedFirePredictor.predict_risk_optimized"""
+        features, regions = self.predictor.build_feature_matrix(weather_df)
+        probabilities = self.score_features(features, regions)
+        return self.predictor.format_predictions(features, probabilities)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,215 @@
+"""
+Snapshots locales de NDVI y cobertura terrestre (MODIS)
+
+MOD13A2 cambia cada 16 días y MCD12Q1 una vez al año, así que no tiene
+sentido filtrar, ordenar y reducir las colecciones en cada petición. Las
+capas se exportan por región configurada a archivos .npy que se abren con
+memory-mapping y se muestrean de forma vectorizada; solo los puntos fuera
+de los snapshots van a Earth Engine en vivo.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Resolución de exportación (grados por píxel) y período de refresco por capa
+SNAPSHOT_LAYERS = {
+    'ndvi': {'pixel_degrees': 0.01, 'refresh_days': 16},
+    'land_cover': {'pixel_degrees': 0.005, 'refresh_days': 365},
+}
+
+# Límite por lado para no superar el tamaño máximo de computePixels
+MAX_SNAPSHOT_PIXELS = 2048
+
+
+def parse_snapshot_regions(value):
+    """
+    Lee las regiones configuradas (JSON en línea o ruta a un archivo JSON)
+    
+    Formato: [{"name": "peru_sur", "bounds": {"lat_min": -16, "lat_max": -12,
+                                              "lon_min": -73, "lon_max": -69}}]
+    """
+    if not value:
+        return []
+    
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+class RasterSnapshotStore:
+    """Snapshots en disco (.npy + metadatos .json) abiertos con mmap"""
+    
+    def __init__(self, directory, regions):
+        """
+        Args:
+            directory: Carpeta donde se guardan los snapshots
+            regions: Lista de regiones con 'name' y 'bounds'
+        """
+        self.directory = directory
+        self.regions = regions
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        
+        os.makedirs(directory, exist_ok=True)
+        for region in regions:
+            for layer in SNAPSHOT_LAYERS:
+                self._open(region['name'], layer)
+    
+    def _paths(self, region_name, layer):
+        base = os.path.join(self.directory, f"{region_name}_{layer}")
+        return f"{base}.npy", f"{base}.json"
+    
+    def _open(self, region_name, layer):
+        array_path, meta_path = self._paths(region_name, layer)
+        if not (os.path.exists(array_path) and os.path.exists(meta_path)):
+            return
+        
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            array = np.load(array_path, mmap_mode='r')
+            with self._lock:
+                self._snapshots[(region_name, layer)] = {'array': array, 'meta': meta}
+        except Exception as e:
+            print(f"⚠️ Snapshot {region_name}/{layer} ilegible: {e}")
+    
+    def write_snapshot(self, region_name, layer, array, bounds, source=None):
+        """
+        Guarda un snapshot (fila 0 = norte) y lo reabre con mmap
+        
+        Args:
+            array: Valores float (NaN = sin datos)
+            bounds: {"lat_min", "lat_max", "lon_min", "lon_max"}
+        """
+        array_path, meta_path = self._paths(region_name, layer)
+        meta = {
+            'region': region_name,
+            'layer': layer,
+            'bounds': bounds,
+            'shape': list(array.shape),
+            'source': source,
+            'exported_at': time.time()
+        }
+        
+        # Escritura atómica: nunca se mapea un archivo a medio escribir
+        tmp_array_path = f"{array_path}.tmp.npy"
+        np.save(tmp_array_path, np.asarray(array, dtype=np.float32))
+        os.replace(tmp_array_path, array_path)
+        with open(f"{meta_path}.tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        
+        self._open(region_name, layer)
+    
+    def age_days(self, region_name, layer):
+        """Antigüedad del snapshot en días (None si no existe)"""
+        snapshot = self._snapshots.get((region_name, layer))
+        if snapshot is None:
+            return None
+        return (time.time() - snapshot['meta']['exported_at']) / 86400
+    
+    def sample(self, layer, lats, lons):
+        """
+        Muestrea la capa en todos los puntos a la vez
+        
+        Returns:
+            Array float con el valor de cada punto (NaN si ningún snapshot lo cubre)
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        values = np.full(len(lats), np.nan)
+        pending = np.ones(len(lats), dtype=bool)
+        
+        with self._lock:
+            snapshots = [s for (_, l), s in self._snapshots.items() if l == layer]
+        
+        for snapshot in snapshots:
+            bounds = snapshot['meta']['bounds']
+            inside = (pending &
+                      (lats >= bounds['lat_min']) & (lats <= bounds['lat_max']) &
+                      (lons >= bounds['lon_min']) & (lons <= bounds['lon_max']))
+            if not inside.any():
+                continue
+            
+            array = snapshot['array']
+            height, width = array.shape
+            rows = ((bounds['lat_max'] - lats[inside]) /
+                    (bounds['lat_max'] - bounds['lat_min']) * height).astype(int)
+            cols = ((lons[inside] - bounds['lon_min']) /
+                    (bounds['lon_max'] - bounds['lon_min']) * width).astype(int)
+            
+            # Lectura puntual sobre el mmap: solo se cargan las páginas necesarias
+            values[inside] = array[np.clip(rows, 0, height - 1), np.clip(cols, 0, width - 1)]
+            pending &= ~inside
+        
+        return values
+    
+    def status(self):
+        """Resumen para /health"""
+        return {
+            f"{region}/{layer}": {
+                'shape': snapshot['meta']['shape'],
+                'exported_at': datetime.utcfromtimestamp(snapshot['meta']['exported_at']).isoformat()
+            }
+            for (region, layer), snapshot in self._snapshots.items()
+        }
+
+
+class SnapshotRefresher:
+    """Re-exporta en segundo plano los snapshots vencidos"""
+    
+    def __init__(self, store, earth_engine_client, check_seconds=3600):
+        self.store = store
+        self.earth_engine_client = earth_engine_client
+        self.check_seconds = check_seconds
+        self._thread = None
+        self._stop = threading.Event()
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        
+        self._thread = threading.Thread(target=self._run, name='snapshot-refresher', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            # Exportar requiere Earth Engine listo; si no hay credenciales no se hace nada
+            if self.earth_engine_client.wait_until_ready(timeout=self.check_seconds):
+                try:
+                    self.refresh_stale()
+                except Exception as e:
+                    print(f"⚠️ Error refrescando snapshots: {e}")
+            self._stop.wait(self.check_seconds)
+    
+    def refresh_stale(self):
+        """Exporta las capas sin snapshot o más viejas que su período de refresco"""
+        refreshed = 0
+        
+        for region in self.store.regions:
+            for layer, spec in SNAPSHOT_LAYERS.items():
+                age = self.store.age_days(region['name'], layer)
+                if age is not None and age < spec['refresh_days']:
+                    continue
+                
+                bounds = region['bounds']
+                width = int(np.ceil((bounds['lon_max'] - bounds['lon_min']) / spec['pixel_degrees']))
+                height = int(np.ceil((bounds['lat_max'] - bounds['lat_min']) / spec['pixel_degrees']))
+                width = min(max(width, 1), MAX_SNAPSHOT_PIXELS)
+                height = min(max(height, 1), MAX_SNAPSHOT_PIXELS)
+                
+                print(f"🛰️ Exportando snapshot {region['name']}/{layer} ({width}x{height})")
+                array = self.earth_engine_client.export_layer_pixels(layer, bounds, width, height)
+                self.store.write_snapshot(region['name'], layer, array, bounds, source='earth_engine')
+                refreshed += 1
+        
+        return refreshed
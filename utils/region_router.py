@@ -0,0 +1,217 @@
+"""
+Ruteo por región entre shards de modelos
+
+Con MODEL_REGIONS cada despliegue deserializa solo algunos modelos
+regionales (modo shard). router_app.py se ubica delante: detecta las
+regiones de la grilla pedida con los mismos límites y prioridad que el
+predictor y manda la petición al shard que tiene esos modelos. Un bbox
+que cruza shards se reparte: el router pide el clima una sola vez, arma
+la matriz de features y manda a cada shard solo sus filas (campos
+"features" y "regions" del payload); las grillas parciales se combinan acá.
+Esos campos se aceptan solo con el secreto compartido en ROUTER_TOKEN_HEADER.
+"""
+
+import hmac
+import json
+import os
+
+import numpy as np
+
+from utils.fire_predictor import RISK_LEVELS
+from utils.tile_service import NO_DATA, tile_cell_centers
+
+# Cabecera con el secreto compartido entre router y shards (ROUTER_SHARED_SECRET)
+ROUTER_TOKEN_HEADER = 'X-Router-Token'
+
+
+def parse_region_list(value):
+    """'africa, europe' -> ('africa', 'europe'); vacío -> None (todas las regiones)"""
+    if not value:
+        return None
+    return tuple(region.strip() for region in value.split(',') if region.strip())
+
+
+def is_trusted_router(token, shared_secret):
+    """True si la petición trae el secreto del router (sin secreto configurado, nunca)"""
+    if not shared_secret or not token:
+        return False
+    return hmac.compare_digest(token.encode(), shared_secret.encode())
+
+
+def parse_shard_map(value):
+    """
+    Lee el mapa de shards (JSON en línea o ruta a un archivo JSON)
+    
+    Formato: {"http://shard-americas:5000": ["north_america", "south_america"],
+              "http://shard-resto:5000": ["africa", "europe", "asia", "oceania", "other"]}
+    
+    Returns:
+        dict: región -> URL del shard
+    """
+    if not value:
+        return {}
+    
+    if os.path.exists(value):
+        with open(value) as f:
+            shards = json.load(f)
+    else:
+        shards = json.loads(value)
+    
+    shard_by_region = {}
+    for url, regions in shards.items():
+        for region in regions:
+            if region in shard_by_region:
+                raise ValueError(f"La región '{region}' está asignada a más de un shard")
+            shard_by_region[region] = url.rstrip('/')
+    return shard_by_region
+
+
+def grid_coordinates(bbox_corners, grid_resolution):
+    """Puntos de la grilla pedida (mismo orden que Meteomatics y el fallback sintético)"""
+    lat_min = min(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
+    lat_max = max(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
+    lon_min = min(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
+    lon_max = max(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
+    
+    lat_grid, lon_grid = np.meshgrid(
+        np.linspace(lat_min, lat_max, grid_resolution),
+        np.linspace(lon_min, lon_max, grid_resolution),
+        indexing='ij'
+    )
+    return lat_grid.ravel(), lon_grid.ravel()
+
+
+def tile_coordinates(z, x, y, grid_size):
+    """Centros de celda de una tesela (mismos puntos que RiskTileService)"""
+    lat_grid, lon_grid = np.meshgrid(*tile_cell_centers(z, x, y, grid_size), indexing='ij')
+    return lat_grid.ravel(), lon_grid.ravel()
+
+
+class UnroutableRegionError(ValueError):
+    """Regiones de la grilla que no tienen shard asignado"""
+    
+    def __init__(self, regions):
+        self.regions = sorted(regions)
+        super().__init__(f"Sin shard para las regiones: {', '.join(self.regions)}")
+
+
+class RegionRouter:
+    """Asigna grillas y teselas a los shards que tienen sus modelos"""
+    
+    def __init__(self, predictor, shard_by_region):
+        """
+        Args:
+            predictor: OptimizedFirePredictor (alcanza con cargarlo sin modelos, regions=())
+            shard_by_region: Dict región -> URL del shard (ver parse_shard_map)
+        """
+        self.predictor = predictor
+        self.shard_by_region = shard_by_region
+        
+        unassigned = set(predictor.package_regions) - set(shard_by_region)
+        if unassigned:
+            print(f"⚠️ Regiones del modelo sin shard: {', '.join(sorted(unassigned))}")
+    
+    @property
+    def shards(self):
+        """URLs de todos los shards configurados"""
+        return sorted(set(self.shard_by_region.values()))
+    
+    def route_points(self, lats, lons):
+        """
+        Agrupa puntos por shard
+        
+        El shard de la región del centro del bbox va primero; el resto de las
+        regiones se agrega en orden alfabético.
+        
+        Returns:
+            dict: URL del shard -> lista de regiones que tiene que puntuar
+        """
+        regions = self.predictor.model_regions(lats, lons)
+        
+        unroutable = set(regions) - set(self.shard_by_region)
+        if unroutable:
+            raise UnroutableRegionError(unroutable)
+        
+        center = np.argmin((lats - lats.mean()) ** 2 + (lons - lons.mean()) ** 2)
+        ordered = [regions[center]] + sorted(set(regions) - {regions[center]})
+        
+        route = {}
+        for region in ordered:
+            route.setdefault(self.shard_by_region[region], []).append(region)
+        return route
+    
+    def route_bbox(self, bbox_corners, grid_resolution):
+        return self.route_points(*grid_coordinates(bbox_corners, grid_resolution))
+    
+    def route_tile(self, z, x, y, grid_size):
+        return self.route_points(*tile_coordinates(z, x, y, grid_size))
+
+
+def parse_ndjson_grid(lines):
+    """
+    Lee una respuesta NDJSON de /predict-fire-risk
+    
+    Returns:
+        tuple: (resumen, lats, lons, probabilidades, códigos de categoría, dict índice -> terreno)
+    """
+    lines = iter(lines)
+    summary = json.loads(next(lines))
+    
+    lats, lons, probabilities, codes, terrain = [], [], [], [], {}
+    for index, line in enumerate(line for line in lines if line.strip()):
+        row = json.loads(line)
+        lats.append(row['lat'])
+        lons.append(row['lon'])
+        probabilities.append(row['fire_risk_percentage'])
+        # La categoría viene de la probabilidad sin redondear: no se recalcula
+        codes.append(RISK_LEVELS.index(row['risk_category']))
+        if 'terrain' in row:
+            terrain[index] = {'terrain': row['terrain'], 'vegetation': row['vegetation']}
+    
+    return summary, np.array(lats, dtype=float), np.array(lons, dtype=float), \
+        np.array(probabilities, dtype=float), np.array(codes, dtype=np.int8), terrain
+
+
+def merge_shard_grids(parts, indices):
+    """
+    Combina las grillas parciales de cada shard en una sola
+    
+    Cada shard devuelve sus puntos en el orden en que el router se los
+    mandó, así que cada parte vuelve a las posiciones que ocupaba en la
+    grilla original; los índices de terreno se trasladan al resultado.
+    
+    Args:
+        parts: Lista de (lats, lons, probabilidades, códigos, terreno) como parse_ndjson_grid
+        indices: Posiciones en la grilla original de las filas enviadas a cada shard
+    
+    Returns:
+        tuple: (features (n, 2) con lat y lon, probabilidades, códigos, dict índice -> terreno)
+    """
+    n_points = sum(len(index) for index in indices)
+    lats = np.empty(n_points, dtype=float)
+    lons = np.empty(n_points, dtype=float)
+    probabilities = np.empty(n_points, dtype=float)
+    codes = np.empty(n_points, dtype=np.int8)
+    terrain = {}
+    
+    for part, index in zip(parts, indices):
+        if len(part[0]) != len(index):
+            raise ValueError(f"Un shard devolvió {len(part[0])} puntos de {len(index)} enviados")
+        
+        lats[index] = part[0]
+        lons[index] = part[1]
+        probabilities[index] = part[2]
+        codes[index] = part[3]
+        for row, info in part[4].items():
+            terrain[int(index[row])] = info
+    
+    return np.column_stack([lats, lons]), probabilities, codes, terrain
+
+
+def merge_tile_grids(grids):
+    """Superpone teselas parciales: cada shard solo completa las celdas de sus regiones"""
+    merged = np.full_like(grids[0], NO_DATA)
+    for grid in grids:
+        merged = np.where(merged == NO_DATA, grid, merged)
+    return merged
+
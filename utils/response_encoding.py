@@ -0,0 +1,198 @@
+"""
+Capa de codificación de respuestas
+
+- JSON rápido con orjson (serializa floats/arrays de NumPy sin conversión)
+- Compresión br/gzip negociada con Accept-Encoding (incremental en respuestas NDJSON en streaming)
+
+orjson y brotli son opcionales: sin ellos se usa el JSON estándar de Flask
+y solo gzip.
+"""
+
+import gzip
+import zlib
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Tipos que vale la pena comprimir (PNG y binarios ya vienen compactos)
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    NDJSON_MIMETYPE,
+    'text/plain',
+    'text/html'
+}
+
+
+if orjson is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """JSON provider de Flask basado en orjson"""
+        
+        def _options(self):
+            # Fechas por default(): mismo formato RFC 822 que el provider estándar de Flask
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return option
+        
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+        
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            body = orjson.dumps(obj, default=self.default, option=self._options())
+            return self._app.response_class(body, mimetype=self.mimetype)
+else:
+    OrjsonProvider = None
+
+
+def dumps_json(obj):
+    """Serializa a bytes con orjson si está disponible (para respuestas fuera de Flask)"""
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=DefaultJSONProvider.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+    
+    import json
+    return json.dumps(obj, default=DefaultJSONProvider.default).encode()
+
+
+def negotiate_encoding(accept_encoding):
+    """Elige 'br', 'gzip' o None según Accept-Encoding y lo disponible"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        parts = item.strip().split(';')
+        name = parts[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    candidates = [c for c in candidates if accepted.get(c, accepted.get('*', 0)) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: accepted.get(c, accepted.get('*', 0)))
+
+
+def best_mimetype(accept_header, offered):
+    """
+    Tipo de offered que prefiere el cliente según Accept (calidad q y especificidad)
+    
+    Es la negociación de request.accept_mimetypes de Flask, a partir del
+    header crudo para que la use también asgi_app.py. Ante un empate gana
+    el primero de offered.
+    
+    Returns:
+        str o None (sin Accept o si ninguno es aceptable)
+    """
+    if not accept_header:
+        return None
+    return parse_accept_header(accept_header, MIMEAccept).best_match(offered)
+
+
+def wants_ndjson(accept_header):
+    """True si Accept prefiere NDJSON (respuesta en streaming) a JSON"""
+    return best_mimetype(accept_header, ['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def compress_body(body, encoding, level=6):
+    if encoding == 'br':
+        # Calidad media: buena relación tamaño/CPU para respuestas dinámicas
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=level)
+
+
+def compress_stream(chunks, encoding, level=6):
+    """Comprime un iterable de bytes a medida que se generan (flush por chunk)"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(level, 11))
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    
+    # wbits=31: formato gzip
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def install_response_encoding(app, min_size=1024, compress_level=6):
+    """
+    Configura la app Flask: JSON con orjson y compresión negociada
+    
+    Args:
+        min_size: Bytes mínimos para comprimir una respuesta
+        compress_level: Nivel gzip (y calidad brotli)
+    """
+    if OrjsonProvider is not None:
+        app.json_provider_class = OrjsonProvider
+        app.json = OrjsonProvider(app)
+    
+    @app.after_request
+    def compress_response(response):
+        if response.is_streamed and response.mimetype == NDJSON_MIMETYPE:
+            return compress_streamed_response(response)
+        
+        if (response.direct_passthrough or response.is_streamed or
+                response.status_code < 200 or response.status_code >= 300 or
+                'Content-Encoding' in response.headers or
+                response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+        
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        
+        response.set_data(compress_body(body, encoding, compress_level))
+        response.headers['Content-Encoding'] = encoding
+        return response
+    
+    def compress_streamed_response(response):
+        """NDJSON en streaming: se comprime chunk por chunk, sin juntar el cuerpo"""
+        if 'Content-Encoding' in response.headers:
+            return response
+        
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+        
+        response.response = compress_stream(response.response, encoding, compress_level)
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        return response
+    
+    return app
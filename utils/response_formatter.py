@@ -1,96 +1,292 @@
 import numpy as np
 import random
 
+from utils.earth_engine_api import earth_engine_client
+from utils.binary_formats import build_grid_columns, encode_grid
+from utils.response_encoding import dumps_json
+from utils.fire_predictor import FEATURE_COLUMNS, RISK_LEVELS, risk_level_codes
+from utils.risk_statistics import compute_grid_statistics
+from utils.bbox_validation import BBOX_OK, BBOX_ERROR_MESSAGES, validate_bboxes, corners_to_bbox
 
-def sample_random_predictions(predictions, num_samples=4):
+
+def _get_terrain_infos(predictions):
+    """Datos de terreno de cada predicción (snapshots locales primero, Earth Engine en vivo si no)"""
+    return earth_engine_client.get_complete_terrain_info_batch(
+        [pred['latitude'] for pred in predictions],
+        [pred['longitude'] for pred in predictions]
+    )
+
+
+def build_risk_grid(predictions, terrain_infos, grid_format='rows'):
     """
-    Selecciona aleatoriamente N puntos de las predicciones
+    Construye risk_grid en una sola pasada, sin copias intermedias
     
     Args:
-        predictions: Lista completa de predicciones (25 puntos)
-        num_samples: Número de puntos a muestrear (default: 4)
+        predictions: Predicciones muestreadas
+        terrain_infos: Datos de terreno de cada predicción (mismo orden)
+        grid_format: 'rows' (una entrada por celda) o 'columnar' (arrays paralelos)
         
     Returns:
-        Lista con predicciones muestreadas
+        list (rows) o dict de listas (columnar)
     """
-    if len(predictions) <= num_samples:
-        return predictions
+    if grid_format == 'columnar':
+        return {
+            "lat": [pred['latitude'] for pred in predictions],
+            "lon": [pred['longitude'] for pred in predictions],
+            "fire_risk_percentage": [pred['fire_probability'] for pred in predictions],
+            "risk_category": [pred['risk_level'] for pred in predictions],
+            "terrain": {
+                "elevation": [info['terrain']['elevation'] for info in terrain_infos],
+                "slope": [info['terrain']['slope'] for info in terrain_infos],
+                "land_cover": [info['terrain']['land_cover'] for info in terrain_infos]
+            },
+            "vegetation": {
+                "density": [info['vegetation']['density'] for info in terrain_infos]
+            }
+        }
+    
+    return [
+        {
+            "lat": pred['latitude'],
+            "lon": pred['longitude'],
+            "fire_risk_percentage": pred['fire_probability'],
+            "risk_category": pred['risk_level'],
+            "terrain": info['terrain'],
+            "vegetation": info['vegetation']
+        }
+        for pred, info in zip(predictions, terrain_infos)
+    ]
+
+
+EMPTY_RESPONSE = {
+    "error": "No se pudieron generar predicciones",
+    "fire_risk_assessment": {
+        "overall_risk_level": "UNKNOWN",
+        "alert_level": 0,
+        "statistics": {
+            "average_risk_percentage": 0,
+            "maximum_risk_percentage": 0
+        }
+    }
+}
+
+
+def _sample_indices(total, num_samples):
+    """Índices de num_samples puntos al azar, sin reemplazo (todos si no alcanzan)"""
+    if total <= num_samples:
+        return list(range(total))
     
-    # Muestreo aleatorio sin reemplazo
-    sampled = random.sample(predictions, num_samples)
+    print(f"📊 Muestreando {num_samples} puntos de {total} disponibles")
     
-    print(f"📊 Muestreando {num_samples} puntos de {len(predictions)} disponibles")
+    return random.sample(range(total), num_samples)
+
+
+def _sample_known_indices(terrain, num_samples):
+    """Muestreo entre los puntos que ya traen terreno (respuestas de shards combinadas)"""
+    indices = sorted(terrain)
+    if len(indices) <= num_samples:
+        return indices
+    return random.sample(indices, num_samples)
+
+
+def _build_api_response(sampled_predictions, fire_probs, lats, lons, codes, grid_format,
+                        terrain_infos=None):
+    """Arma la respuesta JSON: estadísticas de toda la grilla + risk_grid enriquecido"""
+    if terrain_infos is None:
+        terrain_infos = _get_terrain_infos(sampled_predictions)
+    fire_risk_assessment, recommendations = summarize_risk(fire_probs, lats, lons, codes)
     
-    return sampled
+    return {
+        "fire_risk_assessment": fire_risk_assessment,
+        "risk_grid": build_risk_grid(sampled_predictions, terrain_infos, grid_format),
+        "recommendations": recommendations
+    }
 
 
-def enrich_predictions_with_terrain(predictions):
+def create_grid_api_response(features, probabilities, forecast_date, bbox_corners, num_samples=4,
+                             grid_format='rows', terrain=None, codes=None):
     """
-    Enriquece predicciones con datos de Earth Engine
+    Crea la respuesta JSON a partir de los arrays del predictor
+    
+    Solo se arman dicts para los puntos muestreados; las estadísticas se
+    calculan sobre los arrays de toda la grilla, así que sirve para grillas
+    finas sin pasar por format_predictions.
     
     Args:
-        predictions: Lista de predicciones básicas
+        features: Matriz de features del predictor (lat, lon en columnas 0 y 1)
+        probabilities: Probabilidades (0-100) de cada punto
+        forecast_date: Fecha de predicción
+        bbox_corners: Coordenadas del área analizada
+        num_samples: Número de puntos a devolver (default: 4)
+        grid_format: Formato de risk_grid, 'rows' o 'columnar'
+        terrain: Dict índice -> terreno ya resuelto; se muestrea entre esos
+            puntos sin consultar Earth Engine (router de shards)
+        codes: Categorías ya calculadas (las probabilidades llegaron redondeadas)
         
     Returns:
-        Lista de predicciones con datos de terreno y vegetación
+        dict: Respuesta JSON estructurada
     """
-    from utils.earth_engine_api import earth_engine_client
+    if len(probabilities) == 0:
+        return EMPTY_RESPONSE
     
-    enriched = []
+    fire_probs = np.round(probabilities, 2)
+    codes = risk_level_codes(probabilities) if codes is None else codes
     
-    for pred in predictions:
-        lat = pred['latitude']
-        lon = pred['longitude']
-        
-        # Obtener datos completos de Earth Engine
-        terrain_info = earth_engine_client.get_complete_terrain_info(lat, lon)
-        
-        # Agregar a predicción existente
-        enriched_pred = pred.copy()
-        enriched_pred['terrain'] = terrain_info['terrain']
-        enriched_pred['vegetation'] = terrain_info['vegetation']
+    if terrain is None:
+        indices = _sample_indices(len(fire_probs), num_samples)
+        terrain_infos = None
+    else:
+        indices = _sample_known_indices(terrain, num_samples)
+        terrain_infos = [terrain[i] for i in indices]
+    
+    sampled_predictions = [
+        {
+            'latitude': features[i, 0],
+            'longitude': features[i, 1],
+            'fire_probability': fire_probs[i],
+            'risk_level': RISK_LEVELS[codes[i]]
+        }
+        for i in indices
+    ]
+    
+    return _build_api_response(sampled_predictions, fire_probs, features[:, 0], features[:, 1],
+                               codes, grid_format, terrain_infos)
+
+
+def create_binary_api_response(features, probabilities, binary_format, num_samples=4, terrain=None,
+                               codes=None):
+    """
+    Respuesta binaria (Arrow/MessagePack) con la grilla completa en columnas
+    
+    Args:
+        features: Matriz de features del predictor (lat, lon en columnas 0 y 1)
+        probabilities: Probabilidades (0-100) de cada punto
+        binary_format: 'arrow', 'arrow_file' o 'msgpack'
+        num_samples: Puntos enriquecidos con Earth Engine
+        terrain: Dict índice -> terreno ya resuelto (ver create_grid_api_response)
+        codes: Categorías ya calculadas (ver create_grid_api_response)
         
-        enriched.append(enriched_pred)
+    Returns:
+        tuple: (bytes, mimetype)
+    """
+    fire_probs = np.round(probabilities, 2)
+    codes = risk_level_codes(probabilities) if codes is None else codes
     
-    return enriched
+    # Mismo muestreo que la respuesta JSON, pero sobre índices
+    if terrain is None:
+        enriched_indices = sorted(_sample_indices(len(fire_probs), num_samples))
+        terrain_infos = earth_engine_client.get_complete_terrain_info_batch(
+            features[enriched_indices, 0],
+            features[enriched_indices, 1]
+        )
+    else:
+        enriched_indices = sorted(_sample_known_indices(terrain, num_samples))
+        terrain_infos = [terrain[i] for i in enriched_indices]
+    
+    fire_risk_assessment, recommendations = summarize_risk(
+        fire_probs, features[:, 0], features[:, 1], codes
+    )
+    columns = build_grid_columns(features, fire_probs, enriched_indices, terrain_infos, codes)
+    
+    return encode_grid(binary_format, columns, {
+        "fire_risk_assessment": fire_risk_assessment,
+        "recommendations": recommendations
+    })
 
 
-def create_optimized_api_response(predictions, forecast_date, bbox_corners, num_samples=4):
+def iter_ndjson_response(features, probabilities, forecast_date, num_samples=4, chunk_rows=1000,
+                         terrain=None, codes=None):
     """
-    Crea respuesta JSON optimizada según el formato especificado
+    Respuesta NDJSON en streaming para grillas grandes
+    
+    Primera línea: resumen (fire_risk_assessment y recommendations de toda
+    la grilla). Después una línea por celda, en el formato de las filas de
+    risk_grid; solo los num_samples puntos muestreados traen terrain y
+    vegetation. Las filas se serializan y enriquecen de a chunk_rows, así
+    la memoria por petición no crece con la grilla.
     
     Args:
-        predictions: Lista de predicciones
+        features: Matriz de features del predictor (lat, lon en columnas 0 y 1)
+        probabilities: Probabilidades (0-100) de cada punto
         forecast_date: Fecha de predicción
-        bbox_corners: Coordenadas del área analizada
-        num_samples: Número de puntos a devolver (default: 4)
+        num_samples: Puntos enriquecidos con Earth Engine
+        chunk_rows: Filas por chunk
+        terrain: Dict índice -> terreno ya resuelto (ver create_grid_api_response)
+        codes: Categorías ya calculadas (ver create_grid_api_response)
         
-    Returns:
-        dict: Respuesta JSON estructurada
+    Yields:
+        bytes: Una o más líneas NDJSON
     """
-    if not predictions:
-        return {
-            "error": "No se pudieron generar predicciones",
-            "fire_risk_assessment": {
-                "overall_risk_level": "UNKNOWN",
-                "alert_level": 0,
-                "statistics": {
-                    "average_risk_percentage": 0,
-                    "maximum_risk_percentage": 0
-                }
-            }
-        }
+    lats = features[:, 0]
+    lons = features[:, 1]
+    fire_probs = np.round(probabilities, 2)
+    codes = risk_level_codes(probabilities) if codes is None else codes
+    
+    fire_risk_assessment, recommendations = summarize_risk(fire_probs, lats, lons, codes)
+    yield dumps_json({
+        "type": "summary",
+        "forecast_date": forecast_date,
+        "total_points": len(fire_probs),
+        "fire_risk_assessment": fire_risk_assessment,
+        "recommendations": recommendations
+    }) + b'\n'
+    
+    enriched = np.zeros(len(fire_probs), dtype=bool)
+    if terrain is None:
+        enriched[_sample_indices(len(fire_probs), num_samples)] = True
+    else:
+        enriched[_sample_known_indices(terrain, num_samples)] = True
     
-    # 1. Muestrear puntos aleatorios (de 25 a 4)
-    sampled_predictions = sample_random_predictions(predictions, num_samples)
+    for start in range(0, len(fire_probs), chunk_rows):
+        stop = start + chunk_rows
+        
+        # Earth Engine solo para los puntos muestreados de este chunk
+        enriched_indices = np.flatnonzero(enriched[start:stop])
+        if terrain is not None:
+            terrain_infos = {offset: terrain[start + offset] for offset in enriched_indices.tolist()}
+        else:
+            terrain_infos = dict(zip(
+                enriched_indices.tolist(),
+                earth_engine_client.get_complete_terrain_info_batch(
+                    lats[start:stop][enriched_indices],
+                    lons[start:stop][enriched_indices]
+                ) if len(enriched_indices) else []
+            ))
+        
+        lines = []
+        rows = zip(lats[start:stop].tolist(), lons[start:stop].tolist(),
+                   fire_probs[start:stop].tolist(), codes[start:stop].tolist())
+        for offset, (lat, lon, fire_prob, code) in enumerate(rows):
+            row = {
+                "lat": lat,
+                "lon": lon,
+                "fire_risk_percentage": fire_prob,
+                "risk_category": RISK_LEVELS[code]
+            }
+            info = terrain_infos.get(offset)
+            if info is not None:
+                row["terrain"] = info['terrain']
+                row["vegetation"] = info['vegetation']
+            lines.append(dumps_json(row))
+        
+        yield b'\n'.join(lines) + b'\n'
+
+
+def summarize_risk(fire_probs, lats, lons, codes=None):
+    """
+    Evaluación general y recomendaciones a partir de las probabilidades de toda la grilla
     
-    # 2. Enriquecer con datos de Earth Engine
-    enriched_predictions = enrich_predictions_with_terrain(sampled_predictions)
+    Args:
+        fire_probs: Array con la probabilidad (0-100) de cada punto
+        lats, lons: Coordenadas de cada punto
+        codes: Códigos de categoría de cada punto (ver risk_level_codes)
+        
+    Returns:
+        tuple: (fire_risk_assessment, recommendations)
+    """
+    statistics = compute_grid_statistics(lats, lons, fire_probs, codes)
     
-    # Calcular estadísticas (sobre todos los puntos originales)
-    fire_probs = [p['fire_probability'] for p in predictions]
     avg_prob = np.mean(fire_probs)
-    max_prob = np.max(fire_probs)
     
     # Determinar nivel general de riesgo
     if avg_prob > 70:
@@ -103,18 +299,6 @@ def create_optimized_api_response(predictions, forecast_date, bbox_corners, num_
         overall_level = 'LOW'
         alert_level = 1
     
-    # Construir risk_grid con datos enriquecidos
-    risk_grid = []
-    for pred in enriched_predictions:
-        risk_grid.append({
-            "lat": pred['latitude'],
-            "lon": pred['longitude'],
-            "fire_risk_percentage": pred['fire_probability'],
-            "risk_category": pred['risk_level'],
-            "terrain": pred['terrain'],
-            "vegetation": pred['vegetation']
-        })
-    
     # Generar recomendaciones
     if overall_level == 'HIGH':
         primary_action = "ALERTA_MAXIMA"
@@ -126,30 +310,25 @@ def create_optimized_api_response(predictions, forecast_date, bbox_corners, num_
         primary_action = "MONITOREO_RUTINARIO"
         alert_authorities = False
     
-    # Construir respuesta final
-    response = {
-        "fire_risk_assessment": {
-            "overall_risk_level": overall_level,
-            "alert_level": alert_level,
-            "statistics": {
-                "average_risk_percentage": round(avg_prob, 1),
-                "maximum_risk_percentage": round(max_prob, 1)
-            }
-        },
-        "risk_grid": risk_grid,
-        "recommendations": {
-            "primary_action": primary_action,
-            "alert_authorities": alert_authorities
-        }
+    fire_risk_assessment = {
+        "overall_risk_level": overall_level,
+        "alert_level": alert_level,
+        "statistics": statistics
+    }
+    recommendations = {
+        "primary_action": primary_action,
+        "alert_authorities": alert_authorities
     }
     
-    return response
+    return fire_risk_assessment, recommendations
 
 
 def validate_bbox_coordinates(bbox_corners):
     """
     Valida las coordenadas del bbox y auto-detecta el formato [lon, lat] vs [lat, lon]
     
+    Wrapper de un solo bbox sobre utils.bbox_validation.validate_bboxes.
+    
     Args:
         bbox_corners: dict con top_left y bottom_right
         
@@ -157,55 +336,158 @@ def validate_bbox_coordinates(bbox_corners):
         tuple: (is_valid, error_message, normalized_bbox)
         normalized_bbox estará en formato [lat, lon]
     """
-    try:
-        if not bbox_corners or not isinstance(bbox_corners, dict):
-            return False, "bbox_corners debe ser un diccionario", None
-        
-        if 'top_left' not in bbox_corners or 'bottom_right' not in bbox_corners:
-            return False, "bbox_corners debe contener 'top_left' y 'bottom_right'", None
-        
-        top_left = bbox_corners['top_left']
-        bottom_right = bbox_corners['bottom_right']
-        
-        if not isinstance(top_left, list) or len(top_left) != 2:
-            return False, "top_left debe ser una lista [lat, lon] o [lon, lat]", None
-        
-        if not isinstance(bottom_right, list) or len(bottom_right) != 2:
-            return False, "bottom_right debe ser una lista [lat, lon] o [lon, lat]", None
-        
-        # Auto-detectar formato: Si el primer valor está fuera del rango de latitud,
-        # asumimos que el formato es [lon, lat] (como Cesium)
-        coord1_0, coord1_1 = top_left
-        coord2_0, coord2_1 = bottom_right
-        
-        # Verificar si parece formato [lon, lat] (Cesium/GeoJSON)
-        if abs(coord1_0) > 90 or abs(coord2_0) > 90:
-            # Formato [lon, lat] detectado, invertir a [lat, lon]
-            print(f"🔄 Formato [lon, lat] detectado, convirtiendo a [lat, lon]...")
-            normalized_bbox = {
-                'top_left': [coord1_1, coord1_0],      # [lat, lon]
-                'bottom_right': [coord2_1, coord2_0]   # [lat, lon]
-            }
-        else:
-            # Formato [lat, lon] ya correcto
-            normalized_bbox = bbox_corners
-        
-        # Validar rangos con formato normalizado [lat, lon]
-        norm_tl = normalized_bbox['top_left']
-        norm_br = normalized_bbox['bottom_right']
+    codes, normalized, _ = validate_bboxes([bbox_corners])
+    
+    if codes[0] != BBOX_OK:
+        return False, BBOX_ERROR_MESSAGES[codes[0]], None
+    
+    return True, None, corners_to_bbox(normalized[0])
+
+
+def build_bbox_batch_response(bboxes):
+    """
+    Respuesta de /validate-coordinates/batch (arrays paralelos, uno por bbox)
+    
+    Args:
+        bboxes: Lista de bbox_corners {top_left, bottom_right}
         
-        # Validar latitudes (índice 0)
-        if not (-90 <= norm_tl[0] <= 90) or not (-90 <= norm_br[0] <= 90):
-            return False, "Latitud debe estar entre -90 y 90", None
+    Returns:
+        dict: valid, error_codes, errors, axis_swapped y bbox_corners normalizados
+    """
+    codes, normalized, swapped = validate_bboxes(bboxes)
+    valid = codes == BBOX_OK
+    
+    return {
+        "total": len(bboxes),
+        "valid_count": int(valid.sum()),
+        "valid": valid.tolist(),
+        "error_codes": codes.tolist(),
+        "errors": [BBOX_ERROR_MESSAGES.get(code) for code in codes.tolist()],
+        "axis_swapped": swapped.tolist(),
+        "bbox_corners": [
+            corners_to_bbox(corners) if ok else None
+            for corners, ok in zip(normalized, valid)
+        ]
+    }
+
+
+def validate_grid_resolution(grid_resolution, max_resolution=50):
+    """
+    Valida la resolución de grilla solicitada (puntos por lado)
+    
+    Args:
+        grid_resolution: Valor recibido en la petición (None usa el default 5)
+        max_resolution: Máximo permitido por lado
         
-        # Validar longitudes (índice 1)
-        if not (-180 <= norm_tl[1] <= 180) or not (-180 <= norm_br[1] <= 180):
-            return False, "Longitud debe estar entre -180 y 180", None
+    Returns:
+        tuple: (is_valid, error_message, grid_resolution)
+    """
+    if grid_resolution is None:
+        return True, None, 5
+    
+    if isinstance(grid_resolution, bool) or not isinstance(grid_resolution, int):
+        return False, "grid_resolution debe ser un entero", None
+    
+    if not (2 <= grid_resolution <= max_resolution):
+        return False, f"grid_resolution debe estar entre 2 y {max_resolution}", None
+    
+    return True, None, grid_resolution
+
+
+def validate_response_options(data, max_samples=500):
+    """
+    Valida las opciones de formato de la respuesta de predicción
+    
+    Args:
+        data: JSON de la petición ("num_samples", "grid_format", opcionales)
+        max_samples: Máximo de puntos enriquecidos en risk_grid
         
-        return True, None, normalized_bbox
+    Returns:
+        tuple: (is_valid, error_message, num_samples, grid_format)
+    """
+    num_samples = data.get('num_samples', 4)
+    if isinstance(num_samples, bool) or not isinstance(num_samples, int):
+        return False, "num_samples debe ser un entero", None, None
+    
+    if not (1 <= num_samples <= max_samples):
+        return False, f"num_samples debe estar entre 1 y {max_samples}", None, None
+    
+    grid_format = data.get('grid_format', 'rows')
+    if grid_format not in ('rows', 'columnar'):
+        return False, "grid_format debe ser 'rows' o 'columnar'", None, None
+    
+    return True, None, num_samples, grid_format
+
+
+def validate_region_filter(regions, known_regions):
+    """
+    Valida el campo opcional "regions" (el router reparte un bbox entre shards)
+    
+    Args:
+        regions: Lista de nombres de modelo regional o None
+        known_regions: Regiones del paquete de modelos
         
-    except Exception as e:
-        return False, f"Error validando coordenadas: {str(e)}", None
+    Returns:
+        tuple: (is_valid, error_message, regions)
+    """
+    if regions is None:
+        return True, None, None
+    
+    if not isinstance(regions, list) or not all(isinstance(region, str) for region in regions):
+        return False, "regions debe ser una lista de nombres de región", None
+    
+    unknown = sorted(set(regions) - set(known_regions))
+    if unknown:
+        return False, f"Regiones desconocidas: {', '.join(unknown)}", None
+    
+    return True, None, regions
+
+
+# Margen (grados) para el redondeo de las coordenadas que devuelve Meteomatics
+FEATURE_BBOX_TOLERANCE = 1e-6
+
+
+def validate_feature_rows(rows, max_points, bbox_corners):
+    """
+    Valida el campo opcional "features" (filas que el router ya armó con el clima)
+    
+    Args:
+        rows: Lista de filas [lat, lon, ...] en el orden de FEATURE_COLUMNS o None
+        max_points: Máximo de filas (puntos de la grilla pedida)
+        bbox_corners: Bbox normalizado [lat, lon]; cada fila tiene que caer adentro
         
-    except Exception as e:
-        return False, f"Error validando coordenadas: {str(e)}"
+    Returns:
+        tuple: (is_valid, error_message, features ndarray (n, 7) o None)
+    """
+    if rows is None:
+        return True, None, None
+    
+    error_message = f"features debe ser una lista de filas numéricas de {len(FEATURE_COLUMNS)} columnas"
+    if not isinstance(rows, list):
+        return False, error_message, None
+    
+    if len(rows) > max_points:
+        return False, f"features no puede tener más de {max_points} filas", None
+    
+    try:
+        features = np.array(rows, dtype=float).reshape(len(rows), -1)
+    except (TypeError, ValueError):
+        return False, error_message, None
+    
+    if features.shape[1:] != (len(FEATURE_COLUMNS),):
+        return False, error_message, None
+    
+    lat_min = min(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
+    lat_max = max(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
+    lon_min = min(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
+    lon_max = max(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
+    
+    # Comparación por "adentro": una coordenada NaN también queda fuera
+    outside = ~((features[:, 0] >= lat_min - FEATURE_BBOX_TOLERANCE) &
+                (features[:, 0] <= lat_max + FEATURE_BBOX_TOLERANCE) &
+                (features[:, 1] >= lon_min - FEATURE_BBOX_TOLERANCE) &
+                (features[:, 1] <= lon_max + FEATURE_BBOX_TOLERANCE))
+    if outside.any():
+        return False, f"features tiene {int(outside.sum())} filas fuera de bbox_corners", None
+    
+    return True, None, features
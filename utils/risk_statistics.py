@@ -0,0 +1,107 @@
+"""
+Estadísticas de la grilla completa calculadas sobre arrays
+
+Todo sale de operaciones vectorizadas de NumPy sobre los arrays del
+predictor, sin armar un dict por celda: una sola partición da mínimo,
+máximo y percentiles, np.bincount da conteo y área por categoría con los
+códigos ya calculados, y el promedio y el desvío reutilizan la misma
+media. No es una única pasada: cada reducción recorre el array, pero son
+unas pocas y ninguna en Python.
+"""
+
+import numpy as np
+
+from utils.fire_predictor import RISK_LEVELS, risk_level_codes
+
+# Kilómetros por grado de latitud
+KM_PER_DEGREE = 111.32
+
+PERCENTILES = (50, 75, 90, 95, 99)
+
+
+def _cell_areas_km2(lats, lons):
+    """
+    Área (km²) representada por cada punto de una grilla regular lat/lon
+    
+    El bbox se reparte en partes iguales entre los puntos de cada eje, así
+    el área total no depende de grid_resolution.
+    """
+    unique_lats = np.unique(lats)
+    unique_lons = np.unique(lons)
+    
+    lat_step = np.ptp(unique_lats) / len(unique_lats)
+    lon_step = np.ptp(unique_lons) / len(unique_lons)
+    
+    # Un grado de longitud se achica con el coseno de la latitud
+    return (lat_step * KM_PER_DEGREE) * (lon_step * KM_PER_DEGREE * np.cos(np.radians(lats)))
+
+
+def _hotspot_centroid(lats, lons, probabilities, codes):
+    """
+    Centroide ponderado por probabilidad de las celdas HIGH
+    (o del decil superior si no hay celdas HIGH)
+    """
+    hotspot = codes == RISK_LEVELS.index('HIGH')
+    basis = 'HIGH'
+    
+    if not hotspot.any():
+        hotspot = probabilities >= np.percentile(probabilities, 90)
+        basis = 'p90'
+    
+    weights = probabilities[hotspot]
+    if weights.sum() <= 0:
+        weights = np.ones_like(weights)
+    
+    return {
+        "lat": round(float(np.average(lats[hotspot], weights=weights)), 6),
+        "lon": round(float(np.average(lons[hotspot], weights=weights)), 6),
+        "basis": basis,
+        "cells": int(hotspot.sum())
+    }
+
+
+def compute_grid_statistics(lats, lons, probabilities, codes=None):
+    """
+    Estadísticas de toda la grilla
+    
+    Args:
+        lats, lons: Coordenadas de cada punto
+        probabilities: Probabilidad (0-100) de cada punto
+        codes: Códigos de categoría (default: derivados de probabilities)
+        
+    Returns:
+        dict con average/maximum (mismo formato de siempre), percentiles,
+        categorías (conteo y área) y hotspot_centroid
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    codes = risk_level_codes(probabilities) if codes is None else np.asarray(codes)
+    
+    # Mínimo y máximo son los percentiles 0 y 100: salen de la misma partición
+    minimum, *percentile_values, maximum = np.percentile(probabilities, (0, *PERCENTILES, 100))
+    mean = probabilities.mean()
+    std = np.sqrt(np.mean((probabilities - mean) ** 2))
+    cell_areas = _cell_areas_km2(lats, lons)
+    counts = np.bincount(codes, minlength=len(RISK_LEVELS))
+    areas = np.bincount(codes, weights=cell_areas, minlength=len(RISK_LEVELS))
+    
+    return {
+        "average_risk_percentage": round(float(mean), 1),
+        "maximum_risk_percentage": round(float(maximum), 1),
+        "minimum_risk_percentage": round(float(minimum), 1),
+        "std_risk_percentage": round(float(std), 1),
+        "percentiles": {
+            f"p{p}": round(float(value), 1) for p, value in zip(PERCENTILES, percentile_values)
+        },
+        "categories": {
+            level: {
+                "count": int(counts[i]),
+                "area_km2": round(float(areas[i]), 2)
+            }
+            for i, level in enumerate(RISK_LEVELS)
+        },
+        "total_points": int(len(probabilities)),
+        "total_area_km2": round(float(cell_areas.sum()), 2),
+        "hotspot_centroid": _hotspot_centroid(lats, lons, probabilities, codes)
+    }
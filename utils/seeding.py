@@ -0,0 +1,64 @@
+"""
+Generadores aleatorios deterministas para los fallbacks sintéticos
+
+La semilla se deriva de los datos de la petición (bbox, grilla, fecha,
+coordenadas), así peticiones idénticas producen exactamente la misma salida
+en cualquier proceso (a diferencia de hash(), que cambia entre procesos).
+"""
+
+import hashlib
+
+import numpy as np
+
+
+def seeded_rng(*key_parts):
+    """
+    Crea un numpy Generator con semilla estable a partir de key_parts
+    
+    Args:
+        key_parts: Valores escalares, strings o arrays (se redondean a 6 decimales)
+        
+    Returns:
+        np.random.Generator
+    """
+    digest = hashlib.sha256()
+    
+    for part in key_parts:
+        if isinstance(part, np.ndarray):
+            digest.update(np.round(part.astype(float), 6).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'|')
+    
+    return np.random.default_rng(int.from_bytes(digest.digest()[:8], 'little'))
+
+
+def _salt_to_uint64(salt):
+    return np.uint64(int.from_bytes(hashlib.sha256(salt.encode()).digest()[:8], 'little'))
+
+
+def coordinate_uniform(lats, lons, salt, low=0.0, high=1.0):
+    """
+    Valor uniforme determinista por punto, derivado solo de sus coordenadas
+    
+    Hash splitmix64 vectorizado: el valor de un punto no depende del resto
+    del lote, así el mismo lugar recibe siempre el mismo terreno simulado.
+    
+    Args:
+        lats, lons: Arrays de coordenadas (se cuantizan a 1e-6 grados)
+        salt: String que separa los distintos usos (elevación, pendiente, ...)
+        
+    Returns:
+        Array float en [low, high)
+    """
+    lat_q = np.round(np.asarray(lats, dtype=float) * 1e6).astype(np.int64).astype(np.uint64)
+    lon_q = np.round(np.asarray(lons, dtype=float) * 1e6).astype(np.int64).astype(np.uint64)
+    
+    with np.errstate(over='ignore'):
+        x = (lat_q * np.uint64(0x9E3779B97F4A7C15)) ^ (lon_q + _salt_to_uint64(salt))
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    
+    unit = (x >> np.uint64(11)).astype(float) * (2.0 ** -53)
+    return low + unit * (high - low)
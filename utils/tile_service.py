@@ -0,0 +1,300 @@
+"""
+Teselas de riesgo precomputadas (slippy map, Web Mercator)
+
+Cada tesela z/x/y se evalúa una sola vez por fecha y versión de modelo con
+una grilla fija de puntos; los clientes de mapas que hacen pan solo pagan
+búsquedas en caché en lugar de inferencia y llamadas externas.
+"""
+
+import math
+import struct
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from utils.weather_api import generate_synthetic_weather_data
+
+# Valor de "sin datos" en la grilla uint8 (los porcentajes van de 0 a 100)
+NO_DATA = 255
+
+# Límite de latitud de Web Mercator
+MAX_MERCATOR_LAT = 85.0511287798
+
+# Primer elemento de la clave de caché; cambia si cambian los puntos evaluados por tesela
+TILE_CACHE_SCHEMA = 'tile-v2'
+
+
+def tile_cache_control(synthetic, max_age):
+    """Cache-Control de una tesela: las de clima sintético no se guardan en navegadores ni CDNs"""
+    return 'no-store' if synthetic else f'public, max-age={max_age}'
+
+
+def tile_bounds(z, x, y):
+    """
+    Calcula los límites geográficos de una tesela Web Mercator
+    
+    Returns:
+        tuple: (north, south, west, east) en grados
+    """
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return north, south, west, east
+
+
+def tile_cell_centers(z, x, y, grid_size):
+    """
+    Centros de celda de una tesela en grados
+    
+    Las filas de Web Mercator están equiespaciadas en y proyectada, no en
+    latitud: la latitud de cada fila sale de la inversa de Mercator.
+    
+    Returns:
+        tuple: (latitudes de fila de norte a sur, longitudes de columna de oeste a este)
+    """
+    n = 2 ** z
+    offsets = (np.arange(grid_size) + 0.5) / grid_size
+    row_lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    col_lons = (x + offsets) / n * 360.0 - 180.0
+    return row_lats, col_lons
+
+
+def is_valid_tile(z, x, y, max_zoom=18):
+    """Verifica que z/x/y sea una tesela existente"""
+    if not (0 <= z <= max_zoom):
+        return False
+    n = 2 ** z
+    return 0 <= x < n and 0 <= y < n
+
+
+def _risk_palette():
+    """Paleta de 101 colores (0-100%) + transparente para NO_DATA"""
+    palette = bytearray()
+    alpha = bytearray()
+    
+    for percentage in range(101):
+        if percentage > 70:
+            color = (215, 48, 39)     # HIGH
+        elif percentage > 30:
+            color = (254, 178, 76)    # MEDIUM
+        else:
+            color = (26, 152, 80)     # LOW
+        palette.extend(color)
+        alpha.append(90 + int(percentage * 1.6))
+    
+    # Índices 101..255 sin uso, NO_DATA queda totalmente transparente
+    palette.extend(b'\x00\x00\x00' * (256 - 101))
+    alpha.extend(b'\x00' * (256 - 101))
+    
+    return bytes(palette), bytes(alpha)
+
+
+_PALETTE, _PALETTE_ALPHA = _risk_palette()
+
+
+def _png_chunk(chunk_type, data):
+    chunk = chunk_type + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+
+
+def encode_tile_png(grid):
+    """
+    Codifica la grilla uint8 como PNG indexado (1 byte por celda)
+    
+    Cada celda de la grilla es un píxel; el cliente escala la imagen a 256x256.
+    """
+    height, width = grid.shape
+    
+    # Cada fila va precedida del filtro 0 (None)
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = grid
+    
+    header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', header),
+        _png_chunk(b'PLTE', _PALETTE),
+        _png_chunk(b'tRNS', _PALETTE_ALPHA),
+        _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), 9)),
+        _png_chunk(b'IEND', b'')
+    ])
+
+
+def encode_tile_binary(grid):
+    """Codifica la grilla como bytes uint8 (fila 0 = norte, row-major)"""
+    return np.ascontiguousarray(grid, dtype=np.uint8).tobytes()
+
+
+def _mercator_rows(weather_df, row_lats):
+    """
+    Pasa la grilla del clima (filas equiespaciadas en latitud) a las filas de la tesela
+    
+    Meteomatics solo devuelve grillas regulares en latitud; cada fila de la
+    tesela toma el clima de la fila recibida más cercana y queda con su
+    latitud Mercator, que es la que se puntúa. A partir de z≈5 la diferencia
+    entre ambas filas es menor que el paso de la grilla.
+    """
+    source_lats = np.round(weather_df['latitude'].to_numpy(dtype=float), 6)
+    lat_values = np.unique(source_lats)
+    nearest = lat_values[np.abs(lat_values[None, :] - row_lats[:, None]).argmin(axis=1)]
+    
+    rows = []
+    for row_lat, source_lat in zip(row_lats, nearest):
+        row = weather_df[source_lats == source_lat].copy()
+        row['latitude'] = row_lat
+        rows.append(row)
+    return pd.concat(rows, ignore_index=True)
+
+
+class RiskTileService:
+    """Calcula y cachea teselas de riesgo por fecha y versión de modelo"""
+    
+    def __init__(self, inference_pool, weather_api, cache, grid_size=16):
+        """
+        Args:
+            inference_pool: InferencePool (o predictor con la misma interfaz)
+            weather_api: MeteomaticsWeatherAPI
+            cache: LRUCache donde se guardan las grillas
+            grid_size: Puntos por lado de cada tesela
+        """
+        self.inference_pool = inference_pool
+        self.weather_api = weather_api
+        self.cache = cache
+        self.grid_size = grid_size
+        # Cálculos en curso por clave: los misses concurrentes esperan al primero
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+    
+    @property
+    def model_version(self):
+        """Versión de modelo usada en la clave de caché"""
+        metadata = self.inference_pool.predictor.system_metadata
+        return f"{metadata.get('version', 'unknown')}@{metadata.get('training_date', '')}"
+    
+    @property
+    def shard_regions(self):
+        """Regiones del shard (None = todas); las teselas de un shard solo traen sus celdas"""
+        return self.inference_pool.predictor.shard_regions
+    
+    def cache_key(self, z, x, y, forecast_date):
+        return (TILE_CACHE_SCHEMA, z, x, y, forecast_date, self.model_version, self.grid_size, self.shard_regions)
+    
+    def save_cache(self, path, max_entries=None):
+        """Guarda en disco las teselas más usadas (para el próximo arranque)"""
+        return self.cache.save(path, max_entries)
+    
+    def load_cache(self, path):
+        """Recarga teselas guardadas, descartando las de otra versión de modelo, grilla o shard"""
+        model_version = self.model_version
+        shard_regions = self.shard_regions
+        return self.cache.load(
+            path,
+            accept=lambda key: (key[0] == TILE_CACHE_SCHEMA and key[5] == model_version and
+                                key[6] == self.grid_size and key[7:8] == (shard_regions,))
+        )
+    
+    def get_tile(self, z, x, y, forecast_date):
+        """
+        Devuelve la grilla uint8 (grid_size x grid_size) con el % de riesgo
+        
+        Si la misma tesela ya se está calculando (varios clientes pidiendo
+        la misma zona a la vez), se espera ese cálculo en lugar de repetirlo.
+        Las teselas puntuadas con clima sintético (Meteomatics caído) no se
+        guardan en caché: se vuelven a calcular en la próxima petición.
+        
+        Returns:
+            tuple: (grid, cache_hit, synthetic)
+        """
+        key = self.cache_key(z, x, y, forecast_date)
+        grid = self.cache.get(key)
+        if grid is not None:
+            return grid, True, False
+        
+        with self._in_flight_lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                # Otro cálculo pudo terminar entre el get y el lock
+                grid = self.cache.peek(key)
+                if grid is not None:
+                    return grid, True, False
+                flight = self._in_flight[key] = {
+                    'done': threading.Event(), 'grid': None, 'synthetic': False, 'error': None
+                }
+        
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['grid'], False, flight['synthetic']
+        
+        try:
+            grid, synthetic = self._compute_tile(z, x, y, forecast_date)
+            if not synthetic:
+                self.cache.set(key, grid)
+            flight['grid'], flight['synthetic'] = grid, synthetic
+            return grid, False, synthetic
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            flight['done'].set()
+    
+    def _compute_tile(self, z, x, y, forecast_date):
+        """Grilla de la tesela y si se puntuó con clima sintético (tuple)"""
+        # Puntos en el centro de cada celda para que teselas vecinas no se solapen
+        row_lats, col_lons = tile_cell_centers(z, x, y, self.grid_size)
+        bbox_corners = {
+            'top_left': [row_lats[0], col_lons[0]],
+            'bottom_right': [row_lats[-1], col_lons[-1]]
+        }
+        
+        weather_data = self.weather_api.get_weather_for_area(
+            bbox_corners,
+            forecast_date,
+            self.grid_size
+        )
+        synthetic = weather_data is None
+        if synthetic:
+            weather_data = generate_synthetic_weather_data(bbox_corners, self.grid_size, forecast_date)
+        weather_data = _mercator_rows(weather_data, row_lats)
+        
+        # En modo shard las celdas de otras regiones quedan en NO_DATA (el router las combina)
+        predictor = self.inference_pool.predictor
+        features, regions = predictor.build_feature_matrix(weather_data, only_regions=self.shard_regions)
+        probabilities = self.inference_pool.score_features(features, regions)
+        
+        grid = self._rasterize(
+            features[:, 0],
+            features[:, 1],
+            probabilities,
+            weather_data['latitude'].to_numpy(dtype=float),
+            weather_data['longitude'].to_numpy(dtype=float)
+        )
+        return grid, synthetic
+    
+    def _rasterize(self, lats, lons, probabilities, grid_lats=None, grid_lons=None):
+        """
+        Ubica cada punto en su celda (fila 0 = norte) sin depender del orden de la API
+        
+        grid_lats/grid_lons son las coordenadas de la grilla completa cuando
+        solo se puntuó una parte de los puntos (por defecto, las de los puntos).
+        """
+        grid = np.full((self.grid_size, self.grid_size), NO_DATA, dtype=np.uint8)
+        
+        lat_values = np.unique(np.round(lats if grid_lats is None else grid_lats, 6))
+        lon_values = np.unique(np.round(lons if grid_lons is None else grid_lons, 6))
+        if len(lat_values) > self.grid_size or len(lon_values) > self.grid_size:
+            raise ValueError("La grilla recibida no coincide con el tamaño de tesela")
+        
+        lat_index = np.searchsorted(lat_values, np.round(lats, 6))
+        lon_index = np.searchsorted(lon_values, np.round(lons, 6))
+        rows = len(lat_values) - 1 - lat_index
+        grid[rows, lon_index] = np.rint(probabilities).astype(np.uint8)
+        return grid
@@ -0,0 +1,187 @@
+"""
+Captura de tráfico anonimizado para replay (benchmarks/replay_traffic.py)
+
+Con CAPTURE_PATH definido, cada petición a los endpoints de lectura se
+agrega como una línea JSON con su timestamp, latencia y status. La latencia
+se mide al cerrar la respuesta (incluye el cuerpo de las respuestas en
+streaming). Solo se guardan los campos conocidos del payload y se
+anonimizan:
+
+- bbox_corners se traslada a la celda de CAPTURE_SNAP_DEGREES más cercana
+  (se conserva el tamaño del área, que es lo que importa para capacidad,
+  y la región del modelo, pero no la ubicación exacta)
+- las teselas se reducen al bloque de zoom CAPTURE_TILE_ZOOM que las contiene
+- el cliente (X-API-Key o IP) se reemplaza por un hash con sal por proceso
+
+Nunca se guardan cabeceras de autenticación, webhooks ni nombres de áreas.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+
+from flask import g, request
+
+from utils.bbox_validation import BBOX_OK, validate_bboxes, corners_to_bbox
+
+# Campos que se conservan de cada payload
+PREDICT_FIELDS = ('forecast_date', 'grid_resolution', 'num_samples', 'grid_format')
+
+TILE_PATH = re.compile(r'^/tiles/(\d+)/(\d+)/(\d+)$')
+
+
+def _snap_bboxes(bboxes, snap_degrees):
+    """Traslada cada bbox válido a la celda más cercana; None para los inválidos"""
+    codes, corners, _ = validate_bboxes(bboxes)
+    
+    centers = corners.mean(axis=1)
+    snapped_centers = (centers / snap_degrees).round() * snap_degrees
+    shifted = corners - centers[:, None, :] + snapped_centers[:, None, :]
+    shifted[:, :, 0] = shifted[:, :, 0].clip(-90, 90)
+    shifted[:, :, 1] = shifted[:, :, 1].clip(-180, 180)
+    
+    return [
+        corners_to_bbox(shifted[i].round(6)) if codes[i] == BBOX_OK else None
+        for i in range(len(bboxes))
+    ]
+
+
+class TrafficCapture:
+    """Escribe peticiones anonimizadas en un archivo JSON Lines"""
+    
+    def __init__(self, path, sample_rate=1.0, max_bytes=100 * 1024 * 1024,
+                 snap_degrees=1.0, tile_zoom=6):
+        """
+        Args:
+            path: Archivo de captura (se agregan líneas)
+            sample_rate: Fracción de peticiones capturadas
+            max_bytes: Tamaño a partir del cual se deja de capturar
+            snap_degrees: Tamaño de celda (grados) para anonimizar bboxes
+            tile_zoom: Zoom al que se reducen las teselas capturadas
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.snap_degrees = snap_degrees
+        self.tile_zoom = tile_zoom
+        self.captured = 0
+        self._salt = secrets.token_bytes(16)
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    
+    def _client_id(self, client_key):
+        if not client_key:
+            return None
+        return hashlib.sha256(self._salt + client_key.encode()).hexdigest()[:12]
+    
+    def anonymize(self, method, path, query, payload):
+        """
+        Payload y ruta anonimizados de una petición
+        
+        Returns:
+            tuple: (path, query, payload) o None si el endpoint no se captura
+        """
+        if method == 'POST' and path == '/predict-fire-risk':
+            payload = payload if isinstance(payload, dict) else {}
+            anonymized = {key: payload[key] for key in PREDICT_FIELDS if key in payload}
+            if 'bbox_corners' in payload:
+                anonymized['bbox_corners'] = _snap_bboxes([payload['bbox_corners']], self.snap_degrees)[0]
+            return path, {}, anonymized
+        
+        if method == 'POST' and path == '/validate-coordinates':
+            payload = payload if isinstance(payload, dict) else {}
+            return path, {}, {
+                'bbox_corners': _snap_bboxes([payload.get('bbox_corners')], self.snap_degrees)[0]
+            }
+        
+        if method == 'POST' and path == '/validate-coordinates/batch':
+            bboxes = payload.get('bboxes') if isinstance(payload, dict) else None
+            if not isinstance(bboxes, list):
+                return path, {}, {}
+            return path, {}, {'bboxes': _snap_bboxes(bboxes, self.snap_degrees)}
+        
+        match = TILE_PATH.match(path) if method == 'GET' else None
+        if match:
+            z, x, y = (int(value) for value in match.groups())
+            # Esquina del bloque de zoom tile_zoom que contiene la tesela
+            shift = max(0, z - self.tile_zoom)
+            x, y = (x >> shift) << shift, (y >> shift) << shift
+            query = {key: query[key] for key in ('date', 'format') if key in query}
+            return f'/tiles/{z}/{x}/{y}', query, None
+        
+        return None
+    
+    def record(self, method, path, query, payload, headers, client_key, status, latency):
+        """Agrega una línea a la captura (si corresponde según muestreo y tamaño)"""
+        if random.random() >= self.sample_rate:
+            return False
+        
+        anonymized = self.anonymize(method, path, query, payload)
+        if anonymized is None:
+            return False
+        path, query, payload = anonymized
+        
+        line = json.dumps({
+            "timestamp": round(time.time(), 3),
+            "method": method,
+            "path": path,
+            "query": query,
+            "payload": payload,
+            "accept": headers.get('Accept'),
+            "accept_encoding": headers.get('Accept-Encoding'),
+            "client": self._client_id(client_key),
+            "status": status,
+            "latency_ms": round(latency * 1000, 2)
+        }, default=float) + '\n'
+        
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                return False
+            with open(self.path, 'a') as f:
+                f.write(line)
+            self.captured += 1
+        return True
+
+
+def install_traffic_capture(app, capture):
+    """Registra los hooks de Flask que alimentan la captura"""
+    
+    @app.before_request
+    def start_capture_timer():
+        g.capture_start = time.perf_counter()
+    
+    @app.after_request
+    def capture_request(response):
+        start = g.get('capture_start')
+        if start is None:
+            return response
+        
+        # Los datos de la petición se copian ahora: al cerrar la respuesta
+        # ya no hay contexto de petición
+        method = request.method
+        path = request.path
+        query = request.args.to_dict()
+        payload = request.get_json(silent=True) if method == 'POST' else None
+        headers = {name: request.headers.get(name) for name in ('Accept', 'Accept-Encoding')}
+        client_key = request.headers.get('X-API-Key') or request.remote_addr
+        status = response.status_code
+        
+        # La latencia se mide al cerrar la respuesta: en after_request las
+        # respuestas en streaming (NDJSON) aún no generaron el cuerpo
+        def record_on_close():
+            try:
+                capture.record(method, path, query, payload, headers, client_key,
+                               status, time.perf_counter() - start)
+            except Exception as e:
+                print(f"⚠️ Error capturando petición: {e}")
+        
+        response.call_on_close(record_on_close)
+        return response
+    
+    return app
@@ -0,0 +1,132 @@
+"""
+Calentamiento del worker antes de recibir tráfico
+
+Después de un deploy o de un reciclado por max_requests, las primeras
+peticiones pagaban el primer predict de LightGBM, el fork del pool de
+inferencia, el handshake TLS con Meteomatics y Earth Engine y las cachés
+vacías. WarmupRunner ejecuta esos pasos en segundo plano al arrancar y
+expone la readiness (/ready) hasta que terminan; gunicorn espera a que
+terminen antes de aceptar conexiones (post_worker_init).
+"""
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+STATUS_PENDING = 'pending'
+STATUS_WARMING = 'warming'
+STATUS_READY = 'ready'
+
+
+def synthetic_region_batch(predictor):
+    """
+    Un punto sintético por modelo regional (centro de su región)
+    
+    Returns:
+        tuple: (features, regions) listos para score_features
+    """
+    regions = list(predictor.regional_models.keys())
+    centers = []
+    for region in regions:
+        bounds = predictor.region_boundaries.get(region)
+        if bounds:
+            centers.append((np.mean(bounds['lat']), np.mean(bounds['lon'])))
+        else:
+            centers.append((0.0, 0.0))
+    
+    weather_df = pd.DataFrame({
+        'latitude': [lat for lat, _ in centers],
+        'longitude': [lon for _, lon in centers],
+        't_2m:C': 25.0,
+        'relative_humidity_2m:p': 60.0,
+        'wind_speed_10m:ms': 5.0
+    })
+    features, _ = predictor.build_feature_matrix(weather_df, strict=False)
+    
+    # Región forzada: cada modelo recibe su punto aunque el centro caiga en otra
+    return features, np.array(regions, dtype=object)
+
+
+def warm_regional_models(predictor):
+    """Primer predict de cada modelo regional"""
+    features, regions = synthetic_region_batch(predictor)
+    predictor.score_features(features, regions)
+    return len(regions)
+
+
+def warm_earth_engine(earth_engine_client, timeout):
+    """Espera la inicialización y hace una consulta para abrir la conexión"""
+    if not earth_engine_client.wait_until_ready(timeout):
+        return False
+    earth_engine_client.get_complete_terrain_info_batch([0.0], [0.0])
+    return True
+
+
+class WarmupRunner:
+    """Ejecuta pasos de calentamiento en orden y mantiene el estado de readiness"""
+    
+    def __init__(self, steps):
+        """
+        Args:
+            steps: Lista de (nombre, callable); un paso que falla no frena a los demás
+        """
+        self.steps = steps
+        self.status = STATUS_PENDING
+        self.seconds = None
+        self.results = {}
+        self._ready_event = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def is_ready(self):
+        return self._ready_event.is_set()
+    
+    def start(self):
+        """Arranca el calentamiento en segundo plano (idempotente)"""
+        with self._lock:
+            if self.status != STATUS_PENDING:
+                return
+            self.status = STATUS_WARMING
+        
+        threading.Thread(target=self.run, name='warmup', daemon=True).start()
+    
+    def wait(self, timeout=None):
+        """Espera a que termine el calentamiento; True si terminó"""
+        return self._ready_event.wait(timeout)
+    
+    def run(self):
+        self.status = STATUS_WARMING
+        start = time.perf_counter()
+        print("🔥 Calentando worker...")
+        
+        for name, step in self.steps:
+            step_start = time.perf_counter()
+            try:
+                result = step()
+                error = None
+            except Exception as e:
+                result = None
+                error = str(e)
+                print(f"⚠️ Calentamiento '{name}' falló: {e}")
+            
+            self.results[name] = {
+                "seconds": round(time.perf_counter() - step_start, 3),
+                "result": result,
+                "error": error
+            }
+        
+        self.seconds = time.perf_counter() - start
+        self.status = STATUS_READY
+        self._ready_event.set()
+        print(f"✅ Worker caliente en {self.seconds:.2f}s")
+    
+    def get_status(self):
+        """Estado para /health y /ready"""
+        return {
+            "status": self.status,
+            "ready": self.is_ready,
+            "seconds": round(self.seconds, 2) if self.seconds is not None else None,
+            "steps": dict(self.results)
+        }
@@ -1,70 +1,188 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
 import requests
 import pandas as pd
 import numpy as np
 
+from utils.circuit_breaker import CircuitBreaker
+from utils.seeding import seeded_rng
+
 
 class MeteomaticsWeatherAPI:
     """API para obtener datos meteorológicos en tiempo real"""
     
-    def __init__(self, username, password, base_url):
+    def __init__(self, username, password, base_url, timeout=30,
+                 circuit_breaker=None, hedge_enabled=False, min_hedge_delay=1.0):
+        """
+        Args:
+            timeout: Timeout (s) de cada petición HTTP
+            circuit_breaker: CircuitBreaker que decide cuándo fallar rápido
+            hedge_enabled: Enviar una segunda petición si la primera supera el p95
+            min_hedge_delay: Espera mínima (s) antes de la petición de cobertura
+        """
         self.username = username
         self.password = password
         self.base_url = base_url
+        self.timeout = timeout
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.hedge_enabled = hedge_enabled
+        self.min_hedge_delay = min_hedge_delay
+        self.hedged_requests = 0
         
-    def get_weather_for_area(self, bbox_corners, forecast_date):
+        # Sesión compartida: reutiliza conexiones TLS entre peticiones
+        self.session = requests.Session()
+        self._hedge_executor = None
+        if hedge_enabled:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='meteomatics')
+        
+    def warm_up(self, timeout=5):
+        """
+        Abre la conexión TLS con Meteomatics antes de la primera petición
+        
+        No pasa por el circuit breaker: un fallo acá no cuenta como error.
+        
+        Returns:
+            bool: True si el servidor respondió
+        """
+        try:
+            self.session.head(self.base_url, timeout=min(self.timeout, timeout))
+            return True
+        except requests.RequestException as e:
+            print(f"⚠️ No se pudo pre-abrir la conexión con Meteomatics: {e}")
+            return False
+    
+    def get_weather_for_area(self, bbox_corners, forecast_date, grid_resolution=5):
         """
         Obtiene datos meteorológicos para un área específica
         
         Args:
             bbox_corners: {"top_left": [lat, lon], "bottom_right": [lat, lon]}
             forecast_date: "YYYY-MM-DD"
+            grid_resolution: Puntos por lado de la grilla (default: 5x5)
             
         Returns:
-            DataFrame con datos meteorológicos
+            DataFrame con datos meteorológicos (None si falla o el circuito está abierto)
         """
+        permit = self.circuit_breaker.allow_request()
+        if not permit:
+            print("⚡ Circuito de Meteomatics abierto, fallando rápido")
+            return None
+        
         try:
-            # Parámetros meteorológicos críticos
-            weather_params = [
-                "t_2m:C",
-                "relative_humidity_2m:p",
-                "wind_speed_10m:ms",
-                "wind_dir_10m:d",
-                "precip_1h:mm"
-            ]
-            
-            # Construir URL de la API
-            date_iso = f"{forecast_date}T12:00:00Z"
-            parameters_str = ",".join(weather_params)
-            
-            # Crear grilla de 5x5 puntos
-            lat_min = min(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
-            lat_max = max(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
-            lon_min = min(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
-            lon_max = max(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
-            
-            location_str = f"{lat_max},{lon_min}_{lat_min},{lon_max}:5x5"
-            api_url = f"{self.base_url}/{date_iso}/{parameters_str}/{location_str}/json"
+            api_url = self._build_request_url(bbox_corners, forecast_date, grid_resolution)
             
             print(f"📡 Consultando API meteorológica...")
             
-            # Realizar petición HTTP
-            response = requests.get(api_url, auth=(self.username, self.password), timeout=30)
-            response.raise_for_status()
+            # Realizar petición HTTP (con cobertura si está habilitada)
+            if self.hedge_enabled and not permit.probe:
+                data = self._hedged_get(api_url, permit)
+            else:
+                data = self._timed_get(api_url, permit)
             
             # Procesar respuesta JSON
-            data = response.json()
-            weather_df = self._process_meteomatics_response(data)
-            
-            if weather_df is not None:
-                print(f"Datos obtenidos: {len(weather_df)} puntos")
-                return weather_df
-            else:
-                print("Error procesando datos meteorológicos")
-                return None
+            return self._handle_response_data(data)
                 
         except Exception as e:
             print(f"Error API Meteomatics: {e}")
             return None
+        
+        finally:
+            # También si el greenlet se cancela (Timeout/GreenletExit no son Exception)
+            self.circuit_breaker.release(permit)
+    
+    def _timed_get(self, api_url, permit=None):
+        """GET que registra resultado y latencia en el circuit breaker (con el permiso de la llamada)"""
+        start = time.perf_counter()
+        try:
+            response = self.session.get(api_url, auth=(self.username, self.password), timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            self.circuit_breaker.record_failure(time.perf_counter() - start, permit)
+            raise
+        
+        self.circuit_breaker.record_success(time.perf_counter() - start, permit)
+        return data
+    
+    def _hedged_get(self, api_url, permit=None):
+        """Si la primera petición supera el p95, lanza otra y usa la primera que responda bien"""
+        delay = self.hedge_delay()
+        primary = self._hedge_executor.submit(self._timed_get, api_url, permit)
+        
+        if delay is None:
+            return primary.result()
+        
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        
+        self.hedged_requests += 1
+        print(f"🔀 Meteomatics lento (>{delay:.1f}s), enviando petición de cobertura")
+        hedge = self._hedge_executor.submit(self._timed_get, api_url, permit)
+        
+        last_error = None
+        for future in as_completed([primary, hedge]):
+            try:
+                return future.result()
+            except Exception as e:
+                last_error = e
+        raise last_error
+    
+    def hedge_delay(self):
+        """Espera antes de la petición de cobertura (None sin historial suficiente)"""
+        p95 = self.circuit_breaker.latency_percentile(95)
+        if p95 is None:
+            return None
+        return max(self.min_hedge_delay, p95)
+    
+    def get_state(self):
+        """Estado del cliente para /health"""
+        hedge_delay = self.hedge_delay()
+        return {
+            "circuit_breaker": self.circuit_breaker.snapshot(),
+            "timeout_seconds": self.timeout,
+            "hedging": {
+                "enabled": self.hedge_enabled,
+                "delay_seconds": round(hedge_delay, 3) if hedge_delay is not None else None,
+                "hedged_requests": self.hedged_requests
+            }
+        }
+    
+    def _build_request_url(self, bbox_corners, forecast_date, grid_resolution=5):
+        """Construye la URL de Meteomatics para una grilla de NxN puntos"""
+        # Parámetros meteorológicos críticos
+        weather_params = [
+            "t_2m:C",
+            "relative_humidity_2m:p",
+            "wind_speed_10m:ms",
+            "wind_dir_10m:d",
+            "precip_1h:mm"
+        ]
+        
+        # Construir URL de la API
+        date_iso = f"{forecast_date}T12:00:00Z"
+        parameters_str = ",".join(weather_params)
+        
+        # Crear grilla de NxN puntos
+        lat_min = min(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
+        lat_max = max(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
+        lon_min = min(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
+        lon_max = max(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
+        
+        location_str = f"{lat_max},{lon_min}_{lat_min},{lon_max}:{grid_resolution}x{grid_resolution}"
+        return f"{self.base_url}/{date_iso}/{parameters_str}/{location_str}/json"
+    
+    def _handle_response_data(self, data):
+        """Convierte el JSON recibido en DataFrame e informa el resultado"""
+        weather_df = self._process_meteomatics_response(data)
+        
+        if weather_df is not None:
+            print(f"Datos obtenidos: {len(weather_df)} puntos")
+            return weather_df
+        else:
+            print("Error procesando datos meteorológicos")
+            return None
     
     def _process_meteomatics_response(self, api_data):
         """Convierte respuesta JSON de Meteomatics en DataFrame"""
@@ -94,8 +212,100 @@ class MeteomaticsWeatherAPI:
             return None
 
 
-def generate_synthetic_weather_data(bbox_corners):
-    """Genera datos meteorológicos sintéticos si la API falla (Fallback)"""
+class AsyncMeteomaticsWeatherAPI(MeteomaticsWeatherAPI):
+    """Variante asíncrona (httpx) para el punto de entrada ASGI"""
+    
+    def __init__(self, username, password, base_url, max_connections=20, **kwargs):
+        super().__init__(username, password, base_url, **kwargs)
+        import httpx
+        
+        # Un único cliente reutiliza el pool de conexiones entre peticiones
+        self.client = httpx.AsyncClient(
+            auth=(username or '', password or ''),
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=max_connections)
+        )
+    
+    async def get_weather_for_area_async(self, bbox_corners, forecast_date, grid_resolution=5):
+        """Igual que get_weather_for_area pero sin bloquear el event loop"""
+        permit = self.circuit_breaker.allow_request()
+        if not permit:
+            print("⚡ Circuito de Meteomatics abierto, fallando rápido")
+            return None
+        
+        try:
+            api_url = self._build_request_url(bbox_corners, forecast_date, grid_resolution)
+            
+            print(f"📡 Consultando API meteorológica (async)...")
+            
+            if self.hedge_enabled and not permit.probe:
+                data = await self._hedged_get_async(api_url, permit)
+            else:
+                data = await self._timed_get_async(api_url, permit)
+            
+            return self._handle_response_data(data)
+            
+        except Exception as e:
+            print(f"Error API Meteomatics: {e}")
+            return None
+        
+        finally:
+            # También si la tarea se cancela (CancelledError no es Exception)
+            self.circuit_breaker.release(permit)
+    
+    async def _timed_get_async(self, api_url, permit=None):
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(api_url)
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            self.circuit_breaker.record_failure(time.perf_counter() - start, permit)
+            raise
+        
+        self.circuit_breaker.record_success(time.perf_counter() - start, permit)
+        return data
+    
+    async def _hedged_get_async(self, api_url, permit=None):
+        import asyncio
+        
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._timed_get_async(api_url, permit))
+        
+        if delay is None:
+            return await primary
+        
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        
+        self.hedged_requests += 1
+        print(f"🔀 Meteomatics lento (>{delay:.1f}s), enviando petición de cobertura")
+        pending = {primary, asyncio.ensure_future(self._timed_get_async(api_url, permit))}
+        
+        last_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    
+    async def aclose(self):
+        """Cierra el pool de conexiones HTTP"""
+        await self.client.aclose()
+
+
+def generate_synthetic_weather_data(bbox_corners, grid_resolution=5, forecast_date=None):
+    """
+    Genera datos meteorológicos sintéticos si la API falla (Fallback)
+    
+    Toda la grilla se genera de una vez con un RNG sembrado por bbox,
+    resolución y fecha: la misma petición produce siempre los mismos datos.
+    """
     print("Usando datos sintéticos (fallback)...")
 
     lat_min = min(bbox_corners['top_left'][0], bbox_corners['bottom_right'][0])
@@ -103,21 +313,21 @@ def generate_synthetic_weather_data(bbox_corners):
     lon_min = min(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
     lon_max = max(bbox_corners['top_left'][1], bbox_corners['bottom_right'][1])
     
-    lats = np.linspace(lat_min, lat_max, 5)
-    lons = np.linspace(lon_min, lon_max, 5)
-    
-    weather_points = []
-    for lat in lats:
-        for lon in lons:
-            point = {
-                'latitude': lat,
-                'longitude': lon,
-                't_2m:C': np.random.uniform(15, 35),
-                'relative_humidity_2m:p': np.random.uniform(30, 80),
-                'wind_speed_10m:ms': np.random.uniform(2, 15),
-                'wind_dir_10m:d': np.random.uniform(0, 360),
-                'precip_1h:mm': np.random.uniform(0, 5)
-            }
-            weather_points.append(point)
+    lats = np.linspace(lat_min, lat_max, grid_resolution)
+    lons = np.linspace(lon_min, lon_max, grid_resolution)
+    
+    # Mismo orden que antes: latitud exterior, longitud interior
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+    n_points = lat_grid.size
+    
+    rng = seeded_rng('weather', lat_min, lat_max, lon_min, lon_max, grid_resolution, forecast_date)
     
-    return pd.DataFrame(weather_points)
+    return pd.DataFrame({
+        'latitude': lat_grid.ravel(),
+        'longitude': lon_grid.ravel(),
+        't_2m:C': rng.uniform(15, 35, n_points),
+        'relative_humidity_2m:p': rng.uniform(30, 80, n_points),
+        'wind_speed_10m:ms': rng.uniform(2, 15, n_points),
+        'wind_dir_10m:d': rng.uniform(0, 360, n_points),
+        'precip_1h:mm': rng.uniform(0, 5, n_points)
+    })